@@ -1,51 +1,51 @@
 import math
+import os
 import time
-import csv
-import cv2
 
-from .constants import MM_PER_INCH
-from .utils import px_to_mm, format_mm, current_measure_text
+from .constants import MM_PER_INCH, LEFT_MENU_W
+from .utils import current_measure_text, measure_text, xy_text
 from .i18n import _
+from .measurements import TYPES
+from .renderer import render_full_resolution
+from .writer import image_params, write_image
+from .exporters import EXPORTERS, ExportData, export_to
+from .recorder import Recorder
+from .snap import snap_click
+from .history import (
+    InsertMeasure, DeleteMeasure, ToggleVisible, SetPoints, SetLabel,
+    SetAttr,
+)
 
 def calibrate_with_value(state, value):
     (x1, y1), (x2, y2) = state.points
     px = math.hypot(x2 - x1, y2 - y1)
 
     ref_mm = value * MM_PER_INCH if state.calibration_unit == "in" else value
-    state.scale_mm_per_pixel = ref_mm / px
+    state.history.execute(state, SetAttr(
+        "scale_mm_per_pixel", state.scale_mm_per_pixel, ref_mm / px,
+        label="calibration"))
 
     state.status_message = _("Calibrated:") + f" {state.scale_mm_per_pixel:.6f} mm/px"
     state.points = []
 
+def _add_measure(state, mtype, label, text, points):
+    state.history.execute(state, InsertMeasure({
+        "type": mtype,
+        "label": label[:8],
+        "text": text,
+        "color": state.measure_color,
+        "color_name": state.measure_color_name,
+        "points": points,
+        "visible": True,
+    }))
+
 def add_measure_with_label(state, label):
 
     if state.mode == "XY" and len(state.points) == 1:
         x, y = state.points[0]
+        text = xy_text(state, x, y)
 
-        if state.origin:
-            ox, oy = state.origin
-            dx = x - ox
-            dy = y - oy
-        else:
-            dx, dy = x, y
-
-        mmx = px_to_mm(state, dx)
-        mmy = px_to_mm(state, dy)
-
-        if mmx is not None:
-            text = f"({format_mm(state, mmx)}, {format_mm(state, mmy)})"
-        else:
-            text = f"({dx}px, {dy}px)"
-
-        state.measurements.append({
-            "type": "XY",
-            "label": label[:8],
-            "text": text,
-            "color": state.measure_color,
-            "color_name": state.measure_color_name,
-            "points": [(x, y), (x, y)],
-            "visible": True
-        })
+        _add_measure(state, "XY", label, text, [(x, y), (x, y)])
 
         state.points = []
         state.status_message = _("Measure added")
@@ -55,91 +55,227 @@ def add_measure_with_label(state, label):
     if not text:
         return
 
-    state.measurements.append({
-        "type": state.mode,
-        "label": label[:8],
-        "text": text,
-        "color": state.measure_color,
-        "color_name": state.measure_color_name,
-        "points": state.points.copy(),   # NUEVO
-        "visible": True                  # NUEVO
-    })
+    _add_measure(state, state.mode, label, text, list(state.points))
 
     state.points = []
     state.status_message = _("Measure added")
 
-def undo_measure(state):
-    if state.measurements:
-        state.measurements.pop()
+def undo(state):
+    cmd = state.history.undo(state)
+    if cmd is None:
+        state.status_message = _("Nothing to undo")
+    else:
+        state.status_message = _("Undo:") + " " + cmd.label
+
+def redo(state):
+    cmd = state.history.redo(state)
+    if cmd is None:
+        state.status_message = _("Nothing to redo")
+    else:
+        state.status_message = _("Redo:") + " " + cmd.label
+
+def set_origin(state, point):
+    state.history.execute(state, SetAttr("origin", state.origin, point))
+
+def toggle_measure(state, i):
+    mid = int(state.measurements.ids[i])
+    state.history.execute(state, ToggleVisible(mid))
+
+def set_label(state, mid, label):
+    store = state.measurements
+    i = store.row_of(mid)
+    if i is None or store.labels[i] == label[:8]:
+        return
+    state.history.execute(state, SetLabel(mid, store.labels[i], label[:8]))
+    state.status_message = _("Measure updated")
+
+def begin_point_drag(state, i, which):
+    store = state.measurements
+    before = (store.points[i].tolist(), store.texts[i])
+    state.drag_endpoint = (int(store.ids[i]), which, before)
+
+def move_measure_point(state, i, which, point):
+    store = state.measurements
+    store.move_point(i, which, point)
+
+    # El texto se recalcula con la calibración actual
+    mtype = TYPES[store.types[i]]
+    (x1, y1), (x2, y2) = store.points[i].tolist()
+    text = measure_text(state, mtype, [(x1, y1), (x2, y2)])
+    if text:
+        store.set_text(i, text)
+
+    state.measurements_changed()
+
+def end_point_drag(state):
+    """Registra el arrastre completo como un único paso deshacer."""
+    mid, which, before = state.drag_endpoint
+    state.drag_endpoint = None
+
+    store = state.measurements
+    i = store.row_of(mid)
+    if i is None:
+        return
+
+    # Al soltar, el extremo también se ajusta en modo snap
+    if state.snap:
+        x, y = store.points[i, which].tolist()
+        move_measure_point(state, i, which, snap_click(state, x, y))
+
+    after = (store.points[i].tolist(), store.texts[i])
+    if after != before:
+        state.history.record(state, SetPoints(mid, before, after))
+
+def delete_selected_measure(state):
+    i = None
+    if state.selected is not None:
+        i = state.measurements.row_of(state.selected)
+
+    if i is None:
+        state.status_message = _("No measure selected")
+        return
+
+    state.history.execute(state, DeleteMeasure(state.selected))
+    state.status_message = _("Measure deleted")
+
+def _submit(state, job, message):
+    """Ejecuta job en el escritor en segundo plano (o aquí si no hay)."""
+    if state.writer is None:
+        try:
+            job()
+            state.status_message = message
+        except OSError as e:
+            state.status_message = _("Save failed:") + f" {e}"
+        return
+
+    if state.writer.submit(job, message):
+        state.status_message = _("Saving...")
+    else:
+        state.status_message = _("Writer busy, try again")
+
+def _capture_image(state):
+    """Imagen a guardar, propia (el canvas se reutiliza cada frame)."""
+    # Con vista reducida o ampliada se exporta a resolución de captura
+    zoomed = state.view_scale != 1.0 or state.zoom != 1.0
+    if zoomed and state.source_frame is not None:
+        return render_full_resolution(state.source_frame, state)
+    return state.last_frame.copy()
+
+def _output_path(state, name):
+    directory = state.config.output_dir
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name)
+    return name
 
 def save_png(state):
     ts = time.strftime("%Y%m%d_%H%M%S")
-    filename = f"captura_{ts}.png"
-    cv2.imwrite(filename, state.last_frame)
-    state.status_message = _("PNG saved")
+    filename = _output_path(
+        state, f"captura_{ts}.{state.config.image_format}")
+
+    image = _capture_image(state)
+    params = image_params(state.config)
+
+    _submit(state, lambda: write_image(filename, image, params),
+            _("Image saved:") + f" {filename}")
 
 def save_export(state, mode):
-    if state.origin is None:
-        state.status_message = _("Origin not defined")
+    exporter = EXPORTERS[mode]
+
+    if exporter.needs_scale and state.scale_mm_per_pixel is None:
+        state.status_message = _("Calibrate first")
         return
 
     ts = time.strftime("%Y%m%d_%H%M%S")
-    filename = f"medidas_{mode}_{ts}.csv"
-
-    ox, oy = state.origin
-
-    with open(filename, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            "label", "type", "color",
-            "x1", "y1", "x2", "y2",
-            "value"
-        ])
-
-        for m in state.measurements:
-            if not m.get("visible", False):
-                continue
-
-            (x1, y1), (x2, y2) = m["points"]
-
-            # relativo a origen
-            dx1 = x1 - ox
-            dy1 = y1 - oy
-            dx2 = x2 - ox
-            dy2 = y2 - oy
-
-            # convertir a mm
-            mm1x = px_to_mm(state, dx1)
-            mm1y = px_to_mm(state, dy1)
-            mm2x = px_to_mm(state, dx2)
-            mm2y = px_to_mm(state, dy2)
-
-            if mode == "3D":
-                writer.writerow([
-                    m["label"],
-                    m["type"],
-                    m["color_name"],
-                    round(mm1x, 1), round(mm1y, 1),
-                    round(mm2x, 1), round(mm2y, 1),
-                    m["text"]
-                ])
-
-            elif mode == "PCB":
-                # mm -> mil
-                mil1x = (mm1x / MM_PER_INCH) * 1000
-                mil1y = (mm1y / MM_PER_INCH) * 1000
-                mil2x = (mm2x / MM_PER_INCH) * 1000
-                mil2y = (mm2y / MM_PER_INCH) * 1000
-
-                writer.writerow([
-                    m["label"],
-                    m["type"],
-                    m["color_name"],
-                    round(mil1x), round(mil1y),
-                    round(mil2x), round(mil2y),
-                    m["text"]
-                ])
-
-    save_png(state)
-    state.status_message = _("Export saved")
+    filename = _output_path(
+        state, f"medidas_{mode}_{ts}.{exporter.ext}")
+
+    # Copia de las columnas visibles: el hilo de escritura no toca state
+    data = ExportData(state)
+
+    image = _capture_image(state)
+    image_name = _output_path(
+        state, f"captura_{ts}.{state.config.image_format}")
+    params = image_params(state.config)
+
+    def job():
+        export_to(filename, exporter, data)
+        write_image(image_name, image, params)
+
+    _submit(state, job, _("Export saved:") + f" {filename}")
+
+def cycle_export_format(state):
+    names = list(EXPORTERS)
+    i = names.index(state.export_format) if state.export_format in names \
+        else -1
+    state.export_format = names[(i + 1) % len(names)]
+    state.status_message = _("Export format:") + " " + state.export_format
+
+def start_recording(state):
+    cfg = state.config
+
+    if cfg.record_overlay:
+        if state.display_size is None:
+            return
+        w, h = state.display_size
+        shape = (h, w, 3)
+    else:
+        if state.source_frame is None:
+            return
+        shape = state.source_frame.shape
+
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    name = f"grabacion_{ts}"
+    if cfg.record_format != "png":
+        name += f".{cfg.record_format}"
+    path = _output_path(state, name)
+
+    # Sin diezmado se graba cada frame: el contenedor va al ritmo de
+    # captura medido
+    state.recorder = Recorder(path, shape, cfg.record_format,
+                              cfg.record_fps, cfg.record_drop,
+                              cfg.record_frames,
+                              capture_fps=state.capture_fps)
+    state.status_message = _("Recording:") + f" {path}"
+
+def stop_recording(state):
+    rec = state.recorder
+    state.recorder = None
+    # Sin esperar al codificador: termina en segundo plano
+    rec.stop()
+    state.closing_recorders = [
+        r for r in state.closing_recorders if not r.closed] + [rec]
+    state.status_message = (
+        _("Recording saved:") + f" {rec.frames} frames"
+        + (f", {rec.dropped} dropped" if rec.dropped else "")
+    )
+
+def wait_recordings(state):
+    """Al salir: espera a que los codificadores terminen de escribir."""
+    for rec in state.closing_recorders:
+        rec.wait()
+    state.closing_recorders = []
+
+def toggle_recording(state):
+    if state.recorder is None:
+        start_recording(state)
+    else:
+        stop_recording(state)
+
+def record_frame(state, frame):
+    """Llamar con cada frame nuevo mientras se graba."""
+    rec = state.recorder
+
+    if state.config.record_overlay:
+        # Zona de vídeo del canvas ya renderizado (con capas)
+        w, h = state.display_size
+        image = state.last_frame[:h, LEFT_MENU_W:LEFT_MENU_W + w]
+    else:
+        image = frame
+
+    rec.offer(image)
 
+    # Ráfaga completada
+    if rec.done:
+        stop_recording(state)
+        state.mark_dirty("status")
@@ -1,44 +1,31 @@
 #!/usr/bin/env python3
 import cv2
-import math
 import time
 import argparse
-import tkinter as tk
-from tkinter import simpledialog
-import csv
 
 from .config import Config
 from .i18n import _
 from .state import AppState
-from .utils import px_to_mm, format_mm, current_measure_text, draw_text
-from .constants import (
-    LEFT_MENU_W,
-    RIGHT_PANEL_W,
-    BOTTOM_PANEL_H,
-    MM_PER_INCH,
-    VERSION,
-    COLOR_MAP,
-    BUTTONS,
-)
-from .ui import draw_menu, draw_measures, draw_bottom_panel, hit_menu
-from .actions import (
-    calibrate_with_value,
-    add_measure_with_label,
-    undo_measure,
-    save_png,
-    save_export,
-)
+from .constants import VERSION
+from .actions import record_frame, stop_recording, wait_recordings
 from .engine import handle_key
-from .video import VideoSource
-from .dialogs import ask_string, show_error
+from .video import VideoSource, probe_best_format
+from .sources import open_source
+from .playback import PlaybackSource
+from .bench import run_benchmark
+from .dialogs import show_error, pump_tk
 from .renderer import render
-from .preview import draw_preview
 from .user_config import load_user_config, save_user_config
-from .utils import to_base_coords
 from .input import mouse
+from .session import SessionJournal, session_dir
+from .writer import BackgroundWriter, IMAGE_FORMATS
+from .recorder import RECORD_FORMATS, DROP_POLICIES
+from .autocal import DEFAULT_TARGET, parse_target, poll_autocalibration
+from .lens import load_lens
 
 # ================= CONSTANTES =================
 WINDOW_NAME = f"Microscopi {VERSION}"
+IDLE_WAIT_MS = 32
 
 # ================= ARGPARSE =================
 
@@ -50,13 +37,48 @@ def parse_args():
     parser.add_argument("-n", "--decimals", type=int, default=3)
     parser.add_argument("--unit", choices=["mm", "in"], default="mm")
     parser.add_argument("--no-draw-live", action="store_true")
+    parser.add_argument("--threaded", action="store_true")
+    parser.add_argument("--fourcc", type=str.upper,
+                        choices=["MJPG", "YUYV", "H264", "AUTO"])
+    parser.add_argument("--fps", type=int)
+    parser.add_argument("--buffers", type=int)
+    parser.add_argument("--bench", type=int, metavar="FRAMES")
+    parser.add_argument("--display-width", type=str)
+    parser.add_argument("--grid-pitch", type=float, metavar="MM")
+    parser.add_argument("--snap", action="store_true")
+    parser.add_argument("--no-undistort", action="store_true")
+    parser.add_argument("--cal-target", type=str, default=DEFAULT_TARGET,
+                        metavar="SPEC")
+    parser.add_argument("--session", type=str, metavar="DIR")
+    parser.add_argument("--new-session", action="store_true")
+    parser.add_argument("--image-format", choices=IMAGE_FORMATS,
+                        default="png")
+    parser.add_argument("--output-dir", type=str, metavar="DIR")
+    parser.add_argument("--record-format", choices=RECORD_FORMATS,
+                        default="avi")
+    parser.add_argument("--record-fps", type=float, default=0.0)
+    parser.add_argument("--record-overlay", action="store_true")
+    parser.add_argument("--record-drop", choices=DROP_POLICIES,
+                        default="drop")
+    parser.add_argument("--burst", type=int, metavar="FRAMES")
+    parser.add_argument("--png-level", type=int, choices=range(10),
+                        default=1, metavar="0-9")
 
     args = parser.parse_args()
 
+    try:
+        parse_target(args.cal_target)
+    except ValueError as e:
+        parser.error(str(e))
+
     width, height = 1920, 1080
     if args.resolution:
         width, height = map(int, args.resolution.lower().split("x"))
 
+    display_width = args.display_width
+    if display_width is not None and display_width != "auto":
+        display_width = int(display_width)
+
     if args.device is not None and args.device.isdigit():
         device = int(args.device)
     else:
@@ -69,9 +91,53 @@ def parse_args():
         decimals=args.decimals,
         default_unit=args.unit,
         draw_live=not args.no_draw_live,
+        threaded_capture=args.threaded,
+        fourcc=args.fourcc,
+        fps=args.fps,
+        buffer_size=args.buffers,
+        bench_frames=args.bench,
+        display_width=display_width,
+        grid_pitch=args.grid_pitch,
+        snap=args.snap,
+        cal_target=args.cal_target,
+        undistort=not args.no_undistort,
+        session_dir=args.session,
+        new_session=args.new_session,
+        image_format=args.image_format,
+        png_compression=args.png_level,
+        output_dir=args.output_dir,
+        record_format=args.record_format,
+        record_fps=args.record_fps,
+        record_overlay=args.record_overlay,
+        record_drop=args.record_drop,
+        record_frames=args.burst,
     )
 
 
+def _update_capture_rate(state):
+    """Media móvil del ritmo de frames nuevos (ritmo de la grabación)."""
+    now = time.monotonic()
+    last, state.last_capture_t = state.last_capture_t, now
+    if last is None or not 0 < now - last < 1.0:
+        return
+
+    rate = 1.0 / (now - last)
+    if state.capture_fps:
+        rate = 0.9 * state.capture_fps + 0.1 * rate
+    state.capture_fps = rate
+
+
+def _update_window_width(state):
+    try:
+        _x, _y, win_w, _h = cv2.getWindowImageRect(WINDOW_NAME)
+    except cv2.error:
+        return
+
+    if win_w > 0 and win_w != state.window_width:
+        state.window_width = win_w
+        state.mark_dirty("window")
+
+
 # ================= MAIN =================
 
 def main():
@@ -103,58 +169,199 @@ def main():
     config.width = final_width
     config.height = final_height
 
+    # --- Resolver formato de captura ---
+    # Solo se reutiliza lo guardado si es el mismo dispositivo y resolución
+    saved_capture = user_conf.get("capture", {})
+    same_mode = (
+        user_conf.get("video_device") == config.video_device
+        and user_conf.get("resolution") == {
+            "width": config.width, "height": config.height
+        }
+    )
+
+    if config.fourcc == "AUTO" and not isinstance(config.video_device, int):
+        config.fourcc = None
+
+    if config.fourcc == "AUTO":
+        if same_mode and saved_capture.get("fourcc"):
+            config.fourcc = saved_capture["fourcc"]
+        else:
+            best = probe_best_format(
+                config.video_device,
+                config.width,
+                config.height,
+                fps=config.fps,
+                buffer_size=config.buffer_size
+            )
+            config.fourcc = best["fourcc"] if best else None
+
+    elif config.fourcc is None and same_mode:
+        config.fourcc = saved_capture.get("fourcc")
+
+    if same_mode:
+        if config.fps is None:
+            config.fps = saved_capture.get("fps")
+        if config.buffer_size is None:
+            config.buffer_size = saved_capture.get("buffer_size")
+
     state = AppState(config)
 
     try:
-        video = VideoSource(
-            config.video_device,
-            config.width,
-            config.height
-        )
+        video = open_source(config)
 
     except RuntimeError:
+        if config.bench_frames:
+            raise SystemExit(
+                _("Cannot open video device") + f" {config.video_device}"
+            )
         show_error(
             _("Camera error"),
             _("Cannot open video device") + f" {config.video_device}"
         )
         return
 
-    # Guardar configuración válida
-    save_user_config({
-        "video_device": config.video_device,
-        "resolution": {
-            "width": config.width,
-            "height": config.height
-        }
-    })
+    # Grabación abierta como fuente: seek, pasos y scrubber
+    if isinstance(video, PlaybackSource):
+        state.playback = video
+
+    # Ritmo nominal hasta que haya medida (CAP_PROP_FPS)
+    if isinstance(video, VideoSource) and video.fps > 0:
+        state.capture_fps = video.fps
+
+    # Perfilado sin ventana (no toca la configuración guardada)
+    if config.bench_frames:
+        result = run_benchmark(video, state, config.bench_frames)
+        video.release()
+        print(
+            f"{result['frames']} frames: "
+            f"read {result['read_ms']:.2f} ms, "
+            f"render {result['render_ms']:.2f} ms, "
+            f"{result['fps']:.1f} fps"
+        )
+        return
+
+    # Guardar configuración válida (solo cámaras reales)
+    if isinstance(video, VideoSource):
+        save_user_config({
+            "video_device": config.video_device,
+            "resolution": {
+                "width": config.width,
+                "height": config.height
+            },
+            "capture": {
+                "fourcc": config.fourcc,
+                "fps": config.fps,
+                "buffer_size": config.buffer_size
+            }
+        })
+
+    # Diario de sesión: se reanuda la anterior salvo --new-session
+    journal = SessionJournal(
+        config.session_dir or session_dir(config.video_device))
+    if config.new_session:
+        journal.discard()
+    elif journal.load(state):
+        state.status_message = (
+            _("Session restored:") + f" {len(state.measurements)}"
+        )
+    if journal.replay_error:
+        state.status_message = (
+            _("Session partially restored:") + f" {len(state.measurements)}"
+        )
+    state.history.listener = journal.log_command
+
+    # Capturas y exportaciones se escriben fuera del hilo de UI
+    state.writer = BackgroundWriter()
 
     cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
     cv2.setMouseCallback(WINDOW_NAME, mouse, state)
 
+    try:
+        _main_loop(video, state, config, journal)
+    finally:
+        # También si la cámara falla: se termina de escribir lo
+        # pendiente y el diario queda sincronizado
+        if state.recorder is not None:
+            stop_recording(state)
+        wait_recordings(state)
+        state.writer.close(state)
+        journal.close()
+
+    video.release()
+    cv2.destroyAllWindows()
+
+
+def _main_loop(video, state, config, journal):
+    frame = None
+    wait_ms = 1
+
     while True:
         if state.quit:
             break
 
-        try:
-            frame = video.read()
-        except RuntimeError:
-            show_error(
-                _("Camera error"),
-                _("Cannot read from video device")
-            )
-            video.release()
-            return
+        new_frame = False
+
+        # Imagen congelada: se sigue mostrando el último frame
+        if frame is None or not state.frozen:
+            try:
+                frame = video.read()
+            except RuntimeError:
+                show_error(
+                    _("Camera error"),
+                    _("Cannot read from video device")
+                )
+                return
+
+            if video.fresh:
+                state.mark_dirty("frame")
+                state.lens_frame = None
+                new_frame = True
+                _update_capture_rate(state)
 
         # Guardar dimensiones base si aún no están
         if not hasattr(state, "base_width"):
             state.base_height, state.base_width = frame.shape[:2]
-            
-        canvas = render(frame, state)
+            # Tablas de corrección de lente ya calculadas para este
+            # dispositivo y resolución
+            load_lens(state, (state.base_width, state.base_height))
+
+        if video.threaded:
+            state.capture_stats = video.stats()
+
+        state.source_frame = frame
+
+        if config.display_width == "auto":
+            _update_window_width(state)
+
+        # Solo se renderiza si algo ha cambiado; en reposo el intervalo
+        # de waitKey crece hasta IDLE_WAIT_MS para no quemar CPU
+        if state.dirty:
+            state.dirty.clear()
+            canvas = render(frame, state)
 
-        state.last_frame = canvas.copy()
-        cv2.imshow(WINDOW_NAME, canvas)
+            # Sin copia: el canvas es persistente y no se toca hasta el
+            # siguiente render, así que guardar PNG puede leerlo
+            # directamente
+            state.last_frame = canvas
+            state.canvas_size = (canvas.shape[1], canvas.shape[0])
+            cv2.imshow(WINDOW_NAME, canvas)
+            wait_ms = 1
+        else:
+            wait_ms = min(wait_ms * 2, IDLE_WAIT_MS)
 
-        k = cv2.waitKey(1)
+        # Grabación: solo frames nuevos (nunca repetidos ni congelados)
+        if state.recorder is not None and new_frame:
+            record_frame(state, frame)
+
+        k = cv2.waitKey(wait_ms)
+
+        if k != -1:
+            state.mark_dirty("input")
+
+        journal.tick(state)
+        state.writer.poll(state)
+        poll_autocalibration(state)
+        pump_tk()   # Editor JSON abierto (no modal)
 
         if handle_key(state, k):
             continue
@@ -162,8 +369,9 @@ def main():
         if k == 27:
             break
 
-    video.release()
-    cv2.destroyAllWindows()
+    # Salida limpia: el próximo arranque solo lee el snapshot
+    journal.compact(state)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,325 @@
+# microscopi/autocal.py
+#
+# Calibración automática a partir de un patrón conocido en la imagen:
+# tablero de ajedrez, rejilla de puntos o reglilla graduada. Se ajusta
+# mm/px con todos los puntos detectados a la vez (mínimos cuadrados) y
+# se informa del residuo. La detección corre en un hilo aparte; el
+# resultado se aplica desde el bucle principal por el mismo camino que
+# la calibración manual (SetAttr, deshacer y diario de sesión).
+
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+from .constants import MM_PER_INCH
+from .history import SetAttr
+from .i18n import _
+from .utils import measured_frame
+
+TARGET_KINDS = ("checker", "dots", "ruler")
+DEFAULT_TARGET = "checker:9x6:1"
+
+MIN_FEATURES = 5
+RULER_MIN_CONTRAST = 6.0     # Amplitud de las divisiones / ruido del perfil
+RULER_MAX_JITTER = 0.03      # Desviación RMS de las divisiones / paso
+
+
+class Target:
+    def __init__(self, kind, cols, rows, pitch_mm):
+        self.kind = kind
+        self.cols = cols
+        self.rows = rows
+        self.pitch_mm = pitch_mm
+
+    def __str__(self):
+        if self.kind == "ruler":
+            return f"ruler:{self.pitch_mm:g}"
+        return f"{self.kind}:{self.cols}x{self.rows}:{self.pitch_mm:g}"
+
+
+def parse_target(spec):
+    """
+    checker:COLSxROWS:PASO   esquinas interiores del tablero
+    dots:COLSxROWS:PASO      rejilla simétrica de puntos
+    ruler:PASO               divisiones de una reglilla
+
+    PASO en mm, o en pulgadas con sufijo "in" (0.1in).
+    """
+    kind, _sep, rest = spec.partition(":")
+    if kind not in TARGET_KINDS or not rest:
+        raise ValueError(f"invalid target {spec!r}")
+
+    size, _sep, pitch = rest.rpartition(":")
+    if pitch.endswith("in"):
+        pitch_mm = float(pitch[:-2]) * MM_PER_INCH
+    else:
+        pitch_mm = float(pitch.removesuffix("mm"))
+    if pitch_mm <= 0:
+        raise ValueError(f"invalid pitch {pitch!r}")
+
+    if kind == "ruler":
+        return Target(kind, 0, 0, pitch_mm)
+
+    cols, rows = map(int, size.lower().split("x"))
+    if cols < 2 or rows < 2:
+        raise ValueError(f"invalid grid size {size!r}")
+    return Target(kind, cols, rows, pitch_mm)
+
+
+# ================= DETECCIÓN =================
+
+def _gray(frame):
+    if frame.ndim == 3:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame
+
+
+def _grid_mm(target):
+    # Coordenadas del patrón en mm, en el orden de OpenCV (fila a fila)
+    j, i = np.mgrid[0:target.rows, 0:target.cols]
+    return np.stack([i.ravel(), j.ravel()], 1) * target.pitch_mm
+
+
+def _detect_checker(gray, target):
+    size = (target.cols, target.rows)
+    found, corners = cv2.findChessboardCornersSB(
+        gray, size, flags=cv2.CALIB_CB_NORMALIZE_IMAGE |
+        cv2.CALIB_CB_ACCURACY)
+    if not found:
+        return None
+    return corners.reshape(-1, 2).astype(np.float64), _grid_mm(target)
+
+
+def _detect_dots(gray, target):
+    size = (target.cols, target.rows)
+    # Puntos oscuros sobre claro o al revés
+    for img in (gray, 255 - gray):
+        found, centers = cv2.findCirclesGrid(
+            img, size, flags=cv2.CALIB_CB_SYMMETRIC_GRID)
+        if found:
+            return (centers.reshape(-1, 2).astype(np.float64),
+                    _grid_mm(target))
+    return None
+
+
+def _detect_ruler(gray, target):
+    """
+    Divisiones de una regla: se orienta la imagen según el gradiente
+    dominante, se proyecta la banda con más contraste en un perfil 1D y
+    cada división es un tramo por encima de media amplitud; su centro es
+    el centroide del tramo. Las posiciones se devuelven a lo largo del
+    eje de la regla.
+    """
+    g = gray.astype(np.float32)
+    gx = cv2.Sobel(g, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(g, cv2.CV_32F, 0, 1, ksize=3)
+
+    # Ángulo doble: el sentido del gradiente no importa
+    theta = 0.5 * np.arctan2(2 * float((gx * gy).sum()),
+                             float((gx * gx - gy * gy).sum()))
+
+    h, w = g.shape
+    rot = cv2.getRotationMatrix2D((w / 2, h / 2), np.degrees(theta), 1.0)
+    aligned = cv2.warpAffine(g, rot, (w, h), flags=cv2.INTER_LINEAR,
+                             borderMode=cv2.BORDER_REPLICATE)
+
+    # Filas con divisiones: mucha energía de gradiente horizontal
+    energy = np.abs(cv2.Sobel(aligned, cv2.CV_32F, 1, 0, ksize=3)).mean(1)
+    band = energy >= 0.5 * energy.max()
+    profile = aligned[band].mean(0).astype(np.float64)
+
+    # Paso alto: quita iluminación y fondo
+    smooth = cv2.GaussianBlur(profile.reshape(1, -1), (0, 0), 15).ravel()
+    detail = profile - smooth
+
+    # Amplitud robusta (percentiles, no la desviación típica: con
+    # divisiones anchas el perfil es casi una onda cuadrada) y ruido a
+    # partir de las diferencias entre muestras vecinas (MAD)
+    lo, mid, hi = np.percentile(detail, (1, 50, 99))
+    noise = 1.4826 * float(np.median(np.abs(np.diff(detail)))) / np.sqrt(2)
+
+    # Polaridad: divisiones oscuras (mínimos) o claras (máximos)
+    if mid - lo > hi - mid:
+        detail = -detail
+        lo, mid, hi = -hi, -mid, -lo
+
+    if hi - mid < RULER_MIN_CONTRAST * max(noise, 1e-6):
+        return None
+
+    # Una división por tramo sobre el umbral (se descartan los que tocan
+    # los extremos del perfil, pueden estar cortados)
+    threshold = 0.5 * (mid + hi)
+    above = np.concatenate([[False], detail > threshold, [False]])
+    edges = np.flatnonzero(np.diff(above.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = (starts > 0) & (ends < len(detail))
+    starts, ends = starts[keep], ends[keep]
+    if len(starts) < MIN_FEATURES:
+        return None
+
+    # Centroide ponderado por lo que sobresale del umbral
+    weight = np.maximum(detail - threshold, 0.0)
+    x = np.arange(len(weight))
+    cum_w = np.concatenate([[0.0], np.cumsum(weight)])
+    cum_xw = np.concatenate([[0.0], np.cumsum(weight * x)])
+    pos = ((cum_xw[ends] - cum_xw[starts]) /
+           (cum_w[ends] - cum_w[starts]))
+
+    # Índice de cada división (tolera divisiones perdidas)
+    step = float(np.median(np.diff(pos)))
+    if step <= 1:
+        return None
+    index = np.rint((pos - pos[0]) / step)
+
+    # Ruido, texto u otro patrón: las posiciones no siguen un paso
+    # regular. El ajuste es cúbico para tolerar la distorsión radial
+    err = pos - np.polyval(np.polyfit(index, pos, 3), index)
+    if np.abs(err).max() > 0.25 * step or \
+            np.sqrt((err ** 2).mean()) > RULER_MAX_JITTER * step:
+        return None
+
+    px = np.stack([pos, np.zeros_like(pos)], 1)
+    mm = np.stack([index * target.pitch_mm, np.zeros_like(pos)], 1)
+    return px, mm
+
+
+_DETECTORS = {
+    "checker": _detect_checker,
+    "dots": _detect_dots,
+    "ruler": _detect_ruler,
+}
+
+
+# ================= AJUSTE =================
+
+def fit_scale(px, mm):
+    """
+    Semejanza mm ≈ s·R·px + t por mínimos cuadrados (Umeyama, admite
+    reflexión). Devuelve (mm/px, residuo RMS en mm).
+    """
+    px = px - px.mean(0)
+    mm = mm - mm.mean(0)
+
+    var = float((px ** 2).sum())
+    if var <= 0:
+        raise ValueError("degenerate target")
+
+    u, sv, vt = np.linalg.svd(mm.T @ px)
+    scale = float(sv.sum()) / var
+    rot = u @ vt
+
+    residual = mm - scale * px @ rot.T
+    rms = float(np.sqrt((residual ** 2).sum(1).mean()))
+    return scale, rms
+
+
+def detect_target(frame, target):
+    """(px, mm): puntos detectados y su posición en el patrón, o None."""
+    found = _DETECTORS[target.kind](_gray(frame), target)
+    if found is None or len(found[0]) < MIN_FEATURES:
+        return None
+    return found
+
+
+def detect_and_fit(frame, target):
+    """Devuelve (mm/px, rms_mm, nº de puntos) o None si no se encuentra."""
+    found = detect_target(frame, target)
+    if found is None:
+        return None
+
+    px, mm = found
+
+    scale, rms = fit_scale(px, mm)
+    return scale, rms, len(px)
+
+
+# ================= HILO =================
+
+class CalibrationJob:
+    """
+    run(frame, target) sobre una copia del frame, fuera del hilo de UI.
+    on_done(state, target, resultado) se llama desde el bucle principal.
+    """
+
+    def __init__(self, run, on_done, frame, target):
+        self.target = target
+        self.on_done = on_done
+        self._result = queue.Queue(maxsize=1)
+
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(run, frame.copy()),
+            name="microscopi-autocal",
+            daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, run, frame):
+        try:
+            self._result.put(run(frame, self.target))
+        except Exception as e:
+            self._result.put(e)
+
+    def result(self):
+        """(True, resultado) al terminar, (False, None) mientras tanto."""
+        try:
+            return True, self._result.get_nowait()
+        except queue.Empty:
+            return False, None
+
+
+def start_job(state, frame, run, on_done, target):
+    """Lanza una detección; solo una a la vez. Devuelve True si empieza."""
+    if state.autocal is not None:
+        state.status_message = _("Calibration in progress")
+        return False
+    if frame is None:
+        return False
+
+    state.autocal = CalibrationJob(run, on_done, frame, target)
+    state.status_message = _("Detecting target:") + f" {target}"
+    return True
+
+
+def poll_autocalibration(state):
+    """Llamar desde el bucle principal: aplica el resultado."""
+    job = state.autocal
+    if job is None:
+        return
+
+    done, result = job.result()
+    if not done:
+        return
+
+    state.autocal = None
+    state.mark_dirty("status")
+
+    if isinstance(result, Exception):
+        state.status_message = _("Calibration failed:") + f" {result}"
+        return
+    if result is None:
+        state.status_message = _("Target not found:") + f" {job.target}"
+        return
+
+    job.on_done(state, job.target, result)
+
+
+# ================= ESCALA =================
+
+def start_autocalibration(state):
+    start_job(state, measured_frame(state), detect_and_fit, _apply_scale,
+              parse_target(state.config.cal_target))
+
+
+def _apply_scale(state, target, result):
+    scale, rms, count = result
+    state.history.execute(state, SetAttr(
+        "scale_mm_per_pixel", state.scale_mm_per_pixel, scale,
+        label="calibration"))
+
+    state.status_message = (
+        _("Calibrated:") + f" {scale:.6f} mm/px, {count} pts, "
+        f"RMS {rms * 1000:.2f} µm ({rms / scale:.2f} px)"
+    )
@@ -0,0 +1,37 @@
+# microscopi/bench.py
+#
+# Bucle principal sin ventana para perfilar captura + render.
+
+import time
+
+from .renderer import render
+from .lens import load_lens
+
+
+def run_benchmark(video, state, frames):
+    t_read = 0.0
+    t_render = 0.0
+
+    for _ in range(frames):
+        t0 = time.perf_counter()
+        frame = video.read()
+        t1 = time.perf_counter()
+
+        if not hasattr(state, "base_width"):
+            state.base_height, state.base_width = frame.shape[:2]
+            load_lens(state, (state.base_width, state.base_height))
+
+        render(frame, state)
+        t2 = time.perf_counter()
+
+        t_read += t1 - t0
+        t_render += t2 - t1
+
+    total = t_read + t_render
+
+    return {
+        "frames": frames,
+        "read_ms": 1000 * t_read / frames,
+        "render_ms": 1000 * t_render / frames,
+        "fps": frames / total if total > 0 else 0.0,
+    }
@@ -0,0 +1,23 @@
+# microscopi/buffers.py
+
+import numpy as np
+
+
+class FramePool:
+    """
+    Buffers persistentes reutilizados frame a frame (canvas, intermedios
+    de rotación y gris). Solo se reservan de nuevo si cambia la forma
+    pedida, así la memoria queda plana en sesiones largas.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=np.uint8):
+        buf = self._buffers.get(name)
+
+        if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+            buf = np.empty(shape, dtype)
+            self._buffers[name] = buf
+
+        return buf
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional, Union
 
 @dataclass
 class Config:
@@ -8,3 +9,23 @@ class Config:
     decimals: int = 3
     default_unit: str = "mm"
     draw_live: bool = True
+    threaded_capture: bool = False
+    fourcc: Optional[str] = None       # MJPG / YUYV / H264 / auto
+    fps: Optional[int] = None
+    buffer_size: Optional[int] = None
+    bench_frames: Optional[int] = None
+    display_width: Union[int, str, None] = None  # px o "auto"
+    grid_pitch: Optional[float] = None   # Paso de rejilla propio (mm)
+    snap: bool = False                   # Ajuste sub-píxel de los clics
+    cal_target: str = "checker:9x6:1"    # Patrón de autocalibración
+    undistort: bool = True               # Corrección de lente si hay tablas
+    session_dir: Optional[str] = None    # Diario de sesión (None → config)
+    new_session: bool = False            # No reanudar la sesión anterior
+    image_format: str = "png"            # Capturas: png / bmp
+    png_compression: int = 1             # 0 (rápido) - 9 (pequeño)
+    output_dir: Optional[str] = None     # Capturas y exportaciones (None → CWD)
+    record_format: str = "avi"           # avi / mp4 / png (secuencia)
+    record_fps: float = 0.0              # 0 → todos los frames
+    record_overlay: bool = False         # Grabar con medidas y rejilla
+    record_drop: str = "drop"            # Sin ranura libre: drop / block
+    record_frames: Optional[int] = None  # Ráfaga: parar tras N frames
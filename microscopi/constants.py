@@ -22,7 +22,7 @@ BUTTONS = [
     "0.0", "0.00", "0.000",
     "GRID",
     "GRY",
-    "PNG", "(0,0)", "3D", "PCB",
+    "PNG", "(0,0)", "3D", "PCB", "EXP",
     "QUIT",
 ]
 
@@ -1,19 +1,32 @@
 import tkinter as tk
-from tkinter import simpledialog, messagebox
+from tkinter import messagebox
 
+# Raíz de Tk compartida: crearla cuesta decenas de ms, así que se crea
+# una sola vez, oculta. Las ventanas no modales (editor) se atienden
+# desde el bucle principal con pump_tk(), sin mainloop.
+_root = None
 
-def ask_string(title, prompt):
-    root = tk.Tk()
-    root.withdraw()
-    root.attributes("-topmost", True)
-    value = simpledialog.askstring(title, prompt, parent=root)
-    root.destroy()
-    return value
+
+def tk_root():
+    global _root
+    if _root is None:
+        _root = tk.Tk()
+        _root.withdraw()
+    return _root
+
+
+def pump_tk():
+    """Procesa eventos de Tk pendientes sin bloquear."""
+    global _root
+    if _root is None:
+        return
+    try:
+        _root.update()
+    except tk.TclError:
+        _root = None
 
 
 def show_error(title, message):
-    root = tk.Tk()
-    root.withdraw()
+    root = tk_root()
     root.attributes("-topmost", True)
     messagebox.showerror(title, message, parent=root)
-    root.destroy()
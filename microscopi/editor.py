@@ -1,7 +1,9 @@
 import json
 import tkinter as tk
-from tkinter import messagebox
 from .i18n import _
+from .dialogs import tk_root
+from .history import ReplaceMeasures
+from .measurements import MeasurementStore
 
 VALID_TYPES = {"DIS", "RAD", "SQR", "XY"}
 
@@ -36,8 +38,9 @@ def validate_measure(m):
         if not isinstance(p, list) or len(p) != 2:
             raise ValueError("Each point must be [x,y]")
 
-        if not all(isinstance(v, int) for v in p):
-            raise ValueError("Point coordinates must be integers")
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool)
+                   for v in p):
+            raise ValueError("Point coordinates must be numbers")
 
     if not (isinstance(m["color"], list) and len(m["color"]) == 3):
         raise ValueError("Color must be [r,g,b]")
@@ -49,11 +52,24 @@ def validate_measure(m):
         raise ValueError("Visible must be true/false")
 
 
+_window = None   # Editor abierto (no modal)
+
+
 def open_measure_editor(state):
+    """
+    Abre el editor JSON sin bloquear: la ventana se atiende desde el
+    bucle principal (dialogs.pump_tk) y la captura sigue mientras tanto.
+    """
+    global _window
+
+    if _window is not None:
+        _window.lift()
+        return
 
-    root = tk.Tk()
+    root = tk.Toplevel(tk_root())
     root.title(_("Measure editor"))
     root.geometry("700x500")
+    _window = root
 
     text = tk.Text(
         root,
@@ -66,7 +82,13 @@ def open_measure_editor(state):
     )
     text.pack(fill=tk.BOTH, expand=True)
 
-    text.insert("1.0", json.dumps(state.measurements, indent=2))
+    text.insert("1.0", json.dumps(state.measurements.to_list(), indent=2))
+
+    def close():
+        global _window
+        _window = None
+        root.destroy()
+        state.mark_dirty("input")
 
     def apply_changes():
         try:
@@ -79,13 +101,15 @@ def open_measure_editor(state):
             for m in new_data:
                 validate_measure(m)
 
-            state.measurements = new_data
+            state.history.execute(
+                state, ReplaceMeasures(MeasurementStore.from_list(new_data)))
             state.status_message = _("Measures updated")
 
-            root.destroy()
+            close()
 
         except Exception as e:
-            messagebox.showerror(_("Invalid JSON"), str(e))
+            # Sin messagebox: sería modal y pararía la captura
+            error.config(text=_("Invalid JSON") + f": {e}")
 
     frame = tk.Frame(root)
     frame.pack(fill=tk.X)
@@ -93,7 +117,10 @@ def open_measure_editor(state):
     btn_apply = tk.Button(frame, text=_("Apply"), command=apply_changes)
     btn_apply.pack(side=tk.LEFT, padx=5, pady=5)
 
-    btn_cancel = tk.Button(frame, text=_("Cancel"), command=root.destroy)
+    btn_cancel = tk.Button(frame, text=_("Cancel"), command=close)
     btn_cancel.pack(side=tk.LEFT, padx=5, pady=5)
 
-    root.mainloop()
+    error = tk.Label(frame, fg="#cc0000", anchor="w")
+    error.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+
+    root.protocol("WM_DELETE_WINDOW", close)
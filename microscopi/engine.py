@@ -1,5 +1,24 @@
-from .actions import calibrate_with_value, add_measure_with_label, undo_measure
+from .actions import (
+    undo,
+    redo,
+    delete_selected_measure,
+    cycle_export_format,
+    toggle_recording,
+)
 from .i18n import _
+from .viewport import ZOOM_STEP, zoom_center, reset_view
+from .grid import cycle_grid_mode, grid_label
+from .panel import page_panel, jump_to_selected
+from .playback import toggle_playback, step_playback, step_seconds
+from .autocal import start_autocalibration
+from .lens import add_lens_view, toggle_undistort
+from .prompt import (
+    prompt_key,
+    ask_calibration,
+    ask_grid_pitch,
+    ask_label_filter,
+    edit_selected_label,
+)
 
 
 def handle_key(state, key):
@@ -9,58 +28,10 @@ def handle_key(state, key):
     """
 
     # ===============================
-    # INPUT CALIBRACIÓN
+    # PROMPT EN LA BARRA INFERIOR
     # ===============================
-    if state.input_mode == "CAL_VALUE":
-
-        if ord('0') <= key <= ord('9') or key == ord('.'):
-            state.input_buffer += chr(key)
-
-        elif key == 8:
-            state.input_buffer = state.input_buffer[:-1]
-
-        elif key == 13:
-            try:
-                calibrate_with_value(state, float(state.input_buffer))
-            except:
-                state.status_message = _("Invalid number")
-
-            state.input_mode = None
-            state.input_buffer = ""
-
-        elif key == 27:
-            state.input_mode = None
-            state.input_buffer = ""
-
-        return True
-
-
-    # ===============================
-    # INPUT LABEL
-    # ===============================
-    if state.input_mode == "LABEL":
-
-        if key != -1:
-            try:
-                ch = chr(key)
-                if ch.isprintable():
-                    if len(state.input_buffer) < 8:
-                        state.input_buffer += ch
-            except:
-                pass
-
-        if key == 8:
-            state.input_buffer = state.input_buffer[:-1]
-
-        elif key == 13:
-            add_measure_with_label(state, state.input_buffer)
-            state.input_mode = None
-            state.input_buffer = ""
-
-        elif key == 27:
-            state.input_mode = None
-            state.input_buffer = ""
-
+    # Calibración, etiqueta, paso de rejilla, filtro... (prompt.py)
+    if prompt_key(state, key):
         return True
 
 
@@ -121,39 +92,162 @@ def handle_key(state, key):
         state.status_message = "Mode: XY"
         return True
 
+    if key == ord('h'):
+        state.snap = not state.snap
+        state.status_message = _("Snap: on") if state.snap else _("Snap: off")
+        return True
+
     if key == ord('g'):
         state.gray = not state.gray
         state.status_message = "Gray mode" if state.gray else "Color mode"
         return True
 
     if key == ord('z'):
-        undo_measure(state)
+        undo(state)
         return True
 
-    if key == ord('m'):
-        from .editor import open_measure_editor
-        open_measure_editor(state)
+    if key == ord('y'):
+        redo(state)
         return True
 
-    if key == ord('b'):
-        if len(state.points) == 2:
-            from tkinter import simpledialog, Tk
-            root = Tk()
-            root.withdraw()
-            value = simpledialog.askstring(
-                _("Calibration"),
-                _("Enter real distance")
+    # Supr (255 en GTK con waitKey) o 'e': borrar la medida seleccionada
+    if key in (255, ord('e')):
+        delete_selected_measure(state)
+        return True
+
+    if key == ord('i'):
+        stats = state.capture_stats
+        if stats is None:
+            state.status_message = _("Threaded capture disabled")
+        else:
+            lag = stats["lag"] * 1000 if stats["lag"] is not None else 0
+            state.status_message = (
+                _("Capture:") +
+                f" {stats['grabbed']} / drop {stats['dropped']}"
+                f" / stale {stats['stale']} / lag {lag:.0f} ms"
             )
-            root.destroy()
+        return True
+
+    # ===============================
+    # REJILLA
+    # ===============================
 
-            if value:
-                try:
-                    calibrate_with_value(state, float(value))
-                except:
-                    state.status_message = _("Invalid number")
+    if key == ord('n'):
+        cycle_grid_mode(state)
+        state.status_message = _("Grid:") + " " + grid_label(state)
+        return True
+
+    if key == ord('o'):
+        state.grid_anchor_origin = not state.grid_anchor_origin
+        state.status_message = _("Grid:") + " " + grid_label(state)
+        return True
+
+    if key == ord('p'):
+        ask_grid_pitch(state)
+        return True
+
+    if key == ord('a'):
+        toggle_recording(state)
+        return True
+
+    if key == ord('w'):
+        cycle_export_format(state)
+        return True
+
+    # ===============================
+    # LISTA DE MEDIDAS
+    # ===============================
+
+    if key in (ord('['), ord(']')):
+        page_panel(state, -1 if key == ord('[') else 1)
+        return True
+
+    if key == ord('t'):
+        state.measure_panel.cycle_type()
+        state.status_message = (
+            _("Filter:") + " " + state.measure_panel.filter_label())
+        return True
+
+    if key == ord('k'):
+        state.measure_panel.cycle_color()
+        state.status_message = (
+            _("Filter:") + " " + state.measure_panel.filter_label())
+        return True
+
+    if key == ord('l'):
+        ask_label_filter(state)
+        return True
+
+    if key == ord('j'):
+        if not jump_to_selected(state):
+            state.status_message = _("No measure selected")
+        return True
+
+    # ===============================
+    # LUPA
+    # ===============================
+
+    if key in (ord('+'), ord('=')):
+        zoom_center(state, ZOOM_STEP)
+        return True
+
+    if key == ord('-'):
+        zoom_center(state, 1 / ZOOM_STEP)
+        return True
+
+    if key == ord('1'):
+        reset_view(state)
+        state.status_message = _("Zoom 1:1")
+        return True
+
+    # ===============================
+    # REPRODUCCIÓN (grabaciones)
+    # ===============================
+
+    if state.playback is not None:
+
+        if key == ord(' '):
+            toggle_playback(state)
+            return True
+
+        if key in (ord(','), ord('.')):
+            step_playback(state, -1 if key == ord(',') else 1)
+            return True
+
+        if key in (ord('<'), ord('>')):
+            step_seconds(state, -1.0 if key == ord('<') else 1.0)
+            return True
+
+    if key == ord('f'):
+        state.frozen = not state.frozen
+        state.status_message = _("Frozen") if state.frozen else _("Live")
+        return True
+
+    if key == ord('m'):
+        # Con una medida seleccionada: editar su etiqueta en la barra
+        if state.selected is not None:
+            edit_selected_label(state)
         else:
-            state.status_message = _("Select two points first")
+            from .editor import open_measure_editor
+            open_measure_editor(state)
+        return True
+
+    if key == ord('b'):
+        ask_calibration(state)
+        return True
+
+    # Mayúscula: calibración automática con el patrón de --cal-target
+    if key == ord('B'):
+        start_autocalibration(state)
+        return True
+
+    # Lente: L añade una vista del patrón, U activa/desactiva la corrección
+    if key == ord('L'):
+        add_lens_view(state)
+        return True
 
+    if key == ord('U'):
+        toggle_undistort(state)
         return True
 
 
@@ -0,0 +1,357 @@
+# microscopi/exporters.py
+#
+# Registro de formatos de exportación. Cada exportador recibe un
+# ExportData (copia de las columnas visibles, tomada en el hilo de UI)
+# y escribe fila a fila en el fichero abierto: nunca se construye la
+# salida completa en memoria. La conversión de unidades se hace de una
+# vez sobre todas las medidas con NumPy.
+
+import csv
+import json
+import os
+import time
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from .constants import (
+    BOTTOM_PANEL_H,
+    LEFT_MENU_W,
+    MM_PER_INCH,
+    RIGHT_PANEL_W,
+    VERSION,
+)
+from .measurements import TYPES
+from .utils import apply_affine, rotation_matrix
+
+EXPORTERS = {}
+
+
+class Exporter:
+    def __init__(self, name, ext, write, needs_scale=False, newline=None):
+        self.name = name
+        self.ext = ext
+        self.write = write              # write(f, data)
+        self.needs_scale = needs_scale  # Solo tiene sentido calibrado
+        self.newline = newline
+
+
+def register(name, ext, needs_scale=False, newline=None):
+    def deco(write):
+        EXPORTERS[name] = Exporter(name, ext, write, needs_scale, newline)
+        return write
+    return deco
+
+
+# ================= DATOS =================
+
+class ExportData:
+    """Medidas visibles y metadatos, independientes de AppState."""
+
+    def __init__(self, state):
+        store = state.measurements
+        idx = store.visible_indices()
+
+        self.types = [TYPES[t] for t in store.types[idx]]
+        self.labels = [store.labels[i] for i in idx.tolist()]
+        self.texts = [store.texts[i] for i in idx.tolist()]
+        palette = [store.palette[c] for c in store.color_idx[idx]]
+        self.colors = [c for c, _name in palette]
+        self.color_names = [name for _c, name in palette]
+
+        self.points = store.points[idx].copy()   # (n, 2, 2) base px
+        self.origin = state.origin
+        self.scale = state.scale_mm_per_pixel
+
+        self.size = (getattr(state, "base_width", None),
+                     getattr(state, "base_height", None))
+        self.image_matrix, self.image_size = _image_frame(
+            self.size, state.rotation)
+
+        self.metadata = {
+            "generator": f"microscopi {VERSION}",
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "scale_mm_per_pixel": self.scale,
+            "origin_px": list(self.origin) if self.origin else None,
+            "rotation": state.rotation,
+            "image_size_px": list(self.size),
+        }
+
+    def __len__(self):
+        return len(self.types)
+
+    def relative(self):
+        """Extremos relativos al origen (o a la esquina), en px base."""
+        origin = self.origin if self.origin else (0.0, 0.0)
+        return self.points - np.asarray(origin, np.float64)
+
+    def coords(self, unit):
+        """(n, 2, 2) relativo al origen en "px", "mm" o "mil"."""
+        rel = self.relative()
+        if unit == "px" or self.scale is None:
+            return rel
+        mm = rel * self.scale
+        if unit == "mil":
+            return mm / MM_PER_INCH * 1000
+        return mm
+
+
+def _image_frame(size, rotation):
+    """
+    Afín base → píxeles de la captura que se guarda con la exportación
+    (canvas completo a escala 1: imagen girada a la derecha del menú,
+    paneles alrededor) y tamaño de esa captura.
+    """
+    w, h = size
+    matrix = rotation_matrix(w or 0, h or 0, rotation)
+    matrix[0, 2] += LEFT_MENU_W
+    if not w or not h:
+        return matrix, (None, None)
+
+    vw, vh = (h, w) if rotation in (90, 270) else (w, h)
+    return matrix, (LEFT_MENU_W + vw + RIGHT_PANEL_W, vh + BOTTOM_PANEL_H)
+
+
+def _unit(data, unit):
+    # Sin calibrar no hay mm: se exporta en píxeles
+    return unit if data.scale is not None else "px"
+
+
+def _rows(data, coords):
+    for k, c in enumerate(coords.reshape(-1, 4).tolist()):
+        yield k, c
+
+
+# ================= CSV =================
+
+def _write_csv(f, data, unit, fmt):
+    unit = _unit(data, unit)
+    coords = data.coords(unit)
+    coords = fmt(coords) if unit != "px" else np.round(coords, 2)
+
+    writer = csv.writer(f)
+    writer.writerow([
+        "label", "type", "color",
+        "x1", "y1", "x2", "y2",
+        "value"
+    ])
+
+    for k, c in _rows(data, coords):
+        writer.writerow(
+            [data.labels[k], data.types[k], data.color_names[k]]
+            + c + [data.texts[k]]
+        )
+
+
+@register("3D", "csv", newline="")
+def write_csv_mm(f, data):
+    _write_csv(f, data, "mm", lambda c: np.round(c, 1))
+
+
+@register("PCB", "csv", newline="")
+def write_csv_mil(f, data):
+    _write_csv(f, data, "mil", lambda c: np.rint(c).astype(int))
+
+
+# ================= JSON =================
+
+@register("JSON", "json")
+def write_json(f, data):
+    unit = _unit(data, "mm")
+    coords = np.round(data.coords(unit), 6)
+
+    meta = dict(data.metadata, unit=unit, count=len(data))
+    f.write('{"metadata": ' + json.dumps(meta) + ',\n "measurements": [')
+
+    for k, c in _rows(data, coords):
+        row = {
+            "label": data.labels[k],
+            "type": data.types[k],
+            "color": data.color_names[k],
+            "points": [c[:2], c[2:]],
+            "text": data.texts[k],
+        }
+        f.write(("\n  " if k == 0 else ",\n  ") + json.dumps(row))
+
+    f.write("\n ]}\n")
+
+
+# ================= DXF =================
+#
+# DXF R12 ASCII: cabecera mínima con las unidades ($INSUNITS = mm) y
+# sección ENTITIES; mm con el eje Y hacia arriba. Una capa por color.
+
+def _dxf(f, *pairs):
+    f.write("".join(
+        f"{code}\n{value:.6f}\n" if isinstance(value, float)
+        else f"{code}\n{value}\n"
+        for code, value in pairs
+    ))
+
+
+def _dxf_line(f, layer, x1, y1, x2, y2):
+    _dxf(f, (0, "LINE"), (8, layer), (10, x1), (20, y1), (30, 0.0),
+         (11, x2), (21, y2), (31, 0.0))
+
+
+@register("DXF", "dxf", needs_scale=True)
+def write_dxf(f, data):
+    coords = data.coords("mm")
+    coords[:, :, 1] *= -1
+
+    _dxf(f, (0, "SECTION"), (2, "HEADER"),
+         (9, "$INSUNITS"), (70, 4), (9, "$MEASUREMENT"), (70, 1),
+         (0, "ENDSEC"))
+    _dxf(f, (0, "SECTION"), (2, "ENTITIES"))
+
+    for k, (x1, y1, x2, y2) in _rows(data, coords):
+        layer = data.color_names[k] or "0"
+        mtype = data.types[k]
+
+        if mtype == "DIS":
+            _dxf_line(f, layer, x1, y1, x2, y2)
+        elif mtype == "SQR":
+            for a, b, c, d in ((x1, y1, x2, y1), (x2, y1, x2, y2),
+                               (x2, y2, x1, y2), (x1, y2, x1, y1)):
+                _dxf_line(f, layer, a, b, c, d)
+        elif mtype == "RAD":
+            r = float(np.hypot(x2 - x1, y2 - y1))
+            _dxf(f, (0, "CIRCLE"), (8, layer), (10, x1), (20, y1),
+                 (30, 0.0), (40, r))
+        else:
+            _dxf(f, (0, "POINT"), (8, layer), (10, x1), (20, y1), (30, 0.0))
+
+        if data.labels[k]:
+            _dxf(f, (0, "TEXT"), (8, layer), (10, x1), (20, y1), (30, 0.0),
+                 (40, 0.5), (1, data.labels[k]))
+
+    _dxf(f, (0, "ENDSEC"), (0, "EOF"))
+
+
+# ================= KICAD =================
+#
+# Huella .kicad_mod (formato KiCad 6). Las medidas van a Dwgs.User; la
+# variante EDGE pone líneas, rectángulos y círculos en Edge.Cuts para
+# usarlos como contorno de placa.
+
+_KICAD_WIDTH = 0.1
+
+
+def _kicad_str(text):
+    return json.dumps(text)
+
+
+def _write_kicad(f, data, layer, edge):
+    coords = data.coords("mm")
+    name = "microscopi_" + time.strftime("%Y%m%d_%H%M%S")
+
+    f.write(f'(footprint {_kicad_str(name)} (version 20211014) '
+            f'(generator microscopi)\n  (layer "F.Cu")\n')
+
+    w = _KICAD_WIDTH
+    for k, (x1, y1, x2, y2) in _rows(data, coords):
+        mtype = data.types[k]
+
+        if mtype == "DIS":
+            f.write(f'  (fp_line (start {x1:.4f} {y1:.4f}) '
+                    f'(end {x2:.4f} {y2:.4f}) (layer "{layer}") '
+                    f'(width {w}))\n')
+        elif mtype == "SQR":
+            f.write(f'  (fp_rect (start {x1:.4f} {y1:.4f}) '
+                    f'(end {x2:.4f} {y2:.4f}) (layer "{layer}") '
+                    f'(width {w}) (fill none))\n')
+        elif mtype == "RAD":
+            f.write(f'  (fp_circle (center {x1:.4f} {y1:.4f}) '
+                    f'(end {x2:.4f} {y2:.4f}) (layer "{layer}") '
+                    f'(width {w}) (fill none))\n')
+        elif not edge:
+            f.write(f'  (fp_circle (center {x1:.4f} {y1:.4f}) '
+                    f'(end {x1 + 0.2:.4f} {y1:.4f}) (layer "{layer}") '
+                    f'(width {w}) (fill none))\n')
+
+        if not edge and data.labels[k]:
+            f.write(f'  (fp_text user {_kicad_str(data.labels[k])} '
+                    f'(at {x1:.4f} {y1:.4f}) (layer "Cmts.User")\n'
+                    f'    (effects (font (size 0.5 0.5) '
+                    f'(thickness 0.08))))\n')
+
+    f.write(")\n")
+
+
+@register("KICAD", "kicad_mod", needs_scale=True)
+def write_kicad(f, data):
+    _write_kicad(f, data, "Dwgs.User", edge=False)
+
+
+@register("KICAD-EDGE", "kicad_mod", needs_scale=True)
+def write_kicad_edge(f, data):
+    _write_kicad(f, data, "Edge.Cuts", edge=True)
+
+
+# ================= SVG =================
+#
+# Capa superpuesta a la captura que se guarda con la exportación: las
+# coordenadas (no relativas al origen) se llevan al marco de esa imagen,
+# girada y desplazada por el menú izquierdo.
+
+def _svg_color(bgr):
+    b, g, r = bgr
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+@register("SVG", "svg")
+def write_svg(f, data):
+    w, h = data.image_size
+    size = f' width="{w}" height="{h}" viewBox="0 0 {w} {h}"' if w else ""
+    points = apply_affine(data.image_matrix, data.points.reshape(-1, 2))
+
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg"{size}>\n'
+            '<g fill="none" stroke-width="2" font-family="sans-serif" '
+            'font-size="18">\n')
+
+    for k, (x1, y1, x2, y2) in _rows(data, points):
+        mtype = data.types[k]
+        color = _svg_color(data.colors[k])
+        title = escape(f"{data.labels[k]} {data.texts[k]}")
+
+        if mtype == "DIS":
+            shape = (f'<line x1="{x1:g}" y1="{y1:g}" x2="{x2:g}" '
+                     f'y2="{y2:g}"')
+        elif mtype == "SQR":
+            shape = (f'<rect x="{min(x1, x2):g}" y="{min(y1, y2):g}" '
+                     f'width="{abs(x2 - x1):g}" height="{abs(y2 - y1):g}"')
+        elif mtype == "RAD":
+            r = float(np.hypot(x2 - x1, y2 - y1))
+            shape = f'<circle cx="{x1:g}" cy="{y1:g}" r="{r:g}"'
+        else:
+            shape = (f'<circle cx="{x1:g}" cy="{y1:g}" r="4" '
+                     f'fill="{color}"')
+
+        f.write(f'{shape} stroke="{color}"><title>{title}</title>'
+                f'</{shape[1:shape.index(" ")]}>\n')
+
+        if data.labels[k]:
+            f.write(f'<text x="{x1:g}" y="{y1 - 6:g}" fill="{color}" '
+                    f'stroke="none">{escape(data.labels[k])}</text>\n')
+
+    f.write("</g>\n</svg>\n")
+
+
+# ================= ESCRITURA =================
+
+def export_to(path, exporter, data):
+    # Temporal en el mismo directorio y os.replace: un fallo a medias
+    # nunca deja un fichero truncado con el nombre final
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", newline=exporter.newline,
+                  encoding="utf-8") as f:
+            exporter.write(f, data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
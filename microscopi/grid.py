@@ -0,0 +1,94 @@
+# microscopi/grid.py
+#
+# Geometría de la rejilla calculada de una vez con NumPy por
+# (escala, rotación, tamaño base, paso, ancla) y dibujada con una sola
+# llamada a cv2.polylines.
+
+import numpy as np
+
+from .constants import MM_PER_INCH
+
+# Modos de rejilla → paso en mm ("custom" usa state.grid_pitch_mm)
+GRID_MODES = {
+    "0.1in": 0.1 * MM_PER_INCH,
+    "1mm": 1.0,
+    "custom": None,
+}
+
+
+def grid_pitch_mm(state):
+    if state.grid_mode == "custom":
+        return state.grid_pitch_mm
+    return GRID_MODES[state.grid_mode]
+
+
+def cycle_grid_mode(state):
+    modes = list(GRID_MODES)
+
+    # El modo propio solo entra en el ciclo si hay paso definido
+    if not state.grid_pitch_mm:
+        modes.remove("custom")
+
+    i = modes.index(state.grid_mode) if state.grid_mode in modes else -1
+    state.grid_mode = modes[(i + 1) % len(modes)]
+    return state.grid_mode
+
+
+def grid_label(state):
+    pitch = grid_pitch_mm(state)
+    if state.grid_mode == "0.1in":
+        label = '0.1"'
+    else:
+        label = f"{pitch:g} mm"
+    if state.grid_anchor_origin and state.origin:
+        label += " @ (0,0)"
+    return label
+
+
+def _positions(anchor, step, size):
+    # Todas las líneas a paso fijo que caen en [0, size), alineadas
+    # con anchor
+    first = np.ceil(-anchor / step)
+    last = np.floor((size - 1 - anchor) / step)
+    return anchor + step * np.arange(first, last + 1)
+
+
+def grid_segments(state):
+    """
+    Segmentos de la rejilla en coordenadas base, (N, 2, 2) float.
+    Se cachean en state.grid_geometry hasta que cambie la clave.
+    """
+    pitch = grid_pitch_mm(state)
+    if not pitch or state.scale_mm_per_pixel is None:
+        return None
+
+    step = pitch / state.scale_mm_per_pixel
+    if step < 2:
+        return None   # Demasiado densa para ser útil
+
+    anchor = (0.0, 0.0)
+    if state.grid_anchor_origin and state.origin:
+        anchor = tuple(float(v) for v in state.origin)
+
+    w, h = state.base_width, state.base_height
+    key = (step, anchor, w, h)
+
+    if state.grid_geometry is not None and state.grid_geometry[0] == key:
+        return state.grid_geometry[1]
+
+    xs = _positions(anchor[0], step, w)
+    ys = _positions(anchor[1], step, h)
+
+    vertical = np.empty((len(xs), 2, 2))
+    vertical[:, :, 0] = xs[:, None]
+    vertical[:, 0, 1] = 0
+    vertical[:, 1, 1] = h
+
+    horizontal = np.empty((len(ys), 2, 2))
+    horizontal[:, :, 1] = ys[:, None]
+    horizontal[:, 0, 0] = 0
+    horizontal[:, 1, 0] = w
+
+    segments = np.concatenate([vertical, horizontal])
+    state.grid_geometry = (key, segments)
+    return segments
@@ -0,0 +1,288 @@
+# microscopi/history.py
+#
+# Historial deshacer/rehacer basado en comandos. Cada comando guarda
+# solo su diferencia (la fila añadida o borrada, el valor anterior...),
+# así cada paso cuesta lo mismo con 10 que con 10.000 medidas. La
+# sustitución completa desde el editor comparte los almacenes: deshacer
+# solo intercambia la referencia.
+#
+# El historial tiene un presupuesto de memoria; al superarlo se
+# descartan las entradas más antiguas.
+
+import abc
+from collections import deque
+
+HISTORY_BUDGET = 32 * 1024 * 1024   # Bytes aproximados
+
+_ENTRY_COST = 256                   # Comando pequeño (valores, ids)
+_ROW_COST = 160                     # Una fila de MeasurementStore
+
+
+class Command(abc.ABC):
+    label = ""
+    cost = _ENTRY_COST
+
+    @abc.abstractmethod
+    def apply(self, state):
+        ...
+
+    @abc.abstractmethod
+    def revert(self, state):
+        ...
+
+    @abc.abstractmethod
+    def journal(self, forward=True):
+        """Registro del diario de sesión tras aplicar (o revertir)."""
+
+
+# ================= MEDIDAS =================
+
+class InsertMeasure(Command):
+    label = "add"
+
+    def __init__(self, row, pos=None, mid=None):
+        self.row = row      # dict en el formato de MeasurementStore.row
+        self.pos = pos      # None → al final
+        self.mid = mid
+        self.cost = _ENTRY_COST + _ROW_COST
+
+    def apply(self, state):
+        store = state.measurements
+        pos = store.n if self.pos is None else self.pos
+        m = self.row
+
+        i = store.insert(pos, m["type"], m["label"], m["text"],
+                         m["color"], m["color_name"], m["points"],
+                         m["visible"], mid=self.mid)
+        self.mid = int(store.ids[i])
+
+    def revert(self, state):
+        store = state.measurements
+        store.delete(store.row_of(self.mid))
+        _forget(state, self.mid)
+
+    def journal(self, forward=True):
+        if not forward:
+            return {"op": "delete", "mid": self.mid}
+        return {"op": "insert", "pos": self.pos, "mid": self.mid,
+                "row": _json_row(self.row)}
+
+
+class DeleteMeasure(Command):
+    label = "delete"
+
+    def __init__(self, mid):
+        self.mid = mid
+        self.row = None
+        self.pos = None
+        self.cost = _ENTRY_COST + _ROW_COST
+
+    def apply(self, state):
+        store = state.measurements
+        self.pos = store.row_of(self.mid)
+        self.row = store.delete(self.pos)
+        _forget(state, self.mid)
+
+    def revert(self, state):
+        InsertMeasure(self.row, self.pos, self.mid).apply(state)
+
+    def journal(self, forward=True):
+        if forward:
+            return {"op": "delete", "mid": self.mid}
+        return {"op": "insert", "pos": self.pos, "mid": self.mid,
+                "row": _json_row(self.row)}
+
+
+class ToggleVisible(Command):
+    label = "visibility"
+
+    def __init__(self, mid):
+        self.mid = mid
+
+    def apply(self, state):
+        store = state.measurements
+        store.toggle(store.row_of(self.mid))
+
+    revert = apply
+
+    def journal(self, forward=True):
+        return {"op": "toggle", "mid": self.mid}
+
+
+class SetPoints(Command):
+    """Extremos y texto de una medida (arrastre de un extremo)."""
+
+    label = "move"
+
+    def __init__(self, mid, before, after):
+        self.mid = mid
+        self.before = before   # (puntos, texto)
+        self.after = after
+
+    def _set(self, state, value):
+        store = state.measurements
+        i = store.row_of(self.mid)
+        points, text = value
+        store.set_points(i, points)
+        store.set_text(i, text)
+
+    def apply(self, state):
+        self._set(state, self.after)
+
+    def revert(self, state):
+        self._set(state, self.before)
+
+    def journal(self, forward=True):
+        points, text = self.after if forward else self.before
+        return {"op": "points", "mid": self.mid,
+                "points": [list(p) for p in points], "text": text}
+
+
+class SetLabel(Command):
+    label = "label"
+
+    def __init__(self, mid, old, new):
+        self.mid = mid
+        self.old = old
+        self.new = new
+
+    def _set(self, state, value):
+        store = state.measurements
+        store.set_label(store.row_of(self.mid), value)
+
+    def apply(self, state):
+        self._set(state, self.new)
+
+    def revert(self, state):
+        self._set(state, self.old)
+
+    def journal(self, forward=True):
+        return {"op": "label", "mid": self.mid,
+                "label": self.new if forward else self.old}
+
+
+class ReplaceMeasures(Command):
+    """Sustitución completa (editor JSON): se intercambian almacenes."""
+
+    label = "edit"
+
+    def __init__(self, new_store):
+        self.new = new_store
+        self.old = None
+        self.cost = _ENTRY_COST + _ROW_COST * len(new_store)
+
+    def apply(self, state):
+        if self.old is None:
+            self.old = state.measurements
+            self.cost += _ROW_COST * len(self.old)
+        state.measurements = self.new
+        _forget(state)
+
+    def revert(self, state):
+        state.measurements = self.old
+        _forget(state)
+
+    def journal(self, forward=True):
+        store = self.new if forward else self.old
+        return {"op": "replace", "rows": store.to_list(),
+                "ids": store.ids[:store.n].tolist()}
+
+
+# ================= ESTADO =================
+
+class SetAttr(Command):
+    """Atributo simple de AppState (calibración, origen...)."""
+
+    def __init__(self, name, old, new, label=None):
+        self.label = label or name
+        self.name = name
+        self.old = old
+        self.new = new
+
+    def apply(self, state):
+        setattr(state, self.name, self.new)
+
+    def revert(self, state):
+        setattr(state, self.name, self.old)
+
+    def journal(self, forward=True):
+        return {"op": "set", "name": self.name,
+                "value": self.new if forward else self.old}
+
+
+def _json_row(m):
+    m = dict(m)
+    m["color"] = list(m["color"])
+    m["points"] = [list(p) for p in m["points"]]
+    return m
+
+
+def _forget(state, mid=None):
+    # La selección apunta a ids que pueden haber dejado de existir
+    if mid is None or state.selected == mid:
+        state.selected = None
+    if mid is None or state.hover == mid:
+        state.hover = None
+    state.drag_endpoint = None
+
+
+# ================= HISTORIAL =================
+
+class History:
+    def __init__(self, budget=HISTORY_BUDGET):
+        self.budget = budget
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.size = 0
+        self.listener = None   # listener(cmd, forward) tras cada cambio
+
+    def _notify(self, cmd, forward):
+        if self.listener is not None:
+            self.listener(cmd, forward)
+
+    def execute(self, state, cmd):
+        """Aplica el comando y lo registra."""
+        cmd.apply(state)
+        self.record(state, cmd)
+
+    def record(self, state, cmd):
+        """Registra un comando ya aplicado (p. ej. al soltar un arrastre)."""
+        for old in self.redo_stack:
+            self.size -= old.cost
+        self.redo_stack.clear()
+
+        self.undo_stack.append(cmd)
+        self.size += cmd.cost
+        self._evict()
+        self._notify(cmd, True)
+        state.measurements_changed()
+
+    def _evict(self):
+        # Se conserva siempre al menos la última entrada
+        while self.size > self.budget and len(self.undo_stack) > 1:
+            self.size -= self.undo_stack.popleft().cost
+
+    def undo(self, state):
+        if not self.undo_stack:
+            return None
+        cmd = self.undo_stack.pop()
+        cmd.revert(state)
+        self.redo_stack.append(cmd)
+        self._notify(cmd, False)
+        state.measurements_changed()
+        return cmd
+
+    def redo(self, state):
+        if not self.redo_stack:
+            return None
+        cmd = self.redo_stack.pop()
+        cmd.apply(state)
+        self.undo_stack.append(cmd)
+        self._notify(cmd, True)
+        state.measurements_changed()
+        return cmd
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
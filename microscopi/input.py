@@ -1,52 +1,69 @@
 import cv2
 from .constants import LEFT_MENU_W, RIGHT_PANEL_W, COLOR_MAP
-from .constants import MEASURE_LIST_TOP, MEASURE_ROW_HEIGHT
 from .ui import hit_menu
 from .actions import (
-    calibrate_with_value,
-    add_measure_with_label,
-    undo_measure,
+    undo,
     save_png,
     save_export,
+    set_origin,
+    toggle_measure,
+    begin_point_drag,
+    move_measure_point,
+    end_point_drag,
 )
 from .i18n import _
-from .utils import to_base_coords
+from .utils import display_to_base
+from .viewport import ZOOM_STEP, zoom_at, pan_by
+from .grid import grid_label
+from .panel import scroll_panel, panel_hit
+from .prompt import ask_calibration, ask_label
+from .playback import scrub_hit
+from .snap import snap_click
+
+# Filas desplazadas por cada paso de la rueda en el panel de medidas
+PANEL_WHEEL_ROWS = 3
 
 
 def mouse(event, x, y, flags, state):
 
-    state.cursor_pos = (x, y)
+    if state.cursor_pos != (x, y):
+        state.cursor_pos = (x, y)
+        state.mark_dirty("cursor")
+
+    if _handle_viewport(event, x, y, flags, state):
+        return
+
+    if _handle_scrubber(event, x, y, flags, state):
+        return
+
+    if _handle_selection(event, x, y, flags, state):
+        return
 
     if event != cv2.EVENT_LBUTTONDOWN:
         return
 
+    state.mark_dirty("input")
+
     cmd = hit_menu(x, y)
 
     # --- CLICK EN PANEL DERECHO ---
-    if state.last_frame is not None:
+    if state.canvas_size is not None:
 
-        panel_x_start = state.last_frame.shape[1] - RIGHT_PANEL_W
+        panel_x_start = state.canvas_size[0] - RIGHT_PANEL_W
 
         if x >= panel_x_start:
 
-            # La primera fila empieza realmente en 30 - 14
-            list_top = MEASURE_LIST_TOP - 14
-
-            rel_y = y - list_top
+            hit = panel_hit(state, x - panel_x_start, y)
 
-            if rel_y >= 0:
-                idx = rel_y // MEASURE_ROW_HEIGHT
-            else:
-                idx = -1
+            if hit is not None:
+                real_idx, on_checkbox = hit
 
-            # Solo mostramos las últimas 14
-            start = max(0, len(state.measurements) - 14)
-            visible_count = min(14, len(state.measurements))
-
-            if 0 <= idx < visible_count:
-                real_idx = start + idx
-                state.measurements[real_idx]["visible"] = \
-                    not state.measurements[real_idx]["visible"]
+                if on_checkbox:
+                    toggle_measure(state, real_idx)
+                else:
+                    # Clic en el texto: seleccionar la medida en la imagen
+                    state.selected = int(state.measurements.ids[real_idx])
+                    state.mark_dirty("panel")
 
             return
 
@@ -56,20 +73,18 @@ def mouse(event, x, y, flags, state):
 
     # --- CLICK EN ÁREA DE VÍDEO ---
 
-    px = x - LEFT_MENU_W
-    py = y
+    # Pantalla (posiblemente reducida) → base a resolución completa
+    px, py = display_to_base(state, x - LEFT_MENU_W, y)
 
-    px, py = to_base_coords(
-        px,
-        py,
-        state.base_width,
-        state.base_height,
-        state.rotation
-    )
+    if state.mode == "XY":
+        state.status_message = _("Point selected")
+
+    # Modo snap: esquina o borde más cercano, con decimales
+    px, py = snap_click(state, px, py)
 
     if state.mode == "XY":
         state.points = [(px, py)]
-        state.status_message = _("Point selected")
+        state.mark_dirty("points")
         return
 
     state.points.append((px, py))
@@ -77,25 +92,157 @@ def mouse(event, x, y, flags, state):
     if len(state.points) > 2:
         state.points = []
 
+    state.mark_dirty("points")
+
+
+def _in_video_area(x, y, state):
+    if state.display_size is None:
+        return False
+    dw, dh = state.display_size
+    return 0 <= x - LEFT_MENU_W < dw and 0 <= y < dh
+
+
+def _in_panel(x, state):
+    if state.canvas_size is None:
+        return False
+    return x >= state.canvas_size[0] - RIGHT_PANEL_W
+
+
+def _handle_viewport(event, x, y, flags, state):
+    """Rueda → zoom, botón central o derecho arrastrando → desplazar."""
+
+    if event == cv2.EVENT_MOUSEWHEEL and _in_panel(x, state):
+        up = cv2.getMouseWheelDelta(flags) > 0
+        scroll_panel(state, -PANEL_WHEEL_ROWS if up else PANEL_WHEEL_ROWS)
+        return True
+
+    if event == cv2.EVENT_MOUSEWHEEL and _in_video_area(x, y, state):
+        factor = ZOOM_STEP if cv2.getMouseWheelDelta(flags) > 0 \
+            else 1 / ZOOM_STEP
+        zoom_at(state, x - LEFT_MENU_W, y, factor)
+        return True
+
+    if event in (cv2.EVENT_MBUTTONDOWN, cv2.EVENT_RBUTTONDOWN):
+        if _in_video_area(x, y, state):
+            state.drag_pos = (x, y)
+            return True
+
+    if event in (cv2.EVENT_MBUTTONUP, cv2.EVENT_RBUTTONUP):
+        state.drag_pos = None
+        return True
+
+    if event == cv2.EVENT_MOUSEMOVE and state.drag_pos is not None:
+        if flags & (cv2.EVENT_FLAG_MBUTTON | cv2.EVENT_FLAG_RBUTTON):
+            lx, ly = state.drag_pos
+            pan_by(state, x - lx, y - ly)
+            state.drag_pos = (x, y)
+            return True
+        state.drag_pos = None
+
+    return False
+
+
+def _handle_scrubber(event, x, y, flags, state):
+    """Clic o arrastre en la barra de reproducción → seek."""
+
+    if state.playback is None:
+        return False
+
+    if event == cv2.EVENT_LBUTTONUP and state.scrubbing:
+        state.scrubbing = False
+        return True
+
+    if event == cv2.EVENT_MOUSEMOVE and state.scrubbing:
+        if not flags & cv2.EVENT_FLAG_LBUTTON:
+            state.scrubbing = False
+            return False
+        state.playback.seek(scrub_hit(state, x, y, dragging=True))
+        return True
+
+    if event == cv2.EVENT_LBUTTONDOWN:
+        n = scrub_hit(state, x, y)
+        if n is not None:
+            state.scrubbing = True
+            state.playback.seek(n)
+            return True
+
+    return False
+
+
+# Tolerancia de selección en píxeles de pantalla
+HIT_TOLERANCE = 8
+
+
+def _hit_measure(x, y, state):
+    """Medida bajo el punto de pantalla: (fila, extremo) o None."""
+    if not state.measurements or not _in_video_area(x, y, state):
+        return None
+
+    bx, by = display_to_base(state, x - LEFT_MENU_W, y)
+    k = state.view_transform[2]
+    return state.measurements.hit(bx, by, HIT_TOLERANCE / k)
+
+
+def _handle_selection(event, x, y, flags, state):
+    """
+    Ctrl+clic selecciona la medida bajo el cursor; si se pulsa sobre un
+    extremo se arrastra. Al mover el ratón se resalta la medida que hay
+    debajo.
+    """
+    store = state.measurements
+
+    if event == cv2.EVENT_MOUSEMOVE:
+
+        if state.drag_endpoint is not None:
+            i = store.row_of(state.drag_endpoint[0])
+            if i is None or not flags & cv2.EVENT_FLAG_LBUTTON:
+                end_point_drag(state)
+                return False
+
+            px, py = display_to_base(state, x - LEFT_MENU_W, y)
+            move_measure_point(state, i, state.drag_endpoint[1], (px, py))
+            return True
+
+        hit = _hit_measure(x, y, state)
+        hover = int(store.ids[hit[0]]) if hit else None
+        if hover != state.hover:
+            state.hover = hover
+            state.mark_dirty("hover")
+        return False
+
+    if event == cv2.EVENT_LBUTTONUP and state.drag_endpoint is not None:
+        end_point_drag(state)
+        state.status_message = _("Measure updated")
+        state.mark_dirty("input")
+        return True
+
+    if event == cv2.EVENT_LBUTTONDOWN and flags & cv2.EVENT_FLAG_CTRLKEY:
+        if not _in_video_area(x, y, state):
+            return False
+
+        hit = _hit_measure(x, y, state)
+        state.mark_dirty("input")
+
+        if hit is None:
+            state.selected = None
+            return True
+
+        i, which = hit
+        state.selected = int(store.ids[i])
+        state.status_message = (
+            _("Selected:") + f" {store.labels[i]} {store.texts[i]}"
+        )
+        if which is not None:
+            begin_point_drag(state, i, which)
+        return True
+
+    return False
+
 
 def _handle_menu_command(cmd, state):
 
     if cmd == "CAL":
-        if len(state.points) == 2:
-            from tkinter import simpledialog, Tk
-            root = Tk()
-            root.withdraw()
-            value = simpledialog.askstring(_("Calibration"),
-                                           _("Enter real distance"))
-            root.destroy()
-
-            if value:
-                try:
-                    calibrate_with_value(state, float(value))
-                except:
-                    state.status_message = _("Invalid number")
-        else:
-            state.status_message = _("Select two points first")
+        ask_calibration(state)
 
     elif cmd in ("0.0", "0.00", "0.000"):
         state.config.decimals = len(cmd) - 2
@@ -105,23 +252,10 @@ def _handle_menu_command(cmd, state):
         state.mode = cmd
 
     elif cmd == "ADD":
-        if (state.mode == "XY" and len(state.points) == 1) or \
-           (state.mode != "XY" and len(state.points) == 2):
-
-            from tkinter import simpledialog, Tk
-            root = Tk()
-            root.withdraw()
-            label = simpledialog.askstring(_("New measure"),
-                                           _("Enter label"))
-            root.destroy()
-
-            if label:
-                add_measure_with_label(state, label)
-        else:
-            state.status_message = _("Select required points first")
+        ask_label(state)
 
     elif cmd == "UNDO":
-        undo_measure(state)
+        undo(state)
 
     elif cmd in COLOR_MAP:
         state.measure_color = COLOR_MAP[cmd]
@@ -139,7 +273,10 @@ def _handle_menu_command(cmd, state):
             state.status_message = _("Calibrate first")
         else:
             state.grid_enabled = not state.grid_enabled
-            state.status_message = _("Grid ON") if state.grid_enabled else _("Grid OFF")
+            state.status_message = (
+                _("Grid ON") + " " + grid_label(state)
+                if state.grid_enabled else _("Grid OFF")
+            )
 
     elif cmd == "ROT":
         state.rotation = (state.rotation + 90) % 360
@@ -149,7 +286,7 @@ def _handle_menu_command(cmd, state):
 
     elif cmd == "(0,0)":
         if state.mode == "XY" and len(state.points) == 1:
-            state.origin = state.points[0]
+            set_origin(state, state.points[0])
             state.status_message = _("Origin set")
             state.points = []
         else:
@@ -161,5 +298,8 @@ def _handle_menu_command(cmd, state):
     elif cmd == "PCB":
         save_export(state, "PCB")
 
+    elif cmd == "EXP":
+        save_export(state, state.export_format)
+
     elif cmd == "QUIT":
         state.quit = True
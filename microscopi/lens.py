@@ -0,0 +1,196 @@
+# microscopi/lens.py
+#
+# Corrección de distorsión de la lente. Con varias vistas del patrón
+# de --cal-target (tablero o puntos) se estiman intrínsecos y
+# distorsión (calibrateCamera). De ahí salen las tablas de remap en
+# punto fijo, que se guardan en disco por (dispositivo, resolución):
+# al arrancar solo se cargan. Las tablas guardan coordenadas absolutas
+# del origen, así que render() corrige solo la zona visible recortando
+# las tablas; el frame completo corregido se calcula cuando se mide
+# (snap, autocalibración). Las medidas trabajan sobre la imagen
+# corregida: con medidas o calibración la corrección no se cambia.
+
+import re
+import zipfile
+
+import cv2
+import numpy as np
+
+from .autocal import detect_target, parse_target, start_job
+from .i18n import _
+from .user_config import CONFIG_DIR
+
+LENS_DIR = CONFIG_DIR / "lens"
+LENS_MIN_VIEWS = 3
+
+# Lentes baratas: k1, k2 radiales bastan. Con vistas casi frontales la
+# focal está mal condicionada: se parte de una estimación y el centro
+# óptico se fija en el centro de la imagen
+LENS_FLAGS = (cv2.CALIB_USE_INTRINSIC_GUESS | cv2.CALIB_FIX_PRINCIPAL_POINT |
+              cv2.CALIB_FIX_ASPECT_RATIO | cv2.CALIB_ZERO_TANGENT_DIST |
+              cv2.CALIB_FIX_K3)
+
+
+class LensModel:
+    def __init__(self, camera, dist, size, rms, views, maps=None):
+        self.camera = camera      # Matriz intrínseca 3x3
+        self.dist = dist          # k1, k2, p1, p2, k3
+        self.size = tuple(size)   # (ancho, alto)
+        self.rms = rms            # Error de reproyección (px)
+        self.views = views
+
+        if maps is None:
+            maps = cv2.initUndistortRectifyMap(
+                camera, dist, None, camera, self.size, cv2.CV_16SC2)
+        self.map1, self.map2 = maps
+
+    def fits(self, frame):
+        h, w = frame.shape[:2]
+        return self.size == (w, h)
+
+    def remap(self, frame, rect=None, dst=None):
+        """Frame corregido, o solo la zona rect=(x0, y0, x1, y1)."""
+        map1, map2 = self.map1, self.map2
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            map1, map2 = map1[y0:y1, x0:x1], map2[y0:y1, x0:x1]
+        return cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=dst)
+
+    def save(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, camera=self.camera, dist=self.dist,
+                     size=np.array(self.size), rms=self.rms,
+                     views=self.views, map1=self.map1, map2=self.map2)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            maps = (data["map1"], data["map2"])
+            return cls(data["camera"], data["dist"], data["size"],
+                       float(data["rms"]), int(data["views"]), maps)
+
+
+def lens_path(device, size):
+    """Fichero de tablas para (dispositivo, resolución)."""
+    name = re.sub(r"[^A-Za-z0-9.-]+", "_", str(device)).strip("_")
+    return LENS_DIR / f"{name or 'device'}_{size[0]}x{size[1]}.npz"
+
+
+def load_lens(state, size):
+    """Carga las tablas guardadas (si las hay) para la resolución actual."""
+    path = lens_path(state.config.video_device, size)
+    # Fichero ausente, truncado o de otra versión: como si no hubiera
+    try:
+        lens = LensModel.load(path)
+    except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile,
+            cv2.error):
+        return
+    if lens.size == tuple(size):
+        state.lens = lens
+
+
+# ================= RENDER =================
+
+def undistort_view(frame, state, pool, rect):
+    """Zona visible rect=(x0, y0, x1, y1), corregida si hay modelo."""
+    x0, y0, x1, y1 = rect
+    lens = state.lens
+
+    if lens is None or not state.undistort or not lens.fits(frame):
+        return frame[y0:y1, x0:x1]
+
+    dst = pool.get("undistort", (y1 - y0, x1 - x0) + frame.shape[2:],
+                   frame.dtype)
+    return lens.remap(frame, rect, dst)
+
+
+def _lens_locked(state):
+    # Medidas y mm/px están en coordenadas de la imagen corregida (o sin
+    # corregir): cambiar la corrección las movería sin avisar
+    return len(state.measurements) > 0 or state.scale_mm_per_pixel is not None
+
+
+def toggle_undistort(state):
+    if state.lens is None:
+        state.status_message = _("No lens calibration")
+        return
+    if _lens_locked(state):
+        state.status_message = _(
+            "Lens correction locked: clear measurements and calibration first")
+        return
+    state.undistort = not state.undistort
+    # El frame corregido ya no vale (snap, autocalibración); con la
+    # imagen congelada o en pausa hay que volver a pintar igualmente
+    state.lens_frame = None
+    state.mark_dirty("frame")
+    state.status_message = (
+        _("Lens correction on") if state.undistort
+        else _("Lens correction off"))
+
+
+# ================= CALIBRACIÓN =================
+
+def add_lens_view(state):
+    """
+    Añade una vista del patrón. Desde LENS_MIN_VIEWS vistas se
+    recalibra con todas; cada vista nueva afina el modelo.
+    """
+    target = parse_target(state.config.cal_target)
+    if target.kind == "ruler":
+        state.status_message = _("Lens calibration needs a 2D target")
+        return
+
+    views = state.lens_views
+    device = state.config.video_device
+
+    def run(frame, target):
+        found = detect_target(frame, target)
+        if found is None:
+            return None
+
+        px, mm = found
+        views.append((px.astype(np.float32),
+                      np.hstack([mm, np.zeros((len(mm), 1))])
+                      .astype(np.float32)))
+        if len(views) < LENS_MIN_VIEWS:
+            return len(views)
+
+        h, w = frame.shape[:2]
+        f = float(max(w, h))
+        guess = np.array([[f, 0, (w - 1) / 2], [0, f, (h - 1) / 2],
+                          [0, 0, 1]])
+        rms, camera, dist, _r, _t = cv2.calibrateCamera(
+            [v[1] for v in views], [v[0] for v in views], (w, h),
+            guess, None, flags=LENS_FLAGS)
+
+        lens = LensModel(camera, dist, (w, h), rms, len(views))
+        lens.save(lens_path(device, (w, h)))
+        return lens
+
+    # Siempre sobre la imagen sin corregir
+    start_job(state, state.source_frame, run, _apply_lens, target)
+
+
+def _apply_lens(state, target, result):
+    if isinstance(result, int):
+        state.status_message = (
+            _("Lens view added:") + f" {result}/{LENS_MIN_VIEWS}")
+        return
+
+    state.status_message = (
+        _("Lens calibrated:") + f" {result.views} views, "
+        f"RMS {result.rms:.2f} px, k1 {float(result.dist.ravel()[0]):.4f}"
+    )
+    # Guardado en disco, pero sin mover medidas ni calibración existentes
+    if _lens_locked(state):
+        state.status_message += " — " + _("not applied until measurements "
+                                          "and calibration are cleared")
+        return
+
+    state.lens = result
+    state.undistort = True
+    state.lens_frame = None
+    state.mark_dirty("frame")
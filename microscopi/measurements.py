@@ -0,0 +1,347 @@
+# microscopi/measurements.py
+#
+# Almacén columnar de medidas. Sustituye la lista de dicts: tipo,
+# extremos, color y visibilidad viven en arrays NumPy (vistas
+# vectorizadas para dibujar y exportar); etiqueta y texto por fila en
+# listas. Mantiene el formato JSON que acepta editor.validate_measure.
+# Cada fila lleva un id estable y su caja en un SpatialIndex para
+# localizar la medida bajo el cursor sin recorrerlas todas.
+
+import itertools
+import math
+
+import numpy as np
+
+from .constants import COLOR_MAP
+from .spatial import SpatialIndex
+
+TYPES = ("DIS", "RAD", "SQR", "XY")
+TYPE_CODES = {t: i for i, t in enumerate(TYPES)}
+
+_INITIAL_CAPACITY = 64
+
+# Versiones únicas entre almacenes: el historial puede sustituir un
+# almacén por otro sin que las cachés confundan sus versiones
+_versions = itertools.count(1)
+
+
+class MeasurementStore:
+    def __init__(self):
+        self.n = 0
+        self.version = next(_versions)  # Cambia en cada modificación
+
+        self.types = np.zeros(_INITIAL_CAPACITY, np.uint8)
+        self.points = np.zeros((_INITIAL_CAPACITY, 2, 2), np.float64)
+        self.color_idx = np.zeros(_INITIAL_CAPACITY, np.uint16)
+        self.visible = np.zeros(_INITIAL_CAPACITY, np.bool_)
+        self.ids = np.zeros(_INITIAL_CAPACITY, np.int64)  # Crecientes
+        self._next_id = 1
+
+        self.index = SpatialIndex()   # id → caja en coordenadas base
+
+        self.labels = []
+        self.texts = []
+
+        # Paleta de (color BGR, nombre) referenciada por color_idx
+        self.palette = []
+        self._palette_index = {}
+
+    # ================= BÁSICO =================
+
+    def __len__(self):
+        return self.n
+
+    def __bool__(self):
+        return self.n > 0
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield self.row(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.row(i) for i in range(*key.indices(self.n))]
+        if key < 0:
+            key += self.n
+        if not 0 <= key < self.n:
+            raise IndexError("measurement index out of range")
+        return self.row(key)
+
+    def _changed(self):
+        self.version = next(_versions)
+
+    def _grow(self):
+        cap = 2 * len(self.types)
+        for name in ("types", "points", "color_idx", "visible", "ids"):
+            old = getattr(self, name)
+            new = np.zeros((cap,) + old.shape[1:], old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def color_index(self, color, color_name=""):
+        key = (tuple(int(c) for c in color), color_name)
+        idx = self._palette_index.get(key)
+        if idx is None:
+            idx = len(self.palette)
+            self.palette.append(key)
+            self._palette_index[key] = idx
+        return idx
+
+    # ================= MODIFICACIÓN =================
+
+    def append(self, mtype, label, text, color, color_name, points,
+               visible=True):
+        return self.insert(self.n, mtype, label, text, color, color_name,
+                           points, visible)
+
+    def insert(self, i, mtype, label, text, color, color_name, points,
+               visible=True, mid=None):
+        """
+        Inserta en la posición i. mid restaura un id anterior (deshacer
+        un borrado); debe mantener los ids ordenados.
+        """
+        if self.n == len(self.types):
+            self._grow()
+
+        if i < self.n:
+            for name in ("types", "points", "color_idx", "visible", "ids"):
+                col = getattr(self, name)
+                col[i + 1:self.n + 1] = col[i:self.n]
+
+        p0, p1 = points[0], points[-1]   # XY puede traer un solo punto
+
+        if mid is None:
+            mid = self._next_id
+        self._next_id = max(self._next_id, mid + 1)
+
+        self.types[i] = TYPE_CODES[mtype]
+        self.points[i] = (p0, p1)
+        self.color_idx[i] = self.color_index(color, color_name)
+        self.visible[i] = visible
+        self.ids[i] = mid
+        self.labels.insert(i, label)
+        self.texts.insert(i, text)
+
+        self.n += 1
+        self.index.insert(int(mid), self.bounds(i))
+        self._changed()
+        return i
+
+    def pop(self):
+        if not self.n:
+            raise IndexError("pop from empty measurement store")
+
+        row = self.row(self.n - 1)
+        self.n -= 1
+        self.index.remove(int(self.ids[self.n]))
+        self.labels.pop()
+        self.texts.pop()
+        self._changed()
+        return row
+
+    def delete(self, i):
+        """Elimina la fila i desplazando las siguientes."""
+        if not 0 <= i < self.n:
+            raise IndexError("measurement index out of range")
+
+        row = self.row(i)
+        self.index.remove(int(self.ids[i]))
+
+        for name in ("types", "points", "color_idx", "visible", "ids"):
+            col = getattr(self, name)
+            col[i:self.n - 1] = col[i + 1:self.n]
+
+        del self.labels[i]
+        del self.texts[i]
+        self.n -= 1
+        self._changed()
+        return row
+
+    def move_point(self, i, which, point):
+        """Mueve el extremo which (0 o 1) de la fila i. XY mueve ambos."""
+        if TYPES[self.types[i]] == "XY":
+            self.set_points(i, (point, point))
+        else:
+            self.points[i, which] = point
+            self.index.update(int(self.ids[i]), self.bounds(i))
+            self._changed()
+
+    def set_points(self, i, points):
+        self.points[i] = points
+        self.index.update(int(self.ids[i]), self.bounds(i))
+        self._changed()
+
+    def set_text(self, i, text):
+        self.texts[i] = text
+        self._changed()
+
+    def set_label(self, i, label):
+        self.labels[i] = label
+        self._changed()
+
+    def toggle(self, i):
+        self.visible[i] = not self.visible[i]
+        self._changed()
+
+    def set_visible(self, i, value):
+        self.visible[i] = value
+        self._changed()
+
+    def clear(self):
+        self.n = 0
+        self.index.clear()
+        self.labels = []
+        self.texts = []
+        self._changed()
+
+    def replace(self, rows, ids=None):
+        """Sustituye todo el contenido por una lista de dicts."""
+        self.clear()
+        for k, m in enumerate(rows):
+            self.insert(
+                self.n,
+                m["type"],
+                m["label"],
+                m.get("text", ""),
+                m["color"],
+                m.get("color_name") or _color_name(m["color"]),
+                m["points"],
+                m.get("visible", True),
+                mid=None if ids is None else ids[k],
+            )
+
+    # ================= LECTURA =================
+
+    def row(self, i):
+        color, color_name = self.palette[self.color_idx[i]]
+        mtype = TYPES[self.types[i]]
+        pts = self.points[i]
+
+        return {
+            "type": mtype,
+            "label": self.labels[i],
+            "text": self.texts[i],
+            "color": color,
+            "color_name": color_name,
+            "points": [_point(pts[0]), _point(pts[1])],
+            "visible": bool(self.visible[i]),
+        }
+
+    def bounds(self, i):
+        """Caja (x0, y0, x1, y1) de la fila i en coordenadas base."""
+        (x1, y1), (x2, y2) = self.points[i].tolist()
+
+        if TYPES[self.types[i]] == "RAD":
+            r = math.hypot(x2 - x1, y2 - y1)
+            return (x1 - r, y1 - r, x1 + r, y1 + r)
+
+        return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+    def row_of(self, mid):
+        """Fila actual del id, o None si ya no existe."""
+        ids = self.ids[:self.n]
+        i = int(np.searchsorted(ids, mid))
+        if i < self.n and ids[i] == mid:
+            return i
+        return None
+
+    def hit(self, x, y, tol):
+        """
+        Medida visible más cercana a (x, y) dentro de tol (px base).
+        Devuelve (fila, extremo) con extremo 0/1 si se tocó un extremo,
+        None si se tocó el trazo; o None si no hay ninguna.
+        """
+        keys = self.index.query(x - tol, y - tol, x + tol, y + tol)
+        if not keys:
+            return None
+
+        rows = np.searchsorted(self.ids[:self.n], sorted(keys))
+        rows = rows[self.visible[rows]]
+        if not len(rows):
+            return None
+
+        pts = self.points[rows]
+        types = self.types[rows]
+        p = np.array((x, y), np.float64)
+
+        # Distancia a cada extremo: los extremos tienen prioridad
+        d_end = np.linalg.norm(pts - p, axis=2)
+        d_end[types == TYPE_CODES["RAD"], 0] = np.inf   # El centro no
+        which = np.argmin(d_end, axis=1)
+        d_handle = d_end[np.arange(len(rows)), which]
+
+        best = np.argmin(d_handle)
+        if d_handle[best] <= tol:
+            return int(rows[best]), int(which[best])
+
+        # Distancia al trazo según el tipo
+        a, b = pts[:, 0], pts[:, 1]
+        d = np.full(len(rows), np.inf)
+
+        seg = types == TYPE_CODES["DIS"]
+        if seg.any():
+            d[seg] = _segment_distance(p, a[seg], b[seg])
+
+        rad = types == TYPE_CODES["RAD"]
+        if rad.any():
+            r = np.linalg.norm(b[rad] - a[rad], axis=1)
+            d[rad] = np.abs(np.linalg.norm(p - a[rad], axis=1) - r)
+
+        sqr = types == TYPE_CODES["SQR"]
+        if sqr.any():
+            lo = np.minimum(a[sqr], b[sqr])
+            hi = np.maximum(a[sqr], b[sqr])
+            # Fuera: distancia a la caja; dentro: al lado más cercano
+            out = np.linalg.norm(np.maximum(np.maximum(lo - p, p - hi), 0),
+                                 axis=1)
+            inside = np.minimum(p - lo, hi - p).min(axis=1)
+            d[sqr] = np.where(out > 0, out, inside)
+
+        best = np.argmin(d)
+        if d[best] <= tol:
+            return int(rows[best]), None
+        return None
+
+    def visible_indices(self, mtype=None):
+        mask = self.visible[:self.n]
+        if mtype is not None:
+            mask = mask & (self.types[:self.n] == TYPE_CODES[mtype])
+        return np.flatnonzero(mask)
+
+    def to_list(self):
+        """Lista de dicts serializable a JSON (formato del editor)."""
+        out = []
+        for m in self:
+            m["color"] = list(m["color"])
+            m["points"] = [list(p) for p in m["points"]]
+            out.append(m)
+        return out
+
+    @classmethod
+    def from_list(cls, rows, ids=None):
+        store = cls()
+        store.replace(rows, ids)
+        return store
+
+
+def _segment_distance(p, a, b):
+    ab = b - a
+    len2 = (ab * ab).sum(axis=1)
+    t = np.where(len2 > 0,
+                 ((p - a) * ab).sum(axis=1) / np.maximum(len2, 1e-12), 0)
+    t = np.clip(t, 0, 1)
+    closest = a + ab * t[:, None]
+    return np.linalg.norm(closest - p, axis=1)
+
+
+def _point(p):
+    # Enteros cuando lo son: el JSON queda igual que antes
+    return tuple(int(v) if float(v).is_integer() else float(v) for v in p)
+
+
+def _color_name(color):
+    color = tuple(color)
+    for name, c in COLOR_MAP.items():
+        if c == color:
+            return name
+    return ""
@@ -0,0 +1,247 @@
+# microscopi/panel.py
+#
+# Lista virtualizada del panel de medidas. Solo se dibujan las filas
+# visibles; cada fila se rasteriza una vez en un tile propio (LRU) y
+# después solo se copia, así el coste del panel no depende del número
+# de medidas de la sesión.
+
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from .constants import (
+    RIGHT_PANEL_W, BOTTOM_PANEL_H, COLOR_MAP,
+    MEASURE_LIST_TOP, MEASURE_ROW_HEIGHT,
+)
+from .measurements import TYPES, TYPE_CODES
+from .utils import draw_text
+
+ROW_CACHE_SIZE = 256
+ROW_BG = (30, 30, 30)
+ROW_SELECTED_BG = (90, 40, 90)
+CHECKBOX_W = 24          # Zona del checkbox (clic = mostrar/ocultar)
+
+# La primera fila empieza realmente en MEASURE_LIST_TOP - 14
+_ROW_TOP = MEASURE_LIST_TOP - 14
+
+
+class MeasurePanel:
+    def __init__(self):
+        self.scroll = None        # Primera fila mostrada; None → al final
+        self.filter_type = None   # "DIS", "RAD"... o None
+        self.filter_color = None  # Nombre de COLOR_MAP o None
+        self.filter_prefix = ""   # Prefijo de etiqueta
+
+        self._filtered_key = None
+        self._filtered = np.zeros(0, np.intp)
+        self._rows = OrderedDict()   # clave de fila → tile
+
+    # ================= FILTRO =================
+
+    def filtered(self, store):
+        """Índices de fila de las medidas que pasan el filtro."""
+        key = (store.version, self.filter_type, self.filter_color,
+               self.filter_prefix)
+        if key == self._filtered_key:
+            return self._filtered
+
+        mask = np.ones(store.n, np.bool_)
+
+        if self.filter_type is not None:
+            mask &= store.types[:store.n] == TYPE_CODES[self.filter_type]
+
+        if self.filter_color is not None:
+            idx = [i for i, (_c, name) in enumerate(store.palette)
+                   if name == self.filter_color]
+            mask &= np.isin(store.color_idx[:store.n], idx)
+
+        if self.filter_prefix:
+            prefix = self.filter_prefix.lower()
+            mask &= np.fromiter(
+                (label.lower().startswith(prefix) for label in store.labels),
+                np.bool_, store.n
+            )
+
+        self._filtered = np.flatnonzero(mask)
+        self._filtered_key = key
+        return self._filtered
+
+    def cycle_type(self):
+        order = (None,) + TYPES
+        self.filter_type = order[(order.index(self.filter_type) + 1)
+                                 % len(order)]
+        self.scroll = None
+
+    def cycle_color(self):
+        order = (None,) + tuple(COLOR_MAP)
+        self.filter_color = order[(order.index(self.filter_color) + 1)
+                                  % len(order)]
+        self.scroll = None
+
+    def set_prefix(self, prefix):
+        self.filter_prefix = prefix
+        self.scroll = None
+
+    def filter_label(self):
+        parts = [self.filter_type or "*", self.filter_color or "*"]
+        if self.filter_prefix:
+            parts.append(self.filter_prefix + "*")
+        return " ".join(parts)
+
+    # ================= DESPLAZAMIENTO =================
+
+    @staticmethod
+    def capacity(height):
+        """Filas que caben en un panel de alto height (una es el pie)."""
+        usable = height - BOTTOM_PANEL_H - _ROW_TOP
+        return max(1, usable // MEASURE_ROW_HEIGHT - 1)
+
+    def first_row(self, total, rows):
+        last = max(0, total - rows)
+        if self.scroll is None:
+            return last
+        return min(max(0, self.scroll), last)
+
+    def scroll_by(self, delta, total, rows):
+        first = self.first_row(total, rows) + delta
+        # Llegar al final vuelve a seguir las medidas nuevas
+        self.scroll = None if first >= total - rows else max(0, first)
+
+    def scroll_to(self, pos, total, rows):
+        """Asegura que la posición pos (en la lista filtrada) se vea."""
+        first = self.first_row(total, rows)
+        if pos < first:
+            first = pos
+        elif pos >= first + rows:
+            first = pos - rows + 1
+        self.scroll = None if first >= total - rows else first
+
+    def row_at(self, y, total, rows):
+        """Posición en la lista filtrada de la fila en y, o None."""
+        rel = y - _ROW_TOP
+        if rel < 0:
+            return None
+        slot = rel // MEASURE_ROW_HEIGHT
+        if slot >= rows:
+            return None
+        pos = self.first_row(total, rows) + slot
+        return pos if pos < total else None
+
+    def key(self):
+        return (self.scroll, self.filter_type, self.filter_color,
+                self.filter_prefix)
+
+    # ================= DIBUJO =================
+
+    def _row_tile(self, store, i, selected):
+        color, _name = store.palette[store.color_idx[i]]
+        visible = bool(store.visible[i])
+        mtype = TYPES[store.types[i]]
+        label, text = store.labels[i], store.texts[i]
+
+        key = (mtype, label, text, color, visible, selected)
+        tile = self._rows.get(key)
+        if tile is not None:
+            self._rows.move_to_end(key)
+            return tile
+
+        tile = np.empty((MEASURE_ROW_HEIGHT, RIGHT_PANEL_W, 3), np.uint8)
+        tile[:] = ROW_SELECTED_BG if selected else ROW_BG
+
+        box_x, box_y = 10, 0
+        cv2.rectangle(tile, (box_x, box_y), (box_x + 14, box_y + 14),
+                      (255, 255, 255), 2)
+
+        if visible:
+            cv2.line(tile, (box_x + 3, box_y + 7), (box_x + 6, box_y + 11),
+                     (255, 255, 255), 2)
+            cv2.line(tile, (box_x + 6, box_y + 11), (box_x + 11, box_y + 3),
+                     (255, 255, 255), 2)
+
+        draw_text(tile, f"{mtype} {label} {text}", (30, 14), 18, color)
+
+        self._rows[key] = tile
+        if len(self._rows) > ROW_CACHE_SIZE:
+            self._rows.popitem(last=False)
+        return tile
+
+    def draw(self, tile, state):
+        store = state.measurements
+        h = tile.shape[0]
+
+        rows = self.capacity(h)
+        order = self.filtered(store)
+        total = len(order)
+        first = self.first_row(total, rows)
+
+        selected = None
+        if state.selected is not None:
+            selected = store.row_of(state.selected)
+
+        y = _ROW_TOP
+        for i in order[first:first + rows].tolist():
+            tile[y:y + MEASURE_ROW_HEIGHT] = self._row_tile(
+                store, i, i == selected)
+            y += MEASURE_ROW_HEIGHT
+
+        # Pie: rango mostrado, total y filtro activo
+        if total > rows or self.filter_label() != "* *":
+            y = _ROW_TOP + rows * MEASURE_ROW_HEIGHT + 14
+            shown = f"{first + 1}-{min(first + rows, total)}" if total else "0"
+            draw_text(tile, f"{shown} / {total}   {self.filter_label()}",
+                      (10, y), 16, (180, 180, 180))
+
+
+# ================= ACCIONES =================
+
+def _rows(state):
+    h = state.canvas_size[1] if state.canvas_size else 0
+    return MeasurePanel.capacity(h)
+
+
+def scroll_panel(state, delta):
+    panel = state.measure_panel
+    total = len(panel.filtered(state.measurements))
+    panel.scroll_by(delta, total, _rows(state))
+    state.mark_dirty("panel")
+
+
+def page_panel(state, direction):
+    scroll_panel(state, direction * max(1, _rows(state) - 1))
+
+
+def jump_to_selected(state):
+    """Desplaza la lista hasta la medida seleccionada."""
+    store = state.measurements
+    panel = state.measure_panel
+
+    i = store.row_of(state.selected) if state.selected is not None else None
+    if i is None:
+        return False
+
+    order = panel.filtered(store)
+    pos = int(np.searchsorted(order, i))
+    if pos >= len(order) or order[pos] != i:
+        # Oculta por el filtro: se quita el filtro
+        panel.filter_type = panel.filter_color = None
+        panel.filter_prefix = ""
+        order = panel.filtered(store)
+        pos = i
+
+    panel.scroll_to(pos, len(order), _rows(state))
+    state.mark_dirty("panel")
+    return True
+
+
+def panel_hit(state, x, y):
+    """
+    Clic en el panel: (fila, en_checkbox) de la medida bajo (x, y),
+    con x relativa al panel, o None.
+    """
+    panel = state.measure_panel
+    order = panel.filtered(state.measurements)
+    pos = panel.row_at(y, len(order), _rows(state))
+    if pos is None:
+        return None
+    return int(order[pos]), x < CHECKBOX_W + 10
@@ -0,0 +1,364 @@
+# microscopi/playback.py
+#
+# Reproducción de grabaciones (vídeo o secuencia PNG) con acceso
+# aleatorio para medir sobre ellas. Un índice de keyframes y tiempos se
+# genera una vez (lectura de paquetes sin decodificar) y se guarda al
+# lado del fichero. Para ir al frame n se decodifica desde el keyframe
+# anterior, o desde la posición actual del decodificador si está en el
+# mismo tramo; los frames decodificados quedan en una caché LRU, así
+# que volver atrás o arrastrar el scrubber no vuelve a decodificar.
+
+import csv
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .i18n import _
+from .constants import LEFT_MENU_W
+from .utils import draw_text
+from .video import FrameSource
+
+INDEX_SUFFIX = ".index.npz"
+INDEX_VERSION = 1
+
+FRAME_CACHE_BUDGET = 256 * 1024 * 1024   # Bytes de frames decodificados
+FRAME_CACHE_MIN = 8
+
+DEFAULT_FPS = 30.0        # Secuencias sin marcas de tiempo
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"}
+
+
+# ================= ÍNDICE =================
+
+class FrameIndex:
+    def __init__(self, keyframes, times, fps):
+        self.keyframes = np.asarray(keyframes, np.int64)   # Ordenados
+        self.times = np.asarray(times, np.float64)         # s por frame
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.times)
+
+    def keyframe_before(self, n):
+        k = np.searchsorted(self.keyframes, n, side="right") - 1
+        return int(self.keyframes[max(k, 0)])
+
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return np.array([st.st_size, st.st_mtime_ns, INDEX_VERSION], np.int64)
+
+
+def build_index(path):
+    """Recorre los paquetes sin decodificar: keyframes y tiempos."""
+    cap = cv2.VideoCapture(str(path), cv2.CAP_FFMPEG,
+                           [cv2.CAP_PROP_FORMAT, -1])
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video source {path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+    keyframes = []
+    times = []
+
+    while cap.grab():
+        if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+            keyframes.append(len(times))
+        times.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+    cap.release()
+
+    if not times:
+        raise RuntimeError(f"No frames in {path}")
+    if not keyframes or keyframes[0] != 0:
+        keyframes.insert(0, 0)
+
+    # Con frames B los paquetes no llegan en orden de presentación
+    return FrameIndex(keyframes, np.sort(times), fps)
+
+
+def load_index(path):
+    """Índice cacheado junto al fichero; se regenera si ha cambiado."""
+    cache = str(path) + INDEX_SUFFIX
+    stamp = _file_stamp(path)
+
+    # Cualquier fallo al leer (fichero vacío, truncado, de otra
+    # versión) cuenta como si no hubiera caché
+    try:
+        with np.load(cache) as data:
+            if np.array_equal(data["stamp"], stamp):
+                return FrameIndex(data["keyframes"], data["times"],
+                                  float(data["fps"]))
+    except Exception:
+        pass
+
+    index = build_index(path)
+    tmp = cache + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            np.savez(f, stamp=stamp, keyframes=index.keyframes,
+                     times=index.times, fps=index.fps)
+        os.replace(tmp, cache)
+    except OSError:
+        pass   # Directorio de solo lectura: se indexa en cada apertura
+    return index
+
+
+def _sidecar_times(path, count):
+    """Tiempos de captura del CSV que deja recorder.py, si cuadra."""
+    path = Path(path)
+    sidecar = (path / "timestamps.csv" if path.is_dir()
+               else path.with_name(path.stem + ".timestamps.csv"))
+    try:
+        with open(sidecar, newline="") as f:
+            times = [float(row["t"]) for row in csv.DictReader(f)]
+    except (OSError, KeyError, ValueError):
+        return None
+    return times if len(times) == count else None
+
+
+# ================= CACHÉ =================
+
+class FrameCache:
+    """LRU de frames decodificados, acotada en bytes."""
+
+    def __init__(self, budget=FRAME_CACHE_BUDGET):
+        self.budget = budget
+        self.capacity = None      # Se fija con el primer frame
+        self._frames = OrderedDict()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def get(self, n):
+        frame = self._frames.get(n)
+        if frame is not None:
+            self._frames.move_to_end(n)
+        return frame
+
+    def put(self, n, frame):
+        if self.capacity is None:
+            self.capacity = max(FRAME_CACHE_MIN,
+                                self.budget // max(frame.nbytes, 1))
+        self._frames[n] = frame
+        self._frames.move_to_end(n)
+        while len(self._frames) > self.capacity:
+            self._frames.popitem(last=False)
+
+
+# ================= FUENTE =================
+
+class PlaybackSource(FrameSource):
+    """
+    Grabación con acceso aleatorio. Empieza en pausa en el primer
+    frame; seek()/step() solo fijan el destino y read() lo resuelve
+    una vez por vuelta del bucle, así que arrastrar el scrubber no
+    encola decodificaciones.
+    """
+
+    def __init__(self, path, cache_budget=FRAME_CACHE_BUDGET):
+        self.path = Path(path)
+        self.cache = FrameCache(cache_budget)
+        self.position = 0
+        self.playing = False
+        self.fresh = True
+
+        self._cap = None
+        self._files = None
+        self._next = None       # Próximo frame que entrega el decodificador
+        self._frame = None
+        self._target = 0
+        self._clock = None      # (t0, frame) al empezar a reproducir
+
+        if self.path.is_dir():
+            self._files = sorted(
+                p for p in self.path.iterdir()
+                if p.suffix.lower() in IMAGE_EXTENSIONS
+            )
+            if not self._files:
+                raise RuntimeError(f"No images found in {path}")
+            count = len(self._files)
+            self.index = FrameIndex(
+                np.arange(count), np.arange(count) / DEFAULT_FPS,
+                DEFAULT_FPS)
+        else:
+            self.index = load_index(self.path)
+            self._cap = cv2.VideoCapture(str(self.path))
+            if not self._cap.isOpened():
+                raise RuntimeError(f"Cannot open video source {path}")
+
+        times = _sidecar_times(self.path, len(self.index))
+        if times is not None:
+            self.index.times = np.asarray(times, np.float64)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def time(self):
+        return float(self.index.times[self.position])
+
+    # ----- Control -----
+
+    def seek(self, n):
+        self._target = min(max(int(n), 0), len(self) - 1)
+        if self.playing:
+            self._clock = (time.monotonic(), self._target)
+
+    def step(self, delta):
+        self.playing = False
+        self.seek(self._target + delta)
+
+    def toggle_play(self):
+        self.playing = not self.playing
+        if self.playing:
+            if self._target >= len(self) - 1:
+                self._target = 0
+            self._clock = (time.monotonic(), self._target)
+
+    # ----- Lectura -----
+
+    def read(self):
+        if self.playing:
+            t0, start = self._clock
+            due = start + int((time.monotonic() - t0) * self.index.fps)
+            if due >= len(self) - 1:
+                due = len(self) - 1
+                self.playing = False
+            self._target = due
+
+        if self._frame is not None and self._target == self.position:
+            self.fresh = False
+            return self._frame
+
+        self._frame = self._get(self._target)
+        self.position = self._target
+        self.fresh = True
+        return self._frame
+
+    def _get(self, n):
+        frame = self.cache.get(n)
+        if frame is not None:
+            return frame
+
+        if self._files is not None:
+            frame = cv2.imread(str(self._files[n]))
+            if frame is None:
+                raise RuntimeError(f"Cannot read {self._files[n]}")
+            self.cache.put(n, frame)
+            return frame
+
+        # Desde el keyframe anterior, salvo que el decodificador ya
+        # esté entre ese keyframe y n (reproducción, paso adelante)
+        k = self.index.keyframe_before(n)
+        if self._next is None or not k <= self._next <= n:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, k)
+            self._next = k
+
+        while self._next <= n:
+            ok, frame = self._cap.read()
+            if not ok or frame is None:
+                self._next = None
+                raise RuntimeError("Cannot read from video source")
+            self.cache.put(self._next, frame)
+            self._next += 1
+
+        return frame
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+
+
+# ================= SCRUBBER =================
+#
+# Barra en el borde inferior de la zona de vídeo: progreso, keyframes
+# y posición. Clic o arrastre → seek.
+
+SCRUB_H = 22
+SCRUB_MARGIN = 10
+SCRUB_TEXT_W = 190
+
+SCRUB_BG = (30, 30, 30)
+SCRUB_TRACK = (90, 90, 90)
+SCRUB_DONE = (0, 200, 255)
+SCRUB_KEY = (140, 140, 140)
+
+
+def _track(state):
+    dw, dh = state.display_size
+    x0 = SCRUB_MARGIN
+    x1 = max(x0 + 1, dw - SCRUB_TEXT_W)
+    return x0, x1, dh - SCRUB_H, dh
+
+
+def draw_scrubber(view, state):
+    source = state.playback
+    if source is None:
+        return
+
+    x0, x1, y0, y1 = _track(state)
+    view[y0:y1] = SCRUB_BG
+
+    ym = (y0 + y1) // 2
+    last = max(len(source) - 1, 1)
+    xp = x0 + round((x1 - x0) * source.position / last)
+
+    cv2.line(view, (x0, ym), (x1, ym), SCRUB_TRACK, 3)
+
+    # Marcas de keyframe solo si caben sin llenar la barra
+    keys = source.index.keyframes
+    if 1 < len(keys) <= (x1 - x0) // 4:
+        for x in (x0 + (x1 - x0) * keys / last).astype(int).tolist():
+            cv2.line(view, (x, ym - 5), (x, ym - 3), SCRUB_KEY, 1)
+
+    cv2.line(view, (x0, ym), (xp, ym), SCRUB_DONE, 3)
+    cv2.rectangle(view, (xp - 2, y0 + 3), (xp + 2, y1 - 4), SCRUB_DONE, -1)
+
+    mark = ">" if source.playing else "||"
+    draw_text(view,
+              f"{mark} {source.position + 1}/{len(source)}"
+              f"  {source.time:.3f} s",
+              (x1 + SCRUB_MARGIN, y0 + 16), 14, (255, 255, 255))
+
+
+def scrub_hit(state, x, y, dragging=False):
+    """
+    Frame bajo el punto de pantalla del scrubber, o None. Arrastrando
+    vale cualquier punto: se sigue la x, limitada a la barra.
+    """
+    if state.playback is None or state.display_size is None:
+        return None
+
+    x0, x1, y0, y1 = _track(state)
+    vx = x - LEFT_MENU_W
+    inside = y0 <= y < y1 and x0 - SCRUB_MARGIN <= vx <= x1
+    if not (inside or dragging):
+        return None
+
+    f = min(max((vx - x0) / (x1 - x0), 0.0), 1.0)
+    return round(f * (len(state.playback) - 1))
+
+
+# ================= ACCIONES =================
+
+def toggle_playback(state):
+    source = state.playback
+    if source is None:
+        return
+    source.toggle_play()
+    state.status_message = _("Playing") if source.playing else _("Paused")
+
+
+def step_playback(state, delta):
+    if state.playback is not None:
+        state.playback.step(delta)
+
+
+def step_seconds(state, seconds):
+    source = state.playback
+    if source is not None:
+        step_playback(state, round(seconds * source.index.fps))
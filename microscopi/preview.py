@@ -3,7 +3,7 @@ import math
 
 from .constants import LEFT_MENU_W
 from .utils import current_measure_text, draw_text
-from .utils import to_visual_coords
+from .utils import base_to_display
 
 
 def draw_preview(canvas, state):
@@ -17,25 +17,12 @@ def draw_preview(canvas, state):
     if len(state.points) < 1 or not state.cursor_pos:
         return
 
-    x1, y1 = state.points[0]
-
     # Punto 1 siempre es base → convertir
-    x1, y1 = to_visual_coords(
-        x1, y1,
-        state.base_width,
-        state.base_height,
-        state.rotation
-    )
+    x1, y1 = base_to_display(state, *state.points[0])
 
     if len(state.points) == 2:
         # Punto 2 también base → convertir
-        x2, y2 = state.points[1]
-        x2, y2 = to_visual_coords(
-            x2, y2,
-            state.base_width,
-            state.base_height,
-            state.rotation
-        )
+        x2, y2 = base_to_display(state, *state.points[1])
     else:
         # Cursor ya está en visual
         cx, cy = state.cursor_pos
@@ -0,0 +1,174 @@
+# microscopi/prompt.py
+#
+# Entrada de texto dentro del canvas (barra inferior). Sustituye a los
+# diálogos modales de Tk: mientras se escribe, la captura y el render
+# siguen funcionando. El teclado llega desde engine.handle_key.
+
+from .i18n import _
+from .actions import calibrate_with_value, add_measure_with_label, set_label
+from .grid import grid_label
+
+NUMBER_CHARS = "0123456789.,"
+
+_ENTER = (10, 13)
+_BACKSPACE = (8, 127)
+_ESC = 27
+
+
+class Prompt:
+    def __init__(self, title, on_submit, chars=None, max_len=None,
+                 on_change=None, on_cancel=None):
+        self.title = title
+        self.on_submit = on_submit     # on_submit(state, texto)
+        self.chars = chars             # Caracteres admitidos (None → todos)
+        self.max_len = max_len
+        self.on_change = on_change     # on_change(state, texto), en vivo
+        self.on_cancel = on_cancel     # on_cancel(state)
+
+
+def open_prompt(state, mode, prompt, initial=""):
+    state.prompt = prompt
+    state.input_mode = mode
+    state.input_buffer = initial
+    state.mark_dirty("input")
+
+
+def close_prompt(state):
+    state.prompt = None
+    state.input_mode = None
+    state.input_buffer = ""
+    state.mark_dirty("input")
+
+
+def prompt_key(state, key):
+    """Tecla para el prompt abierto. Devuelve True si la ha consumido."""
+    prompt = state.prompt
+    if prompt is None:
+        return False
+
+    if key == -1:
+        return True
+
+    if key in _ENTER:
+        text = state.input_buffer
+        close_prompt(state)
+        # Se cierra antes: el callback puede abrir otro prompt
+        prompt.on_submit(state, text)
+        return True
+
+    if key == _ESC:
+        close_prompt(state)
+        if prompt.on_cancel is not None:
+            prompt.on_cancel(state)
+        return True
+
+    if key in _BACKSPACE:
+        state.input_buffer = state.input_buffer[:-1]
+
+    else:
+        try:
+            ch = chr(key)
+        except ValueError:
+            return True
+
+        if not ch.isprintable():
+            return True
+        if prompt.chars is not None and ch not in prompt.chars:
+            return True
+        if prompt.max_len and len(state.input_buffer) >= prompt.max_len:
+            return True
+
+        state.input_buffer += ch
+
+    if prompt.on_change is not None:
+        prompt.on_change(state, state.input_buffer)
+    return True
+
+
+def _parse_number(text):
+    return float(text.replace(",", "."))
+
+
+# ================= PROMPTS =================
+
+def ask_calibration(state):
+    if len(state.points) != 2:
+        state.status_message = _("Select two points first")
+        return
+
+    def submit(state, text):
+        try:
+            calibrate_with_value(state, _parse_number(text))
+        except (ValueError, ZeroDivisionError):
+            state.status_message = _("Invalid number")
+
+    open_prompt(state, "CAL_VALUE", Prompt(
+        _("Enter real distance") + f" ({state.calibration_unit})",
+        submit, chars=NUMBER_CHARS))
+
+
+def ask_label(state):
+    ready = (state.mode == "XY" and len(state.points) == 1) or \
+            (state.mode != "XY" and len(state.points) == 2)
+    if not ready:
+        state.status_message = _("Select required points first")
+        return
+
+    def submit(state, text):
+        if text:
+            add_measure_with_label(state, text)
+
+    open_prompt(state, "LABEL", Prompt(
+        _("Enter label"), submit, max_len=8))
+
+
+def ask_grid_pitch(state):
+
+    def submit(state, text):
+        try:
+            pitch = _parse_number(text)
+            if pitch <= 0:
+                raise ValueError
+        except ValueError:
+            state.status_message = _("Invalid number")
+            return
+
+        state.grid_pitch_mm = pitch
+        state.grid_mode = "custom"
+        state.status_message = _("Grid:") + " " + grid_label(state)
+
+    initial = f"{state.grid_pitch_mm:g}" if state.grid_pitch_mm else ""
+    open_prompt(state, "GRID_PITCH", Prompt(
+        _("Enter grid pitch (mm)"), submit, chars=NUMBER_CHARS), initial)
+
+
+def ask_label_filter(state):
+    panel = state.measure_panel
+
+    def change(state, text):
+        panel.set_prefix(text)
+
+    def cancel(state):
+        # Esc quita el filtro
+        panel.set_prefix("")
+
+    open_prompt(state, "FILTER", Prompt(
+        _("Filter by label prefix"), lambda state, text: None,
+        max_len=8, on_change=change, on_cancel=cancel),
+        panel.filter_prefix)
+
+
+def edit_selected_label(state):
+    store = state.measurements
+    i = store.row_of(state.selected) if state.selected is not None else None
+    if i is None:
+        state.status_message = _("No measure selected")
+        return
+
+    mid = state.selected
+
+    def submit(state, text):
+        set_label(state, mid, text)
+
+    open_prompt(state, "EDIT_LABEL", Prompt(
+        _("Enter label"), submit, max_len=8), store.labels[i])
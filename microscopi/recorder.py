@@ -0,0 +1,191 @@
+# microscopi/recorder.py
+#
+# Grabación de vídeo / secuencias (time-lapse, ráfagas). El bucle de UI
+# solo copia el frame a una ranura de memoria compartida y encola su
+# número; un proceso aparte codifica y escribe. Si no quedan ranuras
+# libres el frame se descarta (o se espera un poco, según la política) y
+# se cuenta. Cada frame escrito deja su marca de tiempo en un CSV al lado.
+#
+# El proceso se crea con "spawn", que vuelve a importar el módulo
+# principal: el lanzador debe llamar a main() bajo
+# if __name__ == "__main__" (como scripts/microscopi y el entry point).
+
+import csv
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+RECORD_FORMATS = ("avi", "mp4", "png")
+DROP_POLICIES = ("drop", "block")
+
+RECORD_SLOTS = 8          # Frames en vuelo hacia el codificador
+DEFAULT_FPS = 30.0        # Ritmo del contenedor si no se conoce
+BLOCK_TIMEOUT = 0.1       # Espera máxima por frame con "block" (s)
+
+_FOURCC = {"avi": "MJPG", "mp4": "mp4v"}
+
+
+class Recorder:
+    def __init__(self, path, shape, fmt="avi", fps=0.0, drop="drop",
+                 max_frames=None, slots=RECORD_SLOTS, capture_fps=None):
+        self.path = path
+        self.shape = tuple(shape)
+        self.interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self.drop = drop
+        self.max_frames = max_frames
+
+        self.frames = 0       # Frames enviados al codificador
+        self.dropped = 0      # Descartados por falta de ranura
+        self._next_t = None
+        self._t0 = None
+        self._closer = None
+
+        nbytes = int(np.prod(self.shape))
+        self._shm = shared_memory.SharedMemory(create=True,
+                                               size=nbytes * slots)
+        self._slots = np.ndarray((slots,) + self.shape, np.uint8,
+                                 self._shm.buf)
+
+        ctx = mp.get_context("spawn")   # Sin heredar hilos de Tk/OpenCV
+        self._jobs = ctx.Queue()
+        self._free = ctx.Queue()
+        for i in range(slots):
+            self._free.put(i)
+
+        self._proc = ctx.Process(
+            target=_encoder_main,
+            args=(self._shm.name, self.shape, slots, self._jobs,
+                  self._free, path, fmt,
+                  fps or capture_fps or DEFAULT_FPS),
+            name="microscopi-encoder",
+            daemon=True
+        )
+        self._proc.start()
+
+    @property
+    def done(self):
+        return self.max_frames is not None and self.frames >= self.max_frames
+
+    def offer(self, image, ts=None):
+        """
+        Ofrece un frame. Respeta el intervalo (diezmado) y la política
+        de descarte. Devuelve True si se ha encolado.
+        """
+        if self.done:
+            return False
+
+        ts = time.monotonic() if ts is None else ts
+        if self._next_t is not None and ts < self._next_t:
+            return False
+
+        try:
+            if self.drop == "block":
+                slot = self._free.get(timeout=BLOCK_TIMEOUT)
+            else:
+                slot = self._free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+
+        dst = self._slots[slot]
+        if image.shape == dst.shape:
+            dst[:] = image
+        else:
+            # La zona de vídeo puede cambiar de tamaño (ventana, zoom)
+            cv2.resize(image, (dst.shape[1], dst.shape[0]), dst=dst,
+                       interpolation=cv2.INTER_LINEAR)
+
+        if self._t0 is None:
+            self._t0 = ts
+        # Ritmo fijo sin acumular retraso; tras un parón se cuenta
+        # desde este frame, no desde el plazo vencido
+        if self.interval:
+            next_t = (self._next_t or ts) + self.interval
+            self._next_t = next_t if next_t > ts else ts + self.interval
+
+        self._jobs.put((slot, self.frames, ts - self._t0, time.time()))
+        self.frames += 1
+        return True
+
+    def stop(self):
+        """
+        Cierra la entrada y vuelve enseguida: el codificador termina lo
+        pendiente y la memoria se libera desde un hilo aparte.
+        """
+        if self._closer is not None:
+            return
+        self._jobs.put(None)
+        self._closer = threading.Thread(target=self._close,
+                                        name="microscopi-recorder-stop",
+                                        daemon=True)
+        self._closer.start()
+
+    def wait(self, timeout=None):
+        """Espera al codificador (al salir). True si ha terminado."""
+        if self._closer is None:
+            self.stop()
+        self._closer.join(timeout)
+        return not self._closer.is_alive()
+
+    @property
+    def closed(self):
+        return self._closer is not None and not self._closer.is_alive()
+
+    def _close(self):
+        self._proc.join()
+        self._jobs.close()
+        self._free.close()
+
+        del self._slots
+        self._shm.close()
+        self._shm.unlink()
+
+
+# ================= PROCESO CODIFICADOR =================
+
+def _encoder_main(shm_name, shape, slots, jobs, free, path, fmt, fps):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray((slots,) + tuple(shape), np.uint8, shm.buf)
+
+    h, w = shape[:2]
+    writer = None
+    if fmt == "png":
+        os.makedirs(path, exist_ok=True)
+        sidecar = os.path.join(path, "timestamps.csv")
+    else:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*_FOURCC[fmt]),
+                                 max(1.0, fps), (w, h))
+        sidecar = os.path.splitext(path)[0] + ".timestamps.csv"
+
+    with open(sidecar, "w", newline="") as f:
+        ts_writer = csv.writer(f)
+        ts_writer.writerow(["frame", "t", "wall_time"])
+
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+
+            slot, n, t, wall = job
+            if writer is not None:
+                writer.write(frames[slot])
+            else:
+                cv2.imwrite(os.path.join(path, f"frame_{n:06d}.png"),
+                            frames[slot], [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            free.put(slot)
+
+            ts_writer.writerow([n, f"{t:.6f}",
+                                time.strftime("%Y-%m-%dT%H:%M:%S",
+                                              time.localtime(wall))
+                                + f".{int(wall % 1 * 1000):03d}"])
+
+    if writer is not None:
+        writer.release()
+    del frames
+    shm.close()
@@ -1,100 +1,299 @@
 import cv2
-import math
+import copy
+
+import numpy as np
 
 from .constants import (
     LEFT_MENU_W,
     RIGHT_PANEL_W,
     BOTTOM_PANEL_H,
 )
-from .ui import draw_menu, draw_measures, draw_bottom_panel
+from .ui import draw_chrome
 from .preview import draw_preview
-from .utils import to_visual_coords
-
-
-def _apply_rotation(frame, state):
-    if state.rotation == 90:
-        return cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
-    elif state.rotation == 180:
-        return cv2.rotate(frame, cv2.ROTATE_180)
-    elif state.rotation == 270:
-        return cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-    return frame
-
-
-def _draw_saved_measures(frame, state):
+from .playback import draw_scrubber
+from .lens import undistort_view
+from .utils import base_to_display, base_to_display_array, to_base_coords
+from .buffers import FramePool
+from .viewport import update_view
+from .grid import grid_segments
+from .measurements import TYPES, TYPE_CODES
+
+
+_ROTATE_CODES = {
+    90: cv2.ROTATE_90_CLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+}
+
+
+def _visual_shape(frame, state):
+    h, w = frame.shape[:2]
+    if state.rotation in (90, 270):
+        return w, h
+    return h, w
+
+
+def _display_scale(frame, state):
+    # Anchura objetivo de la zona de vídeo en pantalla
+    target = state.config.display_width
+    if target == "auto":
+        target = (state.window_width or 0) - LEFT_MENU_W - RIGHT_PANEL_W
+        # Cuantizado para que pequeños cambios de ventana no reescalen
+        target -= target % 16
+
+    if not target or target <= 0:
+        return 1.0
+
+    vw = _visual_shape(frame, state)[1]
+    return min(1.0, target / vw)
+
+
+def _visible_base_rect(state):
+    # El recorte visual es un rectángulo también en coordenadas base
+    ox, oy, cw, ch = state.view_crop
+    corners = [
+        to_base_coords(x, y, state.base_width, state.base_height,
+                       state.rotation)
+        for x, y in ((ox, oy), (ox + cw - 1, oy + ch - 1))
+    ]
+    xs = [c[0] for c in corners]
+    ys = [c[1] for c in corners]
+    return min(xs), min(ys), max(xs) + 1, max(ys) + 1
+
+
+def _apply_rotation(frame, state, dst):
+    code = _ROTATE_CODES.get(state.rotation)
+    if code is None:
+        np.copyto(dst, frame)
+    else:
+        cv2.rotate(frame, code, dst=dst)
+    return dst
+
+
+def _orient(src, state, pool, dst):
+    if state.gray:
+        _apply_gray(src, state, pool, dst)
+    else:
+        _apply_rotation(src, state, dst)
+
+
+def _apply_view(frame, state, pool, view):
+    """
+    Escribe la zona visible del frame en la zona de vídeo del canvas.
+    Rotación y gris se hacen siempre al menor de los dos tamaños
+    (recorte o pantalla): una vista ampliada procesa menos píxeles.
+    """
+    # Corrección de lente solo sobre la zona visible: un remap con las
+    # tablas recortadas, antes de rotación y escalado
+    crop = undistort_view(frame, state, pool, _visible_base_rect(state))
+
+    _, _, cw, ch = state.view_crop
+    _, _, kx, _ = state.view_transform
+    dw, dh = state.display_size
+
+    if (cw, ch) == (dw, dh):
+        _orient(crop, state, pool, view)
+
+    elif cw > dw:
+        # Reducir primero. INTER_LINEAR: varias veces más rápido que
+        # INTER_AREA y suficiente en vivo (el PNG se exporta a
+        # resolución completa)
+        size = (dh, dw) if state.rotation in (90, 270) else (dw, dh)
+        scaled = pool.get("scaled", (size[1], size[0]) + frame.shape[2:])
+        cv2.resize(crop, size, dst=scaled, interpolation=cv2.INTER_LINEAR)
+        _orient(scaled, state, pool, view)
+
+    else:
+        # Ampliar al final. Mucho aumento: INTER_NEAREST para ver los
+        # píxeles reales
+        roi = pool.get("roi", (ch, cw) + frame.shape[2:])
+        _orient(crop, state, pool, roi)
+        interp = cv2.INTER_NEAREST if kx >= 2 else cv2.INTER_LINEAR
+        cv2.resize(roi, (dw, dh), dst=view, interpolation=interp)
+
+
+def _draw_saved_measures(frame, state, color=None):
+
+    store = state.measurements
+    visible = store.visible_indices()
+    if not len(visible):
+        return
 
-    base_w = state.base_width
-    base_h = state.base_height
+    # Todos los extremos base → pantalla de una vez
+    pts = base_to_display_array(state, store.points[visible])
+    types = store.types[visible]
+    colors = store.color_idx[visible]
+
+    def colors_of(code):
+        sel = types == code
+        if not sel.any():
+            return []
+        if color is not None:
+            return [(color, pts[sel])]
+        return [
+            (store.palette[ci][0], pts[sel & (colors == ci)])
+            for ci in np.unique(colors[sel])
+        ]
+
+    # Líneas y rectángulos: una polylines por color
+    for c, seg in colors_of(TYPE_CODES["DIS"]):
+        cv2.polylines(frame, seg, False, c, 2)
+
+    for c, seg in colors_of(TYPE_CODES["SQR"]):
+        (x1, y1), (x2, y2) = seg[:, 0].T, seg[:, 1].T
+        quads = np.stack([
+            np.stack([x1, y1], 1), np.stack([x2, y1], 1),
+            np.stack([x2, y2], 1), np.stack([x1, y2], 1),
+        ], 1)
+        cv2.polylines(frame, quads, True, c, 2)
+
+    for c, seg in colors_of(TYPE_CODES["RAD"]):
+        radii = np.hypot(*(seg[:, 1] - seg[:, 0]).T).astype(int)
+        for (x1, y1), r in zip(seg[:, 0].tolist(), radii.tolist()):
+            cv2.circle(frame, (x1, y1), r, c, 2)
+
+    for c, seg in colors_of(TYPE_CODES["XY"]):
+        for x1, y1 in seg[:, 0].tolist():
+            cv2.circle(frame, (x1, y1), 4, c, -1)
+
+
+def _draw_origin(frame, state, color=None):
 
-    for m in state.measurements:
-        if not m.get("visible", False):
-            continue
+    if not state.origin:
+        return
 
-        (x1, y1), (x2, y2) = m["points"]
+    # Convertir base → pantalla según rotación y escala
+    ox, oy = base_to_display(state, *state.origin)
 
-        x1, y1 = to_visual_coords(x1, y1, base_w, base_h, state.rotation)
-        x2, y2 = to_visual_coords(x2, y2, base_w, base_h, state.rotation)
+    size = 8
+    c = (0, 0, 255) if color is None else color
 
+    cv2.line(frame, (ox - size, oy), (ox + size, oy), c, 2)
+    cv2.line(frame, (ox, oy - size), (ox, oy + size), c, 2)
 
-        if m["type"] == "DIS":
-            cv2.line(frame, (x1, y1), (x2, y2), m["color"], 2)
 
-        elif m["type"] == "RAD":
-            r = int(math.hypot(x2 - x1, y2 - y1))
-            cv2.circle(frame, (x1, y1), r, m["color"], 2)
+# ================= SELECCIÓN =================
+#
+# Medida resaltada (cursor encima) y seleccionada: se dibujan cada frame
+# sobre la capa estática para no invalidarla al mover el ratón.
 
-        elif m["type"] == "SQR":
-            cv2.rectangle(
-                frame,
-                (min(x1, x2), min(y1, y2)),
-                (max(x1, x2), max(y1, y2)),
-                m["color"], 2
-            )
+HOVER_COLOR = (255, 255, 255)
+SELECTED_COLOR = (255, 0, 255)
 
-        elif m["type"] == "XY":
-            x1, y1 = m["points"][0]
-            cv2.circle(frame, (x1, y1), 4, m["color"], -1)
 
+def _draw_selection(frame, state):
 
-def _draw_origin(frame, state):
+    store = state.measurements
 
-    if not state.origin:
-        return
+    for mid, color in ((state.hover, HOVER_COLOR),
+                       (state.selected, SELECTED_COLOR)):
+        if mid is None:
+            continue
 
-    ox, oy = state.origin
+        i = store.row_of(mid)
+        if i is None or not store.visible[i]:
+            continue
 
-    # Convertir base → visual según rotación
-    ox, oy = to_visual_coords(
-        ox, oy,
+        (x1, y1), (x2, y2) = base_to_display_array(
+            state, store.points[i:i + 1])[0].tolist()
+        mtype = TYPES[store.types[i]]
+
+        if mtype == "DIS":
+            cv2.line(frame, (x1, y1), (x2, y2), color, 2)
+        elif mtype == "SQR":
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        elif mtype == "RAD":
+            r = int(np.hypot(x2 - x1, y2 - y1))
+            cv2.circle(frame, (x1, y1), r, color, 2)
+
+        # Asas de los extremos arrastrables
+        handles = [(x1, y1)] if mtype == "XY" else [(x1, y1), (x2, y2)]
+        if mtype == "RAD":
+            handles = [(x2, y2)]
+        for p in handles:
+            cv2.circle(frame, p, 5, color, 1)
+
+
+# ================= CAPA ESTÁTICA =================
+#
+# Medidas guardadas, rejilla y origen solo cambian por acción del
+# usuario: se rasterizan una vez en una imagen + máscara y cada frame
+# se componen con una sola copyTo.
+
+class OverlayCache:
+    def __init__(self):
+        self.key = None
+        self.image = None
+        self.mask = None
+        self.empty = True
+
+    def update(self, state, shape):
+        key = _overlay_key(state, shape)
+        if key == self.key:
+            return
+
+        h, w = shape[:2]
+        self.image = np.zeros((h, w, 3), np.uint8)
+        self.mask = np.zeros((h, w), np.uint8)
+
+        _draw_static_layers(self.image, state)
+        _draw_static_layers(self.mask, state, color=255)
+
+        self.empty = not cv2.countNonZero(self.mask)
+        self.key = key
+
+    def composite(self, view):
+        if not self.empty:
+            cv2.copyTo(self.image, self.mask, view)
+
+
+def _overlay_key(state, shape):
+    return (
+        state.measurements.version,
+        state.rotation,
+        state.scale_mm_per_pixel,
+        state.grid_enabled,
+        state.grid_mode,
+        state.grid_pitch_mm,
+        state.grid_anchor_origin,
+        state.origin,
         state.base_width,
         state.base_height,
-        state.rotation
+        state.view_transform,
+        shape[:2],
     )
 
-    size = 8
 
-    cv2.line(frame, (ox - size, oy), (ox + size, oy), (0, 0, 255), 2)
-    cv2.line(frame, (ox, oy - size), (ox, oy + size), (0, 0, 255), 2)
+def _draw_static_layers(frame, state, color=None):
+    _draw_saved_measures(frame, state, color)
+    _draw_grid(frame, state, color)
+    _draw_origin(frame, state, color)
 
 
-def _apply_gray(frame, state):
-    if state.gray:
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-    return frame
+def _apply_gray(frame, state, pool, dst):
+    # Gris antes de rotar: se rota un solo canal en lugar de tres
+    gray = pool.get("gray", frame.shape[:2])
+    cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
 
+    code = _ROTATE_CODES.get(state.rotation)
+    if code is not None:
+        rotated = pool.get("gray_rot", dst.shape[:2])
+        cv2.rotate(gray, code, dst=rotated)
+        gray = rotated
 
-def _build_canvas(frame, state):
-    canvas = cv2.copyMakeBorder(
-        frame, 0, BOTTOM_PANEL_H,
-        LEFT_MENU_W, RIGHT_PANEL_W,
-        cv2.BORDER_CONSTANT,
-        value=(30, 30, 30)
+    cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR, dst=dst)
+    return dst
+
+
+def _build_canvas(vh, vw, state, pool):
+    # Canvas persistente: los paneles y la zona de vídeo lo cubren
+    # por completo, así que no hace falta limpiarlo
+    canvas = pool.get(
+        "canvas",
+        (vh + BOTTOM_PANEL_H, LEFT_MENU_W + vw + RIGHT_PANEL_W, 3)
     )
 
-    draw_menu(canvas, state)
-    draw_measures(canvas, state)
-    draw_bottom_panel(canvas, state)
+    draw_chrome(canvas, state)
 
     return canvas
 
@@ -130,64 +329,84 @@ def _transform_point(x, y, width, height, rotation):
 
     return x, y
 
-def render(frame, state):
+def _video_area(canvas, h, w):
+    # Vista (sin copia) de la zona de vídeo dentro del canvas
+    return canvas[0:h, LEFT_MENU_W:LEFT_MENU_W + w]
+
+
+def render(frame, state, scale=None):
+
+    if state.frame_pool is None:
+        state.frame_pool = FramePool()
+
+    pool = state.frame_pool
+
+    state.view_scale = _display_scale(frame, state) if scale is None else scale
+
+    vh, vw = _visual_shape(frame, state)
+    dh = max(1, round(vh * state.view_scale))
+    dw = max(1, round(vw * state.view_scale))
+
+    update_view(state, vh, vw, dh, dw)
 
-    frame = _apply_rotation(frame, state)
+    canvas = _build_canvas(dh, dw, state, pool)
 
-    frame = _apply_gray(frame, state)
+    # El frame se escribe directamente en la zona de vídeo del canvas.
+    # Los overlays se dibujan sobre el canvas, nunca sobre el frame
+    # de entrada (la captura en hilo puede entregar el mismo frame
+    # varias veces)
+    view = _video_area(canvas, dh, dw)
 
-    _draw_saved_measures(frame, state)
+    _apply_view(frame, state, pool, view)
 
-    _draw_grid(frame, state)
+    if state.overlay_cache is None:
+        state.overlay_cache = OverlayCache()
 
-    _draw_origin(frame, state) 
+    state.overlay_cache.update(state, view.shape)
+    state.overlay_cache.composite(view)
 
-    draw_preview(frame, state)
+    _draw_selection(view, state)
 
-    canvas = _build_canvas(frame, state)
+    draw_scrubber(view, state)
+
+    draw_preview(view, state)
 
     _draw_cursor(canvas, state)
 
     return canvas
 
 
-from .utils import to_visual_coords
-import cv2
+def render_full_resolution(frame, state):
+    """
+    Render a resolución de captura para exportar, con cachés propias
+    para no invalidar las de pantalla.
+    """
+    export = copy.copy(state)
+    export.overlay_cache = None
+    export.chrome_cache = None
+    export.frame_pool = None
+    export.cursor_pos = None   # El cursor está en coordenadas de pantalla
+    export.hover = None        # Sin resaltados de selección
+    export.selected = None
+    export.playback = None     # Sin scrubber
+    export.zoom = 1.0          # Siempre la imagen completa
+    export.pan = (0.0, 0.0)
+
+    return render(frame, export, scale=1.0)
+
 
-def _draw_grid(frame, state):
+def _draw_grid(frame, state, color=None):
 
     if not state.grid_enabled:
         return
 
-    if state.scale_mm_per_pixel is None:
+    segments = grid_segments(state)
+    if segments is None or not len(segments):
         return
 
-    base_w = state.base_width
-    base_h = state.base_height
-
-    # Paso: 0.1 pulgadas → mm
-    step_mm = 0.1 * 25.4
-
-    # Convertir mm → píxeles base
-    step_px = int(step_mm / state.scale_mm_per_pixel)
-
-    if step_px <= 0:
-        return
+    if color is None:
+        color = (0, 0, 255)  # rojo
 
-    color = (0, 0, 255)  # rojo
-
-    # Líneas verticales
-    x = 0
-    while x < base_w:
-        x1, y1 = to_visual_coords(x, 0, base_w, base_h, state.rotation)
-        x2, y2 = to_visual_coords(x, base_h, base_w, base_h, state.rotation)
-        cv2.line(frame, (x1, y1), (x2, y2), color, 1)
-        x += step_px
-
-    # Líneas horizontales
-    y = 0
-    while y < base_h:
-        x1, y1 = to_visual_coords(0, y, base_w, base_h, state.rotation)
-        x2, y2 = to_visual_coords(base_w, y, base_w, base_h, state.rotation)
-        cv2.line(frame, (x1, y1), (x2, y2), color, 1)
-        y += step_px
+    # Todas las líneas base → pantalla de una vez, una sola polylines
+    pts = base_to_display_array(state, segments)
+    cv2.polylines(frame, pts, False, color, 1)
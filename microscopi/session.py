@@ -0,0 +1,279 @@
+# microscopi/session.py
+#
+# Diario de sesión a prueba de cierres inesperados. Cada cambio que
+# pasa por el historial (history.Command) se añade como una línea JSON
+# a journal.jsonl; el fsync se agrupa (cada SYNC_RECORDS registros o
+# SYNC_INTERVAL segundos). Cada COMPACT_RECORDS registros el estado
+# completo se escribe en snapshot.json (escritura atómica) y el diario
+# se vacía. Al arrancar: snapshot + registros posteriores.
+
+import json
+import os
+import re
+import time
+
+from .measurements import MeasurementStore
+from .user_config import CONFIG_DIR
+
+SESSION_DIR = CONFIG_DIR / "session"
+SNAPSHOT_FILE = "snapshot.json"
+JOURNAL_FILE = "journal.jsonl"
+REJECTED_FILE = "journal.rejected.jsonl"
+
+SYNC_RECORDS = 32
+SYNC_INTERVAL = 1.0      # Segundos
+COMPACT_RECORDS = 5000
+
+# Atributos de AppState que se guardan en la sesión
+_SESSION_ATTRS = ("scale_mm_per_pixel", "origin")
+
+
+class SessionJournal:
+    def __init__(self, directory=SESSION_DIR):
+        self.dir = os.fspath(directory)
+        self.snapshot_path = os.path.join(self.dir, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(self.dir, JOURNAL_FILE)
+
+        self.seq = 0            # Último registro escrito
+        self.records = 0        # Registros en el diario desde la compactación
+        self._pending = 0       # Registros sin fsync
+        self._last_sync = time.monotonic()
+        self._file = None
+        self.replay_error = None  # Registro que detuvo la carga, si lo hay
+        self._keep_snapshot = False  # Snapshot dañado que no se pudo apartar
+
+    # ================= CARGA =================
+
+    def load(self, state):
+        """Restaura snapshot + diario en state. Devuelve nº de medidas."""
+        self.replay_error = None
+        self.seq = 0
+        self.records = 0
+
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                snap = _parse_snapshot(json.load(f))
+        except FileNotFoundError:
+            snap = None
+        except (OSError, KeyError, IndexError, TypeError, ValueError) as e:
+            # Snapshot ilegible: se aparta (nunca se compacta encima) y
+            # el diario, que parte de él, pasa entero a REJECTED_FILE
+            self.replay_error = f"{SNAPSHOT_FILE}: {e!r}"
+            self._set_aside()
+            state.measurements_changed()
+            return len(state.measurements)
+
+        if snap is not None:
+            self.seq, state.measurements, attrs = snap
+            for name, value in attrs.items():
+                _set_attr(state, name, value)
+        snap_seq = self.seq
+
+        try:
+            with open(self.journal_path, "rb+") as f:
+                offset = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError
+                        rec = json.loads(line)
+                    except ValueError:
+                        # Última línea a medio escribir: se descarta
+                        # para que lo que se añada después sea legible
+                        f.truncate(offset)
+                        break
+
+                    # Un registro que no se puede aplicar (falta un campo,
+                    # id desconocido) detiene la reproducción: se queda
+                    # lo restaurado hasta ahí y el resto del diario pasa
+                    # a REJECTED_FILE, para que lo nuevo se añada detrás
+                    try:
+                        seq = int(rec["seq"])
+                        # Registros ya incluidos en el snapshot
+                        if seq > snap_seq:
+                            apply_record(state, rec)
+                    except (KeyError, IndexError, TypeError,
+                            ValueError) as e:
+                        self.replay_error = f"{JOURNAL_FILE}: {e!r}"
+                        self._reject(line + f.read())
+                        f.truncate(offset)
+                        break
+                    offset += len(line)
+
+                    if seq > snap_seq:
+                        self.seq = seq
+                        self.records += 1
+        except OSError:
+            pass
+
+        state.measurements_changed()
+        return len(state.measurements)
+
+    def _reject(self, data):
+        """Añade registros no aplicables a REJECTED_FILE (sin pisar)."""
+        with open(os.path.join(self.dir, REJECTED_FILE), "ab") as f:
+            f.write(data)
+
+    def _set_aside(self):
+        """Aparta un snapshot dañado y su diario sin perder nada."""
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        damaged = os.path.join(self.dir, f"snapshot.damaged-{stamp}.json")
+        try:
+            os.replace(self.snapshot_path, damaged)
+        except OSError:
+            # Sigue ahí: compact() no debe escribir encima
+            self._keep_snapshot = True
+
+        try:
+            with open(self.journal_path, "rb+") as f:
+                self._reject(f.read())
+                f.truncate(0)
+        except OSError:
+            pass
+
+    def discard(self):
+        """Empieza una sesión nueva borrando la anterior."""
+        self.close()
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.seq = 0
+        self.records = 0
+
+    # ================= ESCRITURA =================
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(self.dir, exist_ok=True)
+            self._file = open(self.journal_path, "a")
+
+    def append(self, rec):
+        self._open()
+        self.seq += 1
+        rec["seq"] = self.seq
+        self._file.write(json.dumps(rec, separators=(",", ":")) + "\n")
+        self.records += 1
+        self._pending += 1
+
+        if self._pending >= SYNC_RECORDS:
+            self.sync()
+
+    def log_command(self, cmd, forward):
+        """Listener de history.History."""
+        self.append(cmd.journal(forward))
+
+    def sync(self):
+        if self._file is not None and self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def tick(self, state):
+        """Llamar en cada vuelta del bucle: fsync diferido y compactación."""
+        if self._pending and \
+                time.monotonic() - self._last_sync >= SYNC_INTERVAL:
+            self.sync()
+
+        if self.records >= COMPACT_RECORDS:
+            self.compact(state)
+
+    def compact(self, state):
+        """Escribe el estado completo en el snapshot y vacía el diario."""
+        self.sync()
+        if self._keep_snapshot:
+            return
+        os.makedirs(self.dir, exist_ok=True)
+
+        store = state.measurements
+        snap = {
+            "seq": self.seq,
+            "measurements": store.to_list(),
+            "ids": store.ids[:store.n].tolist(),
+        }
+        for name in _SESSION_ATTRS:
+            snap[name] = getattr(state, name)
+
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(snap, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+
+        # Si se corta aquí, los registros con seq <= snapshot se ignoran
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        open(self.journal_path, "w").close()
+        self.records = 0
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+# ================= REPRODUCCIÓN =================
+
+def session_dir(device):
+    """Directorio por defecto del diario: uno por dispositivo."""
+    name = re.sub(r"[^A-Za-z0-9.-]+", "_", str(device)).strip("_")
+    return SESSION_DIR / (name or "device")
+
+
+def apply_record(state, rec):
+    store = state.measurements
+    op = rec["op"]
+
+    if op == "insert":
+        m = rec["row"]
+        pos = store.n if rec["pos"] is None else rec["pos"]
+        store.insert(pos, m["type"], m["label"], m["text"], m["color"],
+                     m["color_name"], m["points"], m["visible"],
+                     mid=rec["mid"])
+
+    elif op == "delete":
+        store.delete(_row(store, rec["mid"]))
+
+    elif op == "toggle":
+        store.toggle(_row(store, rec["mid"]))
+
+    elif op == "points":
+        i = _row(store, rec["mid"])
+        store.set_points(i, rec["points"])
+        store.set_text(i, rec["text"])
+
+    elif op == "label":
+        store.set_label(_row(store, rec["mid"]), rec["label"])
+
+    elif op == "replace":
+        state.measurements = MeasurementStore.from_list(rec["rows"],
+                                                        rec["ids"])
+
+    elif op == "set" and rec["name"] in _SESSION_ATTRS:
+        _set_attr(state, rec["name"], rec["value"])
+
+
+def _row(store, mid):
+    i = store.row_of(mid)
+    if i is None:
+        raise KeyError(f"unknown measurement id {mid}")
+    return i
+
+
+def _parse_snapshot(snap):
+    """(seq, MeasurementStore, atributos) o excepción si está mal."""
+    seq = int(snap["seq"])
+    store = MeasurementStore.from_list(snap["measurements"], snap["ids"])
+    return seq, store, {name: snap.get(name) for name in _SESSION_ATTRS}
+
+
+def _set_attr(state, name, value):
+    # JSON convierte las tuplas en listas
+    if isinstance(value, list):
+        value = tuple(value)
+    setattr(state, name, value)
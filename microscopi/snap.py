@@ -0,0 +1,137 @@
+# microscopi/snap.py
+#
+# Ajuste sub-píxel de los clics a la esquina o el borde más cercano.
+# Solo se procesa un ROI pequeño alrededor del cursor (como mucho
+# (2 * SNAP_MAX_RADIUS + 1)² píxeles), así que el coste no depende de
+# la resolución de captura. Esquina: máximo del menor autovalor del
+# tensor de estructura + cornerSubPix. Borde: máximo de gradiente más
+# cercano, afinado con una parábola a lo largo de la normal.
+
+import cv2
+import numpy as np
+
+from .i18n import _
+from .utils import measured_frame
+
+SNAP_RADIUS_PX = 12      # Radio de búsqueda en píxeles de pantalla
+SNAP_MIN_RADIUS = 4      # En píxeles base
+SNAP_MAX_RADIUS = 32
+
+SNAP_MIN_GRADIENT = 60.0  # Sobel 3x3 sobre 0-255: por debajo, liso
+SNAP_CORNER_RATIO = 1e-3  # min. autovalor / gradiente² → esquina
+SNAP_EDGE_RATIO = 0.5     # Bordes: gradiente ≥ 50 % del máximo del ROI
+
+_SUBPIX_WIN = 7
+_SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_COUNT,
+                    20, 0.01)
+
+
+def snap_radius(state):
+    """Radio del ROI en píxeles base para el zoom actual."""
+    _ox, _oy, kx, ky = state.view_transform
+    r = SNAP_RADIUS_PX / max(min(kx, ky), 1e-6)
+    return int(min(max(round(r), SNAP_MIN_RADIUS), SNAP_MAX_RADIUS))
+
+
+def snap_point(frame, x, y, radius):
+    """
+    Punto base (x, y) ajustado a la esquina o borde más cercano dentro
+    de radius. Devuelve (x, y, "corner" | "edge") o None si no hay
+    ningún borde claro.
+    """
+    h, w = frame.shape[:2]
+    cx, cy = int(round(x)), int(round(y))
+
+    # ROI con margen para Sobel y la ventana de cornerSubPix
+    m = radius + _SUBPIX_WIN + 2
+    x0, y0 = max(cx - m, 0), max(cy - m, 0)
+    x1, y1 = min(cx + m + 1, w), min(cy + m + 1, h)
+    if x1 - x0 < 8 or y1 - y0 < 8:
+        return None
+
+    roi = frame[y0:y1, x0:x1]
+    if roi.ndim == 3:
+        roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    roi = roi.astype(np.float32)
+
+    gx = cv2.Sobel(roi, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(roi, cv2.CV_32F, 0, 1, ksize=3)
+    mag = cv2.magnitude(gx, gy)
+
+    # Solo cuenta lo que está dentro del círculo de búsqueda
+    yy, xx = np.mgrid[y0:y1, x0:x1]
+    d2 = (xx - x) ** 2 + (yy - y) ** 2
+    inside = d2 <= radius * radius
+
+    peak = float(mag[inside].max()) if inside.any() else 0.0
+    if peak < SNAP_MIN_GRADIENT:
+        return None
+
+    eig = cv2.cornerMinEigenVal(roi, 5, 3)
+    eig[~inside] = 0
+    if eig.max() > SNAP_CORNER_RATIO * peak * peak:
+        return _snap_corner(roi, eig, x0, y0)
+
+    return _snap_edge(mag, gx, gy, inside, d2, peak, x0, y0)
+
+
+def _snap_corner(roi, eig, x0, y0):
+    iy, ix = np.unravel_index(int(np.argmax(eig)), eig.shape)
+    pts = np.array([[[ix, iy]]], np.float32)
+    cv2.cornerSubPix(roi, pts, (_SUBPIX_WIN, _SUBPIX_WIN), (-1, -1),
+                     _SUBPIX_CRITERIA)
+    px, py = pts[0, 0].tolist()
+    return x0 + px, y0 + py, "corner"
+
+
+def _snap_edge(mag, gx, gy, inside, d2, peak, x0, y0):
+    strong = inside & (mag >= SNAP_EDGE_RATIO * peak)
+    d2 = np.where(strong, d2, np.inf)
+    iy, ix = np.unravel_index(int(np.argmin(d2)), d2.shape)
+
+    h, w = mag.shape
+
+    # Subir por la normal hasta la cresta del gradiente
+    for step in range(4):
+        g = float(mag[iy, ix])
+        nx, ny = gx[iy, ix] / g, gy[iy, ix] / g
+        sx, sy = int(round(nx)), int(round(ny))
+        best = (g, ix, iy)
+        for s in (-1, 1):
+            jx, jy = ix + s * sx, iy + s * sy
+            if 0 <= jx < w and 0 <= jy < h and mag[jy, jx] > best[0]:
+                best = (float(mag[jy, jx]), jx, jy)
+        if best[1:] == (ix, iy):
+            break
+        _g, ix, iy = best
+
+    # Parábola sobre el gradiente muestreado a ±1 px por la normal
+    g = float(mag[iy, ix])
+    nx, ny = float(gx[iy, ix] / g), float(gy[iy, ix] / g)
+    samples = [
+        cv2.getRectSubPix(mag, (1, 1), (ix + s * nx, iy + s * ny))[0, 0]
+        for s in (-1, 1)
+    ]
+    a, c = float(samples[0]), float(samples[1])
+    denom = a - 2 * g + c
+    t = 0.5 * (a - c) / denom if denom < 0 else 0.0
+    t = min(max(t, -0.5), 0.5)
+
+    return x0 + ix + t * nx, y0 + iy + t * ny, "edge"
+
+
+def snap_click(state, x, y):
+    """Clic en coordenadas base → punto ajustado si el modo está activo."""
+    frame = measured_frame(state)
+    if not state.snap or frame is None:
+        return x, y
+
+    hit = snap_point(frame, x, y, snap_radius(state))
+    if hit is None:
+        state.status_message = _("Snap: no edge")
+        return x, y
+
+    sx, sy, kind = hit
+    state.status_message = (
+        _("Snapped to corner") if kind == "corner" else _("Snapped to edge"))
+    return round(float(sx), 3), round(float(sy), 3)
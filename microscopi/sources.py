@@ -0,0 +1,228 @@
+# microscopi/sources.py
+#
+# Fuentes de frames sin cámara: replay de directorio/vídeo y generador
+# sintético. Permiten perfilar render() y el bucle principal de forma
+# repetible en una máquina sin microscopio.
+
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .video import FrameSource, VideoSource
+from .playback import PlaybackSource
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"}
+
+
+class _Throttle:
+    """Mantiene un ritmo fijo de frames; fps <= 0 → sin límite."""
+
+    def __init__(self, fps):
+        self.period = 1.0 / fps if fps and fps > 0 else 0.0
+        self.next_t = None
+
+    def wait(self):
+        if not self.period:
+            return
+
+        now = time.monotonic()
+        if self.next_t is None:
+            self.next_t = now
+        elif now < self.next_t:
+            time.sleep(self.next_t - now)
+
+        self.next_t = max(self.next_t + self.period, now)
+
+
+class ReplaySource(FrameSource):
+    """
+    Reproduce en bucle un directorio de imágenes o un fichero de vídeo.
+    La secuencia de frames es siempre la misma, sea cual sea el ritmo.
+    """
+
+    def __init__(self, path, fps=0.0):
+        self.path = Path(path)
+        self.frame_index = 0
+        self._throttle = _Throttle(fps)
+        self._frames = None
+        self._cap = None
+
+        if self.path.is_dir():
+            files = sorted(
+                p for p in self.path.iterdir()
+                if p.suffix.lower() in IMAGE_EXTENSIONS
+            )
+            # Se precargan para que la E/S no contamine las medidas
+            self._frames = [cv2.imread(str(p)) for p in files]
+            self._frames = [f for f in self._frames if f is not None]
+
+            if not self._frames:
+                raise RuntimeError(f"No images found in {path}")
+        else:
+            self._cap = cv2.VideoCapture(str(self.path))
+            if not self._cap.isOpened():
+                raise RuntimeError(f"Cannot open video source {path}")
+
+    def read(self):
+        self._throttle.wait()
+
+        if self._frames is not None:
+            frame = self._frames[self.frame_index % len(self._frames)]
+            self.frame_index += 1
+            return frame
+
+        ret, frame = self._cap.read()
+        if not ret or frame is None:
+            # Fin del fichero → volver al principio
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._cap.read()
+            if not ret or frame is None:
+                raise RuntimeError("Cannot read from video source")
+
+        self.frame_index += 1
+        return frame
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+
+
+class SyntheticSource(FrameSource):
+    """
+    Genera una placa tipo PCB (pistas, pads, vías y serigrafía) a la
+    resolución pedida. Cada frame es un desplazamiento de la misma placa,
+    con lo que el contenido es determinista y cambia de un frame a otro.
+    """
+
+    MARGIN = 64
+
+    def __init__(self, width, height, fps=0.0, seed=0):
+        self.width = width
+        self.height = height
+        self.frame_index = 0
+        self._throttle = _Throttle(fps)
+        self._board = _make_pcb(width + self.MARGIN,
+                                height + self.MARGIN,
+                                seed)
+
+    def read(self):
+        self._throttle.wait()
+
+        # Recorrido circular suave dentro del margen
+        t = self.frame_index * 0.05
+        half = self.MARGIN // 2
+        ox = int(half + (half - 1) * np.cos(t))
+        oy = int(half + (half - 1) * np.sin(t))
+        self.frame_index += 1
+
+        view = self._board[oy:oy + self.height, ox:ox + self.width]
+        return np.ascontiguousarray(view)
+
+
+def _make_pcb(width, height, seed):
+    rng = np.random.default_rng(seed)
+
+    board = np.empty((height, width, 3), np.uint8)
+    board[:] = (40, 90, 20)  # máscara de soldadura verde
+
+    copper = (60, 170, 210)
+    silk = (235, 235, 235)
+    unit = max(8, min(width, height) // 60)
+
+    # Pistas ortogonales y a 45°
+    for _ in range(max(20, (width * height) // (unit * unit * 80))):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        for _ in range(int(rng.integers(1, 4))):
+            length = int(rng.integers(3, 20)) * unit
+            dx, dy = [(1, 0), (0, 1), (1, 1), (1, -1)][rng.integers(0, 4)]
+            x2, y2 = x + dx * length, y + dy * length
+            cv2.line(board, (x, y), (x2, y2), copper,
+                     int(rng.integers(1, 3)) * unit // 4 + 1, cv2.LINE_AA)
+            x, y = x2, y2
+
+    # Huellas de componentes: dos filas de pads rectangulares
+    for _ in range(max(4, (width * height) // (unit * unit * 400))):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        pins = int(rng.integers(2, 9))
+        pitch = 2 * unit
+        for i in range(pins):
+            for row in (0, 3 * unit):
+                px, py = x + i * pitch, y + row
+                cv2.rectangle(board, (px, py),
+                              (px + unit, py + unit // 2 + unit),
+                              copper, -1)
+        cv2.rectangle(board, (x - unit // 2, y - unit // 2),
+                      (x + pins * pitch, y + 4 * unit), silk, 1)
+
+    # Vías
+    for _ in range(max(10, (width * height) // (unit * unit * 80))):
+        c = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.circle(board, c, unit // 2 + 2, copper, -1, cv2.LINE_AA)
+        cv2.circle(board, c, unit // 4 + 1, (20, 20, 20), -1, cv2.LINE_AA)
+
+    # Serigrafía
+    for i in range(max(4, (width * height) // (unit * unit * 600))):
+        org = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.putText(board, f"R{i + 1}", org, cv2.FONT_HERSHEY_SIMPLEX,
+                    unit / 20, silk, 1, cv2.LINE_AA)
+
+    return board
+
+
+def _split_rate(spec):
+    """SPEC@FPS → (SPEC, fps); sin sufijo, fps = 0 (sin límite)."""
+    if "@" not in spec:
+        return spec, 0.0
+    spec, _, fps = spec.rpartition("@")
+    try:
+        return spec, float(fps)
+    except ValueError:
+        raise RuntimeError(f"Invalid frame rate {fps!r}")
+
+
+def open_source(config):
+    """
+    Crea la fuente indicada por --device:
+
+        2                      dispositivo V4L2
+        http://... / file.mp4  VideoCapture (FFMPEG)
+        play:PATH              grabación con seek (vídeo o secuencia PNG)
+        synthetic[:WxH][@FPS]  placa PCB sintética
+        replay:PATH[@FPS]      directorio de imágenes o vídeo en bucle
+        DIRECTORIO             replay sin límite de ritmo
+    """
+    device = config.video_device
+
+    if isinstance(device, str):
+        if device.startswith("synthetic"):
+            spec, fps = _split_rate(device)
+            width, height = config.width, config.height
+            _, _, size = spec.partition(":")
+            if size:
+                try:
+                    width, height = map(int, size.lower().split("x"))
+                except ValueError:
+                    raise RuntimeError(f"Invalid synthetic size {size!r}")
+            return SyntheticSource(width, height, fps)
+
+        if device.startswith("replay:"):
+            spec, fps = _split_rate(device)
+            return ReplaySource(spec[len("replay:"):], fps)
+
+        if device.startswith("play:"):
+            return PlaybackSource(device[len("play:"):])
+
+        if Path(device).is_dir():
+            return ReplaySource(device)
+
+    return VideoSource(
+        device,
+        config.width,
+        config.height,
+        threaded=config.threaded_capture,
+        fourcc=config.fourcc,
+        fps=config.fps,
+        buffer_size=config.buffer_size
+    )
@@ -0,0 +1,84 @@
+# microscopi/spatial.py
+#
+# Índice espacial de rejilla uniforme sobre cajas en coordenadas base.
+# Cada clave se registra en las celdas que cubre su caja; una consulta
+# solo recorre las celdas de la zona pedida. Se actualiza de forma
+# incremental (insert / remove / update), sin reconstruir.
+
+CELL_SIZE = 64   # Píxeles base por celda
+
+
+class SpatialIndex:
+    def __init__(self, cell=CELL_SIZE):
+        self.cell = cell
+        self._cells = {}    # (cx, cy) → set(claves)
+        self._boxes = {}    # clave → (x0, y0, x1, y1)
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __contains__(self, key):
+        return key in self._boxes
+
+    def _cell_range(self, x0, y0, x1, y1):
+        c = self.cell
+        return (int(x0 // c), int(y0 // c), int(x1 // c), int(y1 // c))
+
+    def _cells_of(self, box):
+        cx0, cy0, cx1, cy1 = self._cell_range(*box)
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                yield cx, cy
+
+    def insert(self, key, box):
+        if key in self._boxes:
+            self.remove(key)
+
+        self._boxes[key] = box
+        for cell in self._cells_of(box):
+            self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        box = self._boxes.pop(key, None)
+        if box is None:
+            return
+
+        for cell in self._cells_of(box):
+            keys = self._cells.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._cells[cell]
+
+    def update(self, key, box):
+        if self._boxes.get(key) != box:
+            self.insert(key, box)
+
+    def clear(self):
+        self._cells.clear()
+        self._boxes.clear()
+
+    def query(self, x0, y0, x1, y1):
+        """Claves cuya caja corta el rectángulo (x0, y0)-(x1, y1)."""
+        found = set()
+        cx0, cy0, cx1, cy1 = self._cell_range(x0, y0, x1, y1)
+
+        # Rectángulo enorme frente a pocas celdas: recorrer las celdas
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+            candidates = [k for keys in self._cells.values() for k in keys]
+        else:
+            candidates = []
+            for cy in range(cy0, cy1 + 1):
+                for cx in range(cx0, cx1 + 1):
+                    keys = self._cells.get((cx, cy))
+                    if keys:
+                        candidates.extend(keys)
+
+        for key in candidates:
+            if key in found:
+                continue
+            bx0, by0, bx1, by1 = self._boxes[key]
+            if bx0 <= x1 and bx1 >= x0 and by0 <= y1 and by1 >= y0:
+                found.add(key)
+
+        return found
@@ -1,5 +1,9 @@
 # microscopi/state.py
 
+from .measurements import MeasurementStore
+from .panel import MeasurePanel
+from .history import History
+
 class AppState:
     def __init__(self, config):
         self.config = config
@@ -15,17 +19,71 @@ class AppState:
 
         self.measure_color = (0, 255, 0)
         self.measure_color_name = "GRN"
+        self.snap = config.snap    # Clics ajustados a esquina/borde (snap.py)
 
-        self.measurements = []
+        self.measurements = MeasurementStore()
+        self.hover = None          # id de la medida bajo el cursor
+        self.selected = None       # id de la medida seleccionada
+        self.drag_endpoint = None  # (id, extremo, antes) arrastrándose
+        self.measure_panel = MeasurePanel()  # Scroll y filtros de la lista
+        self.history = History()   # Deshacer / rehacer (history.Command)
+        self.writer = None         # writer.BackgroundWriter (None → síncrono)
+        self.export_format = "JSON"  # Formato del botón EXP (exporters)
+        self.recorder = None       # recorder.Recorder mientras se graba
+        self.closing_recorders = []  # Parados, aún escribiendo
+        self.autocal = None        # autocal.CalibrationJob en curso
+        self.lens = None           # lens.LensModel (tablas de remap)
+        self.undistort = config.undistort  # Aplicar la corrección de lente
+        self.lens_views = []       # Vistas del patrón para calibrar la lente
+        self.lens_frame = None     # Frame completo corregido (para medir)
+        self.playback = None       # playback.PlaybackSource (grabaciones)
+        self.scrubbing = False     # Arrastrando el scrubber
 
         self.cursor_pos = None
-        self.last_frame = None
+        self.view_scale = 1.0      # Píxeles de pantalla por píxel base
+        self.zoom = 1.0            # Lupa (viewport)
+        self.pan = (0.0, 0.0)      # Esquina visible, coordenadas visuales
+        self.drag_pos = None       # Arrastre para desplazar la vista
+        self.view_crop = None      # (ox, oy, ancho, alto) visual visible
+        self.view_transform = (0, 0, 1.0, 1.0)  # visual → pantalla
+        self.visual_size = None    # (ancho, alto) del frame rotado
+        self.display_size = None   # (ancho, alto) de la zona de vídeo
+        self.window_width = None   # Anchura de la ventana (--display-width auto)
+        self.source_frame = None   # Último frame de captura (resolución completa)
+        self.last_frame = None     # Último canvas mostrado (sin copia)
+        self.canvas_size = None    # (ancho, alto) del último canvas
         self.quit = False
 
         self.status_message = ""
         self.input_mode = None
         self.input_buffer = ""
+        self.prompt = None         # prompt.Prompt abierto en la barra inferior
 
         self.origin = None  # Coordenada origen en píxeles
 
         self.grid_enabled = False
+        self.grid_mode = "custom" if config.grid_pitch else "0.1in"
+        self.grid_pitch_mm = config.grid_pitch
+        self.grid_anchor_origin = False   # Rejilla alineada con el origen
+        self.grid_geometry = None         # (clave, segmentos base)
+
+        self.capture_stats = None  # Contadores de VideoSource (modo hilo)
+        self.capture_fps = None    # Frames nuevos por segundo (medido)
+        self.last_capture_t = None
+
+        self.overlay_cache = None  # Capa estática (renderer.OverlayCache)
+        self.chrome_cache = None   # Paneles (ui.ChromeCache)
+        self.frame_pool = None     # Buffers reutilizables (buffers.FramePool)
+
+        self.frozen = False        # Congelar imagen (no se leen frames)
+
+        # Motivos pendientes de redibujar ("frame", "cursor", "points",
+        # "measurements", "input"...). Vacío → el bucle no renderiza.
+        self.dirty = {"frame"}
+
+    def mark_dirty(self, reason="state"):
+        self.dirty.add(reason)
+
+    def measurements_changed(self):
+        # La versión la lleva el propio MeasurementStore
+        self.mark_dirty("measurements")
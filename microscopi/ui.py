@@ -1,6 +1,7 @@
 # microscopi/ui.py
 
 import cv2
+import numpy as np
 from .constants import LEFT_MENU_W, RIGHT_PANEL_W, BOTTOM_PANEL_H, BUTTONS, COLOR_MAP, VERSION
 from .utils import draw_text
 
@@ -56,33 +57,8 @@ def draw_menu(canvas, state):
 
 
 def draw_measures(canvas, state):
-    x = canvas.shape[1] - RIGHT_PANEL_W + 10
-    y = 30
-
-    for idx, m in enumerate(state.measurements[-14:]):
-        box_x = x
-        box_y = y - 14
-
-        cv2.rectangle(canvas,
-                      (box_x, box_y),
-                      (box_x + 14, box_y + 14),
-                      (255, 255, 255),
-                      2)
-
-        if m["visible"]:
-            cv2.line(canvas,
-                     (box_x + 3, box_y + 7),
-                     (box_x + 6, box_y + 11),
-                     (255, 255, 255), 2)
-            cv2.line(canvas,
-                     (box_x + 6, box_y + 11),
-                     (box_x + 11, box_y + 3),
-                     (255, 255, 255), 2)
-
-        txt = f"{m['type']} {m['label']} {m['text']}"
-        draw_text(canvas, txt, (x + 20, y), 18, m["color"])
-
-        y += 22
+    # Lista virtualizada (panel.MeasurePanel): solo las filas visibles
+    state.measure_panel.draw(canvas, state)
 
 
 def draw_bottom_panel(canvas, state):
@@ -99,10 +75,66 @@ def draw_bottom_panel(canvas, state):
               (180, 180, 180))
 
     if state.input_mode:
-        draw_text(canvas, "> " + state.input_buffer,
+        title = state.prompt.title + " " if state.prompt else ""
+        draw_text(canvas, title + "> " + state.input_buffer + "_",
                   (LEFT_MENU_W + 10, y + 28), 20, (0, 255, 255))
 
 
+# ================= CACHÉ DE PANELES =================
+#
+# Menú, panel de medidas y barra inferior se dibujan en tiles propios
+# y solo se regeneran cuando cambia lo que muestran.
+
+PANEL_BG = (30, 30, 30)
+
+
+class ChromeCache:
+    def __init__(self):
+        self.keys = {}
+        self.tiles = {}
+
+    def tile(self, name, key, shape, draw, state):
+        if self.keys.get(name) != key:
+            tile = np.empty(shape, np.uint8)
+            tile[:] = PANEL_BG
+            draw(tile, state)
+            self.tiles[name] = tile
+            self.keys[name] = key
+        return self.tiles[name]
+
+
+def draw_chrome(canvas, state):
+    if state.chrome_cache is None:
+        state.chrome_cache = ChromeCache()
+
+    cache = state.chrome_cache
+    h, w = canvas.shape[:2]
+
+    menu = cache.tile(
+        "menu",
+        (h, state.mode, state.measure_color_name,
+         tuple(state.measure_color)),
+        (h, LEFT_MENU_W, 3), draw_menu, state
+    )
+
+    measures = cache.tile(
+        "measures",
+        (h, state.measurements.version, state.measure_panel.key(),
+         state.selected),
+        (h, RIGHT_PANEL_W, 3), draw_measures, state
+    )
+
+    bottom = cache.tile(
+        "bottom",
+        (w, state.status_message, state.input_mode, state.input_buffer),
+        (BOTTOM_PANEL_H, w, 3), draw_bottom_panel, state
+    )
+
+    canvas[:, :LEFT_MENU_W] = menu
+    canvas[:, w - RIGHT_PANEL_W:] = measures
+    canvas[h - BOTTOM_PANEL_H:, LEFT_MENU_W:] = bottom[:, LEFT_MENU_W:]
+
+
 def hit_menu(x, y):
     for i, txt in enumerate(BUTTONS):
         by = 20 + i * 38
@@ -1,7 +1,10 @@
 # microscopi/utils.py
 
 import math
+from collections import OrderedDict
+
 import cv2
+import numpy as np
 from .constants import MM_PER_INCH
 
 FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
@@ -14,8 +17,92 @@ except Exception:
         "Microscopi requires OpenCV built with FreeType support"
     )
 
+# ================= CACHÉ DE TEXTO =================
+#
+# FreeType es de las llamadas más caras del bucle. Cada texto se
+# rasteriza una vez en una máscara alfa y después solo se mezcla.
+
+TEXT_CACHE_SIZE = 512
+
+_text_cache = OrderedDict()
+
+
+def _render_text_tile(text, size, color):
+    (tw, th), base = ft.getTextSize(text, size, -1)
+    pad = size
+
+    img = np.zeros((th + base + 2 * pad, tw + 2 * pad, 3), np.uint8)
+    org = (pad, pad + th)
+    ft.putText(img, text, org, size, (255, 255, 255), -1,
+               cv2.LINE_AA, True)
+
+    alpha = img[:, :, 0]
+    x, y, w, h = cv2.boundingRect(alpha)
+    if w == 0 or h == 0:
+        return None
+
+    alpha = alpha[y:y + h, x:x + w].astype(np.uint16)[:, :, None]
+    color = np.array(color[:3], np.uint16)
+
+    return (
+        x - org[0],            # desplazamiento respecto a pos
+        y - org[1],
+        255 - alpha,           # peso del fondo
+        alpha * color,         # color premultiplicado
+    )
+
+
+def _text_tile(text, size, color):
+    key = (text, size, tuple(color))
+
+    tile = _text_cache.get(key)
+    if tile is not None or key in _text_cache:
+        _text_cache.move_to_end(key)
+        return tile
+
+    tile = _render_text_tile(text, size, color)
+    _text_cache[key] = tile
+    if len(_text_cache) > TEXT_CACHE_SIZE:
+        _text_cache.popitem(last=False)
+
+    return tile
+
+
 def draw_text(img, text, pos, size, color):
-    ft.putText(img, text, pos, size, color, -1, cv2.LINE_AA, True)
+    if not text:
+        return
+
+    tile = _text_tile(text, size, color)
+    if tile is None:
+        return
+
+    dx, dy, inv, pre = tile
+    x, y = pos[0] + dx, pos[1] + dy
+    h, w = inv.shape[:2]
+
+    # Recorte contra los bordes de la imagen
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, img.shape[1]), min(y + h, img.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    roi = img[y0:y1, x0:x1]
+    ty, tx = slice(y0 - y, y1 - y), slice(x0 - x, x1 - x)
+    roi[:] = (roi * inv[ty, tx] + pre[ty, tx]) // 255
+
+def measured_frame(state):
+    """
+    Frame base sobre el que se mide: corregido si hay modelo de lente.
+    El render solo corrige la zona visible; el frame completo se
+    corrige aquí, una vez por frame de captura.
+    """
+    frame, lens = state.source_frame, state.lens
+    if (frame is None or lens is None or not state.undistort
+            or not lens.fits(frame)):
+        return frame
+    if state.lens_frame is None:
+        state.lens_frame = lens.remap(frame)
+    return state.lens_frame
 
 def px_to_mm(state, px):
     if state.scale_mm_per_pixel is None:
@@ -41,19 +128,23 @@ def current_measure_text(state):
     if len(state.points) != 2:
         return None
 
-    (x1, y1), (x2, y2) = state.points
+    return measure_text(state, state.mode, state.points)
+
 
-    if state.mode == "DIS":
+def measure_text(state, mode, points):
+    (x1, y1), (x2, y2) = points
+
+    if mode == "DIS":
         px = math.hypot(x2 - x1, y2 - y1)
         mm = px_to_mm(state, px)
         return format_mm(state, mm) if mm else f"{px:.1f}px"
 
-    if state.mode == "RAD":
+    if mode == "RAD":
         r = math.hypot(x2 - x1, y2 - y1)
         mm = px_to_mm(state, 2 * r)
         return format_mm(state, mm) if mm else f"{2*r:.1f}px"
 
-    if state.mode == "SQR":
+    if mode == "SQR":
         w = abs(x2 - x1)
         h = abs(y2 - y1)
         mm_w = px_to_mm(state, w)
@@ -62,8 +153,29 @@ def current_measure_text(state):
             return f"{format_mm(state, mm_w)} x {format_mm(state, mm_h)}"
         return f"{w:.1f}px x {h:.1f}px"
 
+    if mode == "XY":
+        return xy_text(state, x1, y1)
+
     return None
 
+
+def xy_text(state, x, y):
+    if state.origin:
+        ox, oy = state.origin
+        dx = x - ox
+        dy = y - oy
+    else:
+        dx, dy = x, y
+
+    mmx = px_to_mm(state, dx)
+    mmy = px_to_mm(state, dy)
+
+    if mmx is not None:
+        return f"({format_mm(state, mmx)}, {format_mm(state, mmy)})"
+    # Puntos con ajuste sub-píxel: dos decimales bastan
+    return f"({round(dx, 2):g}px, {round(dy, 2):g}px)"
+
+
 def to_base_coords(x, y, base_width, base_height, rotation):
 
     if rotation == 0:
@@ -102,3 +214,130 @@ def to_visual_coords(x, y, base_width, base_height, rotation):
         return y, base_width - 1 - x
 
     return x, y
+
+
+# ================= COORDENADAS DE PANTALLA =================
+#
+# La zona de vídeo puede estar reducida (--display-width) y ampliada o
+# desplazada (viewport). state.view_transform = (ox, oy, kx, ky) lleva
+# de coordenadas visuales a pantalla. Las medidas siguen en coordenadas
+# base a resolución completa; solo el dibujo y los clics pasan por aquí.
+
+def base_to_display(state, x, y):
+    x, y = to_visual_coords(
+        x, y,
+        state.base_width,
+        state.base_height,
+        state.rotation
+    )
+
+    ox, oy, kx, ky = state.view_transform
+    return (int(round((x - ox + 0.5) * kx - 0.5)),
+            int(round((y - oy + 0.5) * ky - 0.5)))
+
+
+def display_to_visual(state, x, y):
+    ox, oy, kx, ky = state.view_transform
+    return ox + (x + 0.5) / kx - 0.5, oy + (y + 0.5) / ky - 0.5
+
+
+def display_to_base(state, x, y):
+    x, y = display_to_visual(state, x, y)
+
+    x, y = to_base_coords(
+        x, y,
+        state.base_width,
+        state.base_height,
+        state.rotation
+    )
+
+    # Sin ampliación un píxel de pantalla cubre al menos un píxel base:
+    # coordenadas enteras. Ampliado se conserva la fracción.
+    _, _, kx, ky = state.view_transform
+    if kx <= 1 and ky <= 1:
+        return int(round(x)), int(round(y))
+    return round(x, 2), round(y, 2)
+
+
+# ================= TRANSFORMACIONES EN LOTE =================
+#
+# Versiones NumPy para N×2 puntos (o cualquier forma (..., 2)), con
+# coordenadas reales. Cada paso es una transformación afín 2×3:
+# rotación base → visual y vista (escala + desplazamiento) visual →
+# pantalla, así que se pueden componer e invertir.
+
+def rotation_matrix(base_width, base_height, rotation):
+    """Afín base → visual para ROTATE_90/180/270 de OpenCV."""
+    w, h = base_width, base_height
+
+    if rotation == 90:
+        return np.array([[0., -1., h - 1], [1., 0., 0.]])
+
+    if rotation == 180:
+        return np.array([[-1., 0., w - 1], [0., -1., h - 1]])
+
+    if rotation == 270:
+        return np.array([[0., 1., 0.], [-1., 0., w - 1]])
+
+    return np.array([[1., 0., 0.], [0., 1., 0.]])
+
+
+def view_matrix(state):
+    """Afín visual → pantalla a partir de state.view_transform."""
+    ox, oy, kx, ky = state.view_transform
+    return np.array([
+        [kx, 0., kx * (0.5 - ox) - 0.5],
+        [0., ky, ky * (0.5 - oy) - 0.5],
+    ])
+
+
+def compose_affine(outer, inner):
+    """outer ∘ inner (primero inner)."""
+    m = np.empty((2, 3))
+    m[:, :2] = outer[:, :2] @ inner[:, :2]
+    m[:, 2] = outer[:, :2] @ inner[:, 2] + outer[:, 2]
+    return m
+
+
+def invert_affine(matrix):
+    a = matrix[:, :2]
+    inv = np.empty((2, 3))
+    inv[:, :2] = np.linalg.inv(a)
+    inv[:, 2] = -inv[:, :2] @ matrix[:, 2]
+    return inv
+
+
+def apply_affine(matrix, pts):
+    pts = np.asarray(pts, np.float64)
+    return pts @ matrix[:, :2].T + matrix[:, 2]
+
+
+def base_to_display_matrix(state):
+    return compose_affine(
+        view_matrix(state),
+        rotation_matrix(state.base_width, state.base_height, state.rotation)
+    )
+
+
+def to_visual_array(pts, base_width, base_height, rotation):
+    return apply_affine(
+        rotation_matrix(base_width, base_height, rotation), pts
+    )
+
+
+def to_base_array(pts, base_width, base_height, rotation):
+    return apply_affine(
+        invert_affine(rotation_matrix(base_width, base_height, rotation)),
+        pts
+    )
+
+
+def base_to_display_array(state, pts):
+    """Puntos base → píxeles de pantalla (int32, listos para dibujar)."""
+    out = apply_affine(base_to_display_matrix(state), pts)
+    return np.rint(out).astype(np.int32)
+
+
+def display_to_base_array(state, pts):
+    """Píxeles de pantalla → coordenadas base reales."""
+    return apply_affine(invert_affine(base_to_display_matrix(state)), pts)
@@ -1,11 +1,44 @@
+import abc
+import threading
+import time
+from collections import deque
+
 import cv2
 
 
-class VideoSource:
-    def __init__(self, device, width: int, height: int):
+FOURCC_CANDIDATES = ("MJPG", "YUYV", "H264")
+
+
+def _fourcc_str(code):
+    code = int(code)
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+
+
+class FrameSource(abc.ABC):
+    """Interfaz común de las fuentes de frames (cámara, replay, sintética)."""
+
+    threaded = False
+    fresh = True   # El último read() entregó un frame nuevo
+
+    @abc.abstractmethod
+    def read(self):
+        ...
+
+    def stats(self):
+        return None
+
+    def release(self):
+        pass
+
+
+class VideoSource(FrameSource):
+    def __init__(self, device, width: int, height: int,
+                 threaded: bool = False, buffer_frames: int = 3,
+                 fourcc=None, fps=None, buffer_size=None):
         self.device = device
         self.width = width
         self.height = height
+        self.threaded = threaded
 
         # Si es entero → dispositivo local V4L2
         if isinstance(device, int):
@@ -17,17 +50,171 @@ class VideoSource:
         if not self.cap.isOpened():
             raise RuntimeError(f"Cannot open video source {device}")
 
-        # Solo intentar fijar resolución en dispositivos locales
+        # Solo intentar fijar formato y resolución en dispositivos locales.
+        # V4L2 necesita el FOURCC antes que el tamaño.
         if isinstance(device, int):
+            if fourcc:
+                self.cap.set(cv2.CAP_PROP_FOURCC,
+                             cv2.VideoWriter_fourcc(*fourcc))
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            if fps:
+                self.cap.set(cv2.CAP_PROP_FPS, fps)
+            if buffer_size:
+                self.cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+        # Modo realmente negociado con el driver
+        self.fourcc = _fourcc_str(self.cap.get(cv2.CAP_PROP_FOURCC))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+
+        # --- Estado de captura en hilo ---
+        self.grabbed = 0   # frames leídos del sensor
+        self.dropped = 0   # frames sobrescritos sin llegar a mostrarse
+        self.stale = 0     # read() sin frame nuevo (se repite el anterior)
+
+        self._ring = deque(maxlen=max(1, buffer_frames))
+        self._cond = threading.Condition()
+        self._running = False
+        self._failed = False
+        self._thread = None
+        self._last = None          # (seq, timestamp, frame) entregado
+        self._seq = 0
+
+        if threaded:
+            self._running = True
+            self._thread = threading.Thread(
+                target=self._grab_loop,
+                name="microscopi-capture",
+                daemon=True
+            )
+            self._thread.start()
+
+    # ================= HILO DE CAPTURA =================
+
+    def _grab_loop(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            ts = time.monotonic()
+
+            with self._cond:
+                if not ret or frame is None:
+                    self._failed = True
+                    self._cond.notify_all()
+                    return
+
+                self._seq += 1
+                self.grabbed += 1
+
+                # El anillo está lleno: el más antiguo nunca se mostrará
+                if len(self._ring) == self._ring.maxlen:
+                    self.dropped += 1
+
+                self._ring.append((self._seq, ts, frame))
+                self._cond.notify_all()
+
+    def _read_threaded(self):
+        with self._cond:
+            # Solo se espera al primer frame; después nunca bloquea
+            while not self._ring and self._last is None and not self._failed:
+                self._cond.wait(timeout=5.0)
+                if not self._ring and self._last is None:
+                    break
+
+            if self._ring:
+                # Nos quedamos con el más reciente; el resto se descarta
+                self.dropped += len(self._ring) - 1
+                self._last = self._ring.pop()
+                self._ring.clear()
+                self.fresh = True
+            elif self._last is not None and not self._failed:
+                self.stale += 1
+                self.fresh = False
+            else:
+                raise RuntimeError("Cannot read from video source")
+
+            return self._last[2]
+
+    # ================= API =================
 
     def read(self):
+        if self.threaded:
+            return self._read_threaded()
+
         ret, frame = self.cap.read()
         if not ret or frame is None:
             raise RuntimeError("Cannot read from video source")
         return frame
 
+    def stats(self):
+        """Contadores de captura y retraso del frame mostrado (segundos)."""
+        lag = None
+        if self._last is not None:
+            lag = time.monotonic() - self._last[1]
+
+        return {
+            "grabbed": self.grabbed,
+            "dropped": self.dropped,
+            "stale": self.stale,
+            "lag": lag,
+        }
+
     def release(self):
+        if self._thread is not None:
+            self._running = False
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
         if self.cap:
             self.cap.release()
+
+
+# ================= NEGOCIACIÓN DE FORMATO =================
+
+def measure_fps(video, frames=20, warmup=3):
+    for _ in range(warmup):
+        video.read()
+
+    t0 = time.monotonic()
+    for _ in range(frames):
+        video.read()
+    elapsed = time.monotonic() - t0
+
+    return frames / elapsed if elapsed > 0 else 0.0
+
+
+def probe_best_format(device, width, height, fps=None, buffer_size=None,
+                      candidates=FOURCC_CANDIDATES):
+    """
+    Prueba cada FOURCC a la resolución pedida y devuelve el más rápido
+    que el driver acepte: {"fourcc": str, "fps": float} o None.
+    """
+    best = None
+
+    for fourcc in candidates:
+        try:
+            video = VideoSource(device, width, height,
+                                fourcc=fourcc, fps=fps,
+                                buffer_size=buffer_size)
+        except RuntimeError:
+            continue
+
+        try:
+            # El driver puede caer silenciosamente a otro formato
+            # o a otra resolución
+            if video.fourcc != fourcc:
+                continue
+
+            frame = video.read()
+            if frame.shape[1] != width or frame.shape[0] != height:
+                continue
+
+            measured = measure_fps(video)
+        except RuntimeError:
+            continue
+        finally:
+            video.release()
+
+        if best is None or measured > best["fps"]:
+            best = {"fourcc": fourcc, "fps": round(measured, 1)}
+
+    return best
@@ -0,0 +1,79 @@
+# microscopi/viewport.py
+#
+# Lupa digital: zoom y desplazamiento sobre la imagen rotada (coordenadas
+# "visuales"). El render solo recorta y procesa la zona visible.
+#
+#   pantalla = (visual - pan + 0.5) * k - 0.5      (por eje)
+#
+# con k = tamaño en pantalla / tamaño del recorte visual.
+
+from .utils import display_to_visual
+
+MIN_ZOOM = 1.0
+MAX_ZOOM = 32.0
+ZOOM_STEP = 1.25
+
+
+def update_view(state, vh, vw, dh, dw):
+    """
+    Fija el recorte visual (entero) y las escalas de pantalla para un
+    frame visual de vw x vh mostrado en dw x dh.
+    """
+    zoom = min(max(state.zoom, MIN_ZOOM), MAX_ZOOM)
+
+    cw = max(1, min(vw, round(vw / zoom)))
+    ch = max(1, min(vh, round(vh / zoom)))
+
+    px = min(max(state.pan[0], 0), vw - cw)
+    py = min(max(state.pan[1], 0), vh - ch)
+    state.pan = (px, py)
+
+    ox, oy = int(round(px)), int(round(py))
+
+    state.zoom = zoom
+    state.view_crop = (ox, oy, cw, ch)
+    state.view_transform = (ox, oy, dw / cw, dh / ch)
+    state.visual_size = (vw, vh)
+    state.display_size = (dw, dh)
+
+
+def zoom_at(state, x, y, factor):
+    """Zoom manteniendo fijo el punto de pantalla (x, y)."""
+    if state.visual_size is None:
+        return
+
+    zoom = min(max(state.zoom * factor, MIN_ZOOM), MAX_ZOOM)
+    if zoom == state.zoom:
+        return
+
+    vx, vy = display_to_visual(state, x, y)
+
+    vw, vh = state.visual_size
+    dw, dh = state.display_size
+    kx = dw / (vw / zoom)
+    ky = dh / (vh / zoom)
+
+    state.zoom = zoom
+    state.pan = (vx - (x + 0.5) / kx + 0.5,
+                 vy - (y + 0.5) / ky + 0.5)
+    state.mark_dirty("view")
+
+
+def zoom_center(state, factor):
+    if state.display_size is None:
+        return
+    dw, dh = state.display_size
+    zoom_at(state, dw // 2, dh // 2, factor)
+
+
+def pan_by(state, dx, dy):
+    """Desplaza la vista dx, dy píxeles de pantalla."""
+    _, _, kx, ky = state.view_transform
+    state.pan = (state.pan[0] - dx / kx, state.pan[1] - dy / ky)
+    state.mark_dirty("view")
+
+
+def reset_view(state):
+    state.zoom = 1.0
+    state.pan = (0.0, 0.0)
+    state.mark_dirty("view")
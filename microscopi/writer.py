@@ -0,0 +1,91 @@
+# microscopi/writer.py
+#
+# Escritura de capturas y exportaciones en un hilo aparte. La
+# compresión PNG de un canvas 4K tarda cientos de ms: el hilo de UI
+# solo copia la imagen y encola el trabajo. El resultado se comunica
+# por state.status_message desde el bucle principal (poll).
+
+import queue
+import threading
+
+import cv2
+
+from .i18n import _
+
+WRITER_QUEUE = 4          # Trabajos pendientes como máximo
+
+# Formatos de captura sin pérdidas: PNG (nivel 0-9) o BMP (sin
+# compresión, el más rápido)
+IMAGE_FORMATS = ("png", "bmp")
+
+
+def image_params(config):
+    if config.image_format == "png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, config.png_compression]
+    return []
+
+
+def write_image(filename, image, params=()):
+    if not cv2.imwrite(filename, image, list(params)):
+        raise OSError(f"cannot write {filename}")
+
+
+class BackgroundWriter:
+    def __init__(self, max_pending=WRITER_QUEUE):
+        self._jobs = queue.Queue(maxsize=max_pending)
+        self._results = queue.Queue()   # Mensajes para la barra de estado
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name="microscopi-writer",
+            daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._jobs.get()
+            try:
+                if item is None:
+                    return
+
+                job, message = item
+                try:
+                    job()
+                    self._results.put(message)
+                except Exception as e:
+                    self._results.put(_("Save failed:") + f" {e}")
+            finally:
+                self._jobs.task_done()
+
+    @property
+    def pending(self):
+        return self._jobs.unfinished_tasks
+
+    def submit(self, job, message):
+        """
+        Encola job() y devuelve True, o False si la cola está llena.
+        message se muestra al terminar bien.
+        """
+        try:
+            self._jobs.put_nowait((job, message))
+        except queue.Full:
+            return False
+        return True
+
+    def poll(self, state):
+        """Llamar desde el bucle principal: publica los resultados."""
+        while True:
+            try:
+                message = self._results.get_nowait()
+            except queue.Empty:
+                return
+            state.status_message = message
+            state.mark_dirty("status")
+
+    def close(self, state=None):
+        """Espera a que se escriba todo lo pendiente y para el hilo."""
+        self._jobs.put(None)
+        self._thread.join()
+        if state is not None:
+            self.poll(state)
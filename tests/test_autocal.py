@@ -0,0 +1,154 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+if not hasattr(cv2, "freetype"):
+    pytest.skip("OpenCV without FreeType", allow_module_level=True)
+
+from microscopi.autocal import detect_and_fit, fit_scale, parse_target
+
+SIZE = (720, 960)
+SS = 4   # Supermuestreo al dibujar los patrones
+
+
+def finish(big, angle, noise=3.0, seed=0, border=220):
+    """Reduce, gira alrededor del centro y añade ruido."""
+    h, w = SIZE
+    img = cv2.resize(big, (w, h), interpolation=cv2.INTER_AREA)
+    rot = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    img = cv2.warpAffine(img, rot, (w, h), borderValue=border)
+    img = img + np.random.default_rng(seed).normal(0, noise, img.shape)
+    return img.clip(0, 255).astype(np.uint8)
+
+
+def ruler(pitch, width, angle, count=30):
+    """Divisiones oscuras de width px cada pitch px; una larga cada 5."""
+    big = np.full((SIZE[0] * SS, SIZE[1] * SS), 220, np.uint8)
+    x0 = (SIZE[1] - pitch * (count - 1)) / 2
+    for k in range(count):
+        x = (x0 + k * pitch) * SS
+        length = 125 if k % 5 == 0 else 75
+        cv2.rectangle(big, (round(x - width * SS / 2), 250 * SS),
+                      (round(x + width * SS / 2) - 1, (250 + length) * SS),
+                      30, -1)
+    return finish(big, angle)
+
+
+def checker(cols, rows, square, angle):
+    big = np.full((SIZE[0] * SS, SIZE[1] * SS), 230, np.uint8)
+    s = square * SS
+    for j in range(rows + 1):
+        for i in range(cols + 1):
+            if (i + j) % 2 == 0:
+                big[400 + j * s:400 + (j + 1) * s,
+                    400 + i * s:400 + (i + 1) * s] = 20
+    return finish(big, angle, border=230)
+
+
+def dots(cols, rows, pitch):
+    big = np.full((SIZE[0] * SS, SIZE[1] * SS), 230, np.uint8)
+    for j in range(rows):
+        for i in range(cols):
+            cv2.circle(big, ((200 + i * pitch) * SS, (150 + j * pitch) * SS),
+                       pitch * SS // 4, 20, -1, cv2.LINE_AA)
+    return finish(big, 0.0, border=230)
+
+
+# ================= AJUSTE =================
+
+@pytest.mark.parametrize("reflect", [False, True])
+def test_fit_scale_recovers_similarity(reflect):
+    rng = np.random.default_rng(1)
+    mm = rng.uniform(0, 5, (40, 2))
+    a = np.radians(23)
+    rot = np.array([[np.cos(a), -np.sin(a)], [np.sin(a), np.cos(a)]])
+    if reflect:
+        rot = rot @ np.diag([1, -1])
+    px = (mm @ rot.T) / 0.0125 + (310, 95)
+
+    scale, rms = fit_scale(px, mm)
+    assert scale == pytest.approx(0.0125, rel=1e-9)
+    assert rms < 1e-9
+
+
+def test_fit_scale_residual():
+    rng = np.random.default_rng(2)
+    mm = rng.uniform(0, 5, (200, 2))
+    px = mm / 0.05 + rng.normal(0, 0.5, mm.shape)
+
+    scale, rms = fit_scale(px, mm)
+    assert scale == pytest.approx(0.05, rel=2e-3)
+    assert rms == pytest.approx(0.5 * 0.05 * np.sqrt(2), rel=0.2)
+
+
+def test_fit_scale_degenerate():
+    with pytest.raises(ValueError):
+        fit_scale(np.ones((5, 2)), np.arange(10.0).reshape(5, 2))
+
+
+# ================= DETECCIÓN =================
+
+@pytest.mark.parametrize("width", [1, 2, 3, 4, 5, 6, 8])
+@pytest.mark.parametrize("angle", [0.0, 3.0, 7.0, 10.0])
+def test_ruler_tick_width_and_angle(width, angle):
+    result = detect_and_fit(ruler(20, width, angle), parse_target("ruler:1"))
+    assert result is not None
+    scale, rms, count = result
+    assert count == 30
+    assert scale == pytest.approx(1 / 20, rel=5e-4)
+
+
+@pytest.mark.parametrize("pitch, width", [(8, 3), (50, 20), (80, 24)])
+def test_ruler_pitch(pitch, width):
+    count = min(30, 800 // pitch)
+    result = detect_and_fit(ruler(pitch, width, 5.0, count),
+                            parse_target("ruler:0.5"))
+    assert result is not None
+    assert result[2] == count
+    assert result[0] == pytest.approx(0.5 / pitch, rel=5e-4)
+
+
+def test_checker():
+    img = checker(9, 6, 20, 10.0)
+    result = detect_and_fit(img, parse_target("checker:9x6:1"))
+    assert result is not None
+    scale, _rms, count = result
+    assert count == 54
+    assert scale == pytest.approx(0.05, rel=5e-3)
+
+
+def test_dots():
+    img = dots(7, 7, 30)
+    result = detect_and_fit(img, parse_target("dots:7x7:0.5"))
+    assert result is not None
+    assert result[2] == 49
+    assert result[0] == pytest.approx(0.5 / 30, rel=1e-3)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_noise_is_not_a_ruler(seed):
+    rng = np.random.default_rng(seed)
+    img = rng.normal(128, 20, SIZE).clip(0, 255).astype(np.uint8)
+    img = cv2.GaussianBlur(img, (0, 0), 2)
+    assert detect_and_fit(img, parse_target("ruler:1")) is None
+
+
+def test_checker_is_not_a_ruler():
+    img = checker(9, 6, 20, 10.0)
+    assert detect_and_fit(img, parse_target("ruler:1")) is None
+
+
+def test_missing_target():
+    img = np.full(SIZE + (3,), 128, np.uint8)
+    assert detect_and_fit(img, parse_target("checker:9x6:1")) is None
+    assert detect_and_fit(img, parse_target("ruler:1")) is None
+
+
+# ================= PATRÓN =================
+
+def test_parse_target():
+    assert str(parse_target("dots:7x7:0.1in")) == "dots:7x7:2.54"
+    assert str(parse_target("ruler:0.5mm")) == "ruler:0.5"
+    for spec in ("grid:3x3:1", "checker:1x5:1", "ruler:-1", "ruler"):
+        with pytest.raises(ValueError):
+            parse_target(spec)
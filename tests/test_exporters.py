@@ -0,0 +1,153 @@
+import csv
+import io
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+if not hasattr(cv2, "freetype"):
+    pytest.skip("OpenCV without FreeType", allow_module_level=True)
+
+from microscopi.config import Config
+from microscopi.exporters import EXPORTERS, ExportData, export_to
+from microscopi.state import AppState
+
+SCALE = 0.01    # mm/px
+
+
+def new_state(scale=SCALE):
+    state = AppState(Config())
+    state.base_width, state.base_height = 640, 480
+    state.scale_mm_per_pixel = scale
+    state.origin = (100.0, 100.0)
+
+    store = state.measurements
+    store.append("DIS", "d", "1.00 mm", (0, 255, 0), "GRN",
+                 [(100, 100), (200, 100)])
+    store.append("SQR", "s", "", (0, 0, 255), "RED",
+                 [(150, 150), (250, 200)])
+    store.append("RAD", "r", "", (255, 0, 0), "BLU",
+                 [(300, 300), (300, 350)])
+    store.append("XY", "", "", (0, 255, 0), "GRN", [(120, 130)])
+    i = store.append("DIS", "hidden", "", (0, 255, 0), "GRN",
+                     [(0, 0), (1, 1)])
+    store.toggle(i)
+    return state
+
+
+def export(tmp_path, name, state=None):
+    exporter = EXPORTERS[name]
+    path = tmp_path / f"out.{exporter.ext}"
+    export_to(path, exporter, ExportData(state or new_state()))
+    return path.read_text(encoding="utf-8")
+
+
+def dxf_pairs(text):
+    lines = text.splitlines()
+    return list(zip(lines[::2], lines[1::2]))
+
+
+def test_every_format_writes(tmp_path):
+    for name in EXPORTERS:
+        assert export(tmp_path, name)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+@pytest.mark.parametrize("name, unit", [("3D", "mm"), ("PCB", "mil")])
+def test_csv(tmp_path, name, unit):
+    rows = list(csv.reader(io.StringIO(export(tmp_path, name))))
+    assert rows[0] == ["label", "type", "color",
+                       "x1", "y1", "x2", "y2", "value"]
+    # Solo las visibles, relativas al origen
+    assert [r[0] for r in rows[1:]] == ["d", "s", "r", ""]
+    assert rows[1][:3] == ["d", "DIS", "GRN"]
+    assert rows[1][-1] == "1.00 mm"
+    x2 = float(rows[1][5])
+    assert x2 == pytest.approx(1.0 if unit == "mm" else 1.0 / 25.4 * 1000,
+                               abs=0.5)
+
+
+def test_csv_without_scale_is_in_pixels(tmp_path):
+    text = export(tmp_path, "3D", new_state(scale=None))
+    rows = list(csv.reader(io.StringIO(text)))
+    assert float(rows[1][5]) == 100.0
+
+
+def test_json(tmp_path):
+    doc = json.loads(export(tmp_path, "JSON"))
+    meta = doc["metadata"]
+    assert meta["unit"] == "mm" and meta["count"] == 4
+    assert meta["scale_mm_per_pixel"] == SCALE
+    assert meta["image_size_px"] == [640, 480]
+
+    first = doc["measurements"][0]
+    assert first["label"] == "d" and first["type"] == "DIS"
+    assert first["points"] == [[0.0, 0.0], [1.0, 0.0]]
+
+
+def test_dxf(tmp_path):
+    pairs = dxf_pairs(export(tmp_path, "DXF"))
+    codes = [(c.strip(), v) for c, v in pairs]
+
+    # Cabecera con unidades en mm antes de las entidades
+    assert codes[:2] == [("0", "SECTION"), ("2", "HEADER")]
+    units = codes.index(("9", "$INSUNITS"))
+    assert codes[units + 1] == ("70", "4")
+    entities = codes.index(("2", "ENTITIES"))
+    assert units < entities
+    assert codes[-1] == ("0", "EOF")
+
+    kinds = [v for c, v in codes[entities:] if c == "0"]
+    # DIS: 1 línea, SQR: 4, RAD: círculo, XY: punto; etiquetas en TEXT
+    assert kinds.count("LINE") == 5
+    assert kinds.count("CIRCLE") == 1
+    assert kinds.count("POINT") == 1
+    assert kinds.count("TEXT") == 3
+
+    # Eje Y hacia arriba: lo que está debajo del origen queda en negativo
+    ys = {float(v) for c, v in codes[entities:] if c == "20"}
+    assert {-0.5, -1.0, -2.0} <= ys
+    assert max(ys) == 0.0
+
+
+@pytest.mark.parametrize("name, layer", [("KICAD", "Dwgs.User"),
+                                         ("KICAD-EDGE", "Edge.Cuts")])
+def test_kicad(tmp_path, name, layer):
+    text = export(tmp_path, name)
+    assert text.startswith("(footprint ")
+    assert text.count("(") == text.count(")")
+    assert "(fp_line (start 0.0000 0.0000) (end 1.0000 0.0000)" in text
+    assert text.count("(fp_rect") == 1
+    assert f'(layer "{layer}")' in text
+    # El contorno no lleva puntos sueltos ni textos
+    assert text.count("(fp_circle") == (1 if name == "KICAD-EDGE" else 2)
+    assert ("fp_text" in text) == (name == "KICAD")
+
+
+def test_svg(tmp_path):
+    root = ET.fromstring(export(tmp_path, "SVG"))
+    ns = {"svg": "http://www.w3.org/2000/svg"}
+    assert root.findall(".//svg:line", ns)
+    assert len(root.findall(".//svg:rect", ns)) == 1
+    assert len(root.findall(".//svg:circle", ns)) == 2
+    texts = [t.text for t in root.findall(".//svg:text", ns)]
+    assert texts == ["d", "s", "r"]
+
+
+def test_failed_export_keeps_previous_file(tmp_path):
+    path = tmp_path / "out.csv"
+    path.write_text("previous")
+
+    class Broken:
+        newline = ""
+
+        def write(self, f, data):
+            f.write("partial")
+            raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError):
+        export_to(path, Broken(), ExportData(new_state()))
+
+    assert path.read_text() == "previous"
+    assert list(tmp_path.iterdir()) == [path]
@@ -0,0 +1,154 @@
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+if not hasattr(cv2, "freetype"):
+    pytest.skip("OpenCV without FreeType", allow_module_level=True)
+
+from microscopi.config import Config
+from microscopi.history import (
+    Command,
+    DeleteMeasure,
+    History,
+    InsertMeasure,
+    ReplaceMeasures,
+    SetAttr,
+    SetLabel,
+    SetPoints,
+    ToggleVisible,
+)
+from microscopi.measurements import MeasurementStore
+from microscopi.state import AppState
+
+
+def row(label, points=((10, 20), (30, 40))):
+    return {"type": "DIS", "label": label, "text": f"{label} mm",
+            "color": (0, 255, 0), "color_name": "GRN",
+            "points": list(points), "visible": True}
+
+
+def add(state, label):
+    cmd = InsertMeasure(row(label))
+    state.history.execute(state, cmd)
+    return cmd.mid
+
+
+def snapshot(state):
+    store = state.measurements
+    return (store.to_list(), store.ids[:store.n].tolist(),
+            state.scale_mm_per_pixel)
+
+
+def test_command_is_abstract():
+    with pytest.raises(TypeError):
+        Command()
+
+    class Partial(Command):
+        def apply(self, state):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_undo_redo_every_command():
+    state = AppState(Config())
+    history = state.history
+    a = add(state, "a")
+    b = add(state, "b")
+
+    commands = [
+        SetLabel(a, "a", "x"),
+        SetPoints(b, ([(10, 20), (30, 40)], "b mm"), ([(0, 0), (5, 5)], "7")),
+        ToggleVisible(a),
+        DeleteMeasure(a),
+        ReplaceMeasures(MeasurementStore.from_list([row("new")])),
+        SetAttr("scale_mm_per_pixel", None, 0.02),
+    ]
+
+    states = [snapshot(state)]
+    for cmd in commands:
+        history.execute(state, cmd)
+        states.append(snapshot(state))
+
+    # Deshacer todo recorre los estados al revés, rehacer hacia delante
+    for expected in reversed(states[:-1]):
+        assert history.undo(state) is not None
+        assert snapshot(state) == expected
+    for expected in states[1:]:
+        assert history.redo(state) is not None
+        assert snapshot(state) == expected
+
+
+def test_undo_delete_restores_position_and_id():
+    state = AppState(Config())
+    mids = [add(state, k) for k in "abc"]
+    state.selected = mids[1]
+
+    state.history.execute(state, DeleteMeasure(mids[1]))
+    assert state.selected is None
+
+    state.history.undo(state)
+    store = state.measurements
+    assert [m["label"] for m in store] == ["a", "b", "c"]
+    assert store.ids[:store.n].tolist() == mids
+
+
+def test_new_command_clears_redo():
+    state = AppState(Config())
+    history = state.history
+    add(state, "a")
+    add(state, "b")
+
+    history.undo(state)
+    assert history.redo_stack
+    add(state, "c")
+    assert not history.redo_stack
+    assert history.redo(state) is None
+    assert [m["label"] for m in state.measurements] == ["a", "c"]
+
+    history.clear()
+    assert history.undo(state) is None and history.size == 0
+
+
+def test_budget_evicts_oldest():
+    state = AppState(Config())
+    one = InsertMeasure(row("x")).cost
+    state.history = history = History(budget=3 * one)
+
+    for k in range(5):
+        add(state, str(k))
+    assert len(history.undo_stack) == 3
+    assert history.size == 3 * one
+
+    while history.undo(state):
+        pass
+    assert [m["label"] for m in state.measurements] == ["0", "1"]
+
+    # Redo liberado del presupuesto al registrar algo nuevo
+    add(state, "y")
+    assert history.size == one
+
+
+def test_budget_keeps_last_entry():
+    state = AppState(Config())
+    state.history = history = History(budget=1)
+    add(state, "a")
+    add(state, "b")
+    assert len(history.undo_stack) == 1
+
+    history.undo(state)
+    assert [m["label"] for m in state.measurements] == ["a"]
+
+
+def test_listener():
+    state = AppState(Config())
+    seen = []
+    state.history.listener = lambda cmd, forward: seen.append(
+        cmd.journal(forward)["op"])
+
+    mid = add(state, "a")
+    state.history.execute(state, ToggleVisible(mid))
+    state.history.undo(state)
+    state.history.undo(state)
+    state.history.redo(state)
+    assert seen == ["insert", "toggle", "toggle", "delete", "insert"]
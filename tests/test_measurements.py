@@ -0,0 +1,107 @@
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+if not hasattr(cv2, "freetype"):
+    pytest.skip("OpenCV without FreeType", allow_module_level=True)
+
+from microscopi.measurements import MeasurementStore
+
+
+def row(label, points=((10, 20), (30, 40)), mtype="DIS", color=(0, 255, 0)):
+    return {"type": mtype, "label": label, "text": f"{label} mm",
+            "color": list(color), "color_name": "GRN",
+            "points": [list(p) for p in points], "visible": True}
+
+
+def labels(store):
+    return [m["label"] for m in store]
+
+
+def test_round_trip_list():
+    rows = [row("a"), row("b", ((1.5, 2), (3, 4.25)), "SQR"),
+            row("c", ((5, 5), (9, 5)), "RAD")]
+    store = MeasurementStore.from_list(rows)
+    assert len(store) == 3 and store
+    assert store.to_list() == rows
+    # Enteros siguen siendo enteros en el JSON
+    assert isinstance(store.to_list()[0]["points"][0][0], int)
+
+
+def test_xy_single_point():
+    store = MeasurementStore.from_list([row("p", ((7, 8),), "XY")])
+    assert store[0]["points"] == [(7, 8), (7, 8)]
+
+
+def test_grow_keeps_rows():
+    store = MeasurementStore()
+    for k in range(200):
+        store.append("DIS", str(k), "", (0, 255, 0), "GRN", [(k, 0), (k, 1)])
+    assert len(store) == 200
+    assert store[150]["points"] == [(150, 0), (150, 1)]
+    assert store[-1]["label"] == "199"
+
+
+def test_ids_are_stable():
+    store = MeasurementStore.from_list([row("a"), row("b"), row("c")])
+    ids = store.ids[:store.n].tolist()
+    assert ids == sorted(ids)
+
+    store.delete(1)
+    assert labels(store) == ["a", "c"]
+    assert store.row_of(ids[1]) is None
+    assert store.row_of(ids[2]) == 1
+
+    # Deshacer el borrado restaura el mismo id en su sitio
+    store.insert(1, "DIS", "b", "", (0, 255, 0), "GRN",
+                 [(10, 20), (30, 40)], mid=ids[1])
+    assert store.ids[:store.n].tolist() == ids
+
+    # Los ids nuevos no reutilizan ninguno
+    store.pop()
+    i = store.append("DIS", "d", "", (0, 255, 0), "GRN", [(0, 0), (1, 1)])
+    assert store.ids[i] > max(ids)
+
+
+def test_edit_and_visibility():
+    store = MeasurementStore.from_list([row("a"), row("b")])
+    version = store.version
+
+    store.set_label(0, "x")
+    store.set_text(0, "1.00 mm")
+    store.toggle(1)
+    assert store.version != version
+    assert store[0]["label"] == "x" and store[0]["text"] == "1.00 mm"
+    assert not store[1]["visible"]
+    assert store.visible_indices().tolist() == [0]
+
+    store.set_visible(1, True)
+    assert store.visible_indices("DIS").tolist() == [0, 1]
+    assert store.visible_indices("RAD").tolist() == []
+
+
+def test_palette_is_shared():
+    store = MeasurementStore.from_list(
+        [row("a"), row("b"), row("c", color=(0, 0, 255))])
+    assert len(store.palette) == 2
+    assert store.color_idx[0] == store.color_idx[1]
+
+
+def test_errors():
+    store = MeasurementStore()
+    with pytest.raises(IndexError):
+        store.pop()
+    with pytest.raises(IndexError):
+        store.delete(0)
+    with pytest.raises(IndexError):
+        store[0]
+
+
+def test_clear_and_replace():
+    store = MeasurementStore.from_list([row("a"), row("b")])
+    store.clear()
+    assert len(store) == 0 and not store
+    assert len(store.index) == 0
+
+    store.replace([row("c")])
+    assert labels(store) == ["c"]
+    assert len(store.index) == 1
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+if not hasattr(cv2, "freetype"):
+    pytest.skip("OpenCV without FreeType", allow_module_level=True)
+
+from microscopi.playback import INDEX_SUFFIX, PlaybackSource, load_index
+
+FRAMES = 90
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    """mp4 con el número de frame dibujado y su decodificación secuencial."""
+    path = tmp_path_factory.mktemp("playback") / "clip.mp4"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"),
+                             30, (160, 120))
+    if not writer.isOpened():
+        pytest.skip("No mp4v encoder")
+    for i in range(FRAMES):
+        frame = np.full((120, 160, 3), (i * 7) % 256, np.uint8)
+        cv2.putText(frame, str(i), (10, 80), cv2.FONT_HERSHEY_SIMPLEX, 2,
+                    (0, 0, 255), 3)
+        writer.write(frame)
+    writer.release()
+
+    cap = cv2.VideoCapture(str(path))
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    assert len(frames) == FRAMES
+    return path, frames
+
+
+def test_seek_matches_sequential_decode(video):
+    path, frames = video
+    source = PlaybackSource(path)
+    assert len(source) == FRAMES
+
+    rng = np.random.default_rng(0)
+    targets = rng.integers(0, FRAMES, 40).tolist()
+    for n in targets + [FRAMES - 1, 0, FRAMES - 1, FRAMES - 2]:
+        source.seek(n)
+        assert np.array_equal(source.read(), frames[n]), n
+        assert source.position == n
+    source.release()
+
+
+def test_step_backwards(video):
+    path, frames = video
+    source = PlaybackSource(path, cache_budget=0)   # Sin caché útil
+    source.seek(FRAMES // 2)
+    source.read()
+
+    for _ in range(20):
+        source.step(-1)
+        frame = source.read()
+        assert np.array_equal(frame, frames[source.position])
+    assert source.position == FRAMES // 2 - 20
+    source.release()
+
+
+@pytest.mark.parametrize("content", [b"", b"PK\x03\x04trunc"])
+def test_damaged_index_is_rebuilt(video, content):
+    path, _frames = video
+    cache = path.with_name(path.name + INDEX_SUFFIX)
+    cache.write_bytes(content)
+
+    index = load_index(path)
+    assert len(index) == FRAMES
+    assert index.keyframes[0] == 0
+
+    # Reescrito completo, sin temporales a la vista
+    assert len(load_index(path)) == FRAMES
+    assert not cache.with_name(cache.name + ".tmp").exists()
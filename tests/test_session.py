@@ -0,0 +1,214 @@
+import json
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+if not hasattr(cv2, "freetype"):
+    pytest.skip("OpenCV without FreeType", allow_module_level=True)
+
+from microscopi.config import Config
+from microscopi.history import (
+    DeleteMeasure,
+    InsertMeasure,
+    SetAttr,
+    SetLabel,
+    SetPoints,
+    ToggleVisible,
+)
+from microscopi.session import (
+    JOURNAL_FILE,
+    REJECTED_FILE,
+    SNAPSHOT_FILE,
+    SessionJournal,
+)
+from microscopi.state import AppState
+
+
+def new_state(journal=None):
+    state = AppState(Config())
+    if journal is not None:
+        state.history.listener = journal.log_command
+    return state
+
+
+def row(label, points=((10, 20), (30, 40)), mtype="DIS"):
+    return {"type": mtype, "label": label, "text": f"{label} mm",
+            "color": (0, 255, 0), "color_name": "GRN",
+            "points": list(points), "visible": True}
+
+
+def add(state, label, **kw):
+    cmd = InsertMeasure(row(label, **kw))
+    state.history.execute(state, cmd)
+    return cmd.mid
+
+
+def edit_session(state):
+    """Una sesión con todos los tipos de registro."""
+    a = add(state, "a")
+    b = add(state, "b", points=((1, 1), (5, 5)), mtype="SQR")
+    add(state, "c", points=((7, 8), (7, 8)), mtype="XY")
+    state.history.execute(state, SetLabel(b, "b", "bb"))
+    state.history.execute(state, SetPoints(
+        a, ([(10, 20), (30, 40)], "a mm"), ([(11, 21), (31, 41)], "a2")))
+    state.history.execute(state, ToggleVisible(b))
+    state.history.execute(state, DeleteMeasure(a))
+    state.history.undo(state)
+    state.history.execute(state, SetAttr(
+        "scale_mm_per_pixel", None, 0.025, label="calibration"))
+    state.history.execute(state, SetAttr("origin", None, (3.0, 4.0)))
+
+
+def restored(directory):
+    journal = SessionJournal(directory)
+    state = new_state(journal)
+    journal.load(state)
+    return journal, state
+
+
+def assert_same(a, b):
+    assert a.measurements.to_list() == b.measurements.to_list()
+    assert (a.measurements.ids[:a.measurements.n].tolist() ==
+            b.measurements.ids[:b.measurements.n].tolist())
+    assert a.scale_mm_per_pixel == b.scale_mm_per_pixel
+    assert a.origin == b.origin
+
+
+def test_round_trip(tmp_path):
+    journal = SessionJournal(tmp_path)
+    state = new_state(journal)
+    journal.load(state)
+    edit_session(state)
+    journal.close()
+
+    journal2, state2 = restored(tmp_path)
+    assert journal2.replay_error is None
+    assert_same(state, state2)
+    assert len(state2.measurements) == 3
+    assert state2.origin == (3.0, 4.0)
+
+    # Se sigue escribiendo detrás y los ids no se repiten
+    add(state2, "d")
+    journal2.close()
+    _j, state3 = restored(tmp_path)
+    assert_same(state2, state3)
+
+
+def test_torn_last_line(tmp_path):
+    journal = SessionJournal(tmp_path)
+    state = new_state(journal)
+    add(state, "a")
+    add(state, "b")
+    journal.close()
+
+    path = tmp_path / JOURNAL_FILE
+    data = path.read_bytes()
+    path.write_bytes(data[:-10])        # Corte a mitad de la última línea
+
+    journal, state = restored(tmp_path)
+    assert [m["label"] for m in state.measurements.to_list()] == ["a"]
+    assert journal.replay_error is None
+
+    add(state, "c")
+    journal.close()
+    _j, state = restored(tmp_path)
+    assert [m["label"] for m in state.measurements.to_list()] == ["a", "c"]
+
+
+def test_compaction(tmp_path):
+    journal = SessionJournal(tmp_path)
+    state = new_state(journal)
+    edit_session(state)
+    journal.compact(state)
+
+    assert (tmp_path / SNAPSHOT_FILE).exists()
+    assert (tmp_path / JOURNAL_FILE).read_bytes() == b""
+
+    add(state, "after")
+    journal.close()
+
+    _j, state2 = restored(tmp_path)
+    assert_same(state, state2)
+
+
+def test_records_already_in_snapshot_are_skipped(tmp_path):
+    # Corte entre escribir el snapshot y vaciar el diario
+    journal = SessionJournal(tmp_path)
+    state = new_state(journal)
+    add(state, "a")
+    journal.sync()
+    old = (tmp_path / JOURNAL_FILE).read_bytes()
+    journal.compact(state)
+    (tmp_path / JOURNAL_FILE).write_bytes(old)
+
+    _j, state2 = restored(tmp_path)
+    assert [m["label"] for m in state2.measurements.to_list()] == ["a"]
+
+
+def test_bad_record_stops_replay(tmp_path):
+    journal = SessionJournal(tmp_path)
+    state = new_state(journal)
+    add(state, "a")
+    journal.append({"op": "delete", "mid": 999})
+    add(state, "b")
+    journal.close()
+
+    journal, state = restored(tmp_path)
+    assert journal.replay_error is not None
+    assert [m["label"] for m in state.measurements.to_list()] == ["a"]
+
+    rejected = (tmp_path / REJECTED_FILE).read_text().splitlines()
+    assert [json.loads(r)["op"] for r in rejected] == ["delete", "insert"]
+
+    # Lo nuevo se añade detrás de lo restaurado
+    journal.append({"op": "label", "mid": 999, "label": "x"})
+    journal.close()
+    restored(tmp_path)
+
+    # El fichero de rechazados acumula, no se pisa
+    rejected = (tmp_path / REJECTED_FILE).read_text().splitlines()
+    assert len(rejected) == 3
+
+
+def test_damaged_snapshot_is_set_aside(tmp_path):
+    journal = SessionJournal(tmp_path)
+    state = new_state(journal)
+    edit_session(state)
+    journal.compact(state)
+    add(state, "after")
+    journal.close()
+
+    snapshot = tmp_path / SNAPSHOT_FILE
+    damaged = snapshot.read_bytes()[:-5]
+    snapshot.write_bytes(damaged)
+
+    journal, state = restored(tmp_path)
+    assert journal.replay_error is not None
+    assert len(state.measurements) == 0
+
+    # El snapshot original se conserva aparte y nunca se pisa
+    aside = list(tmp_path.glob("snapshot.damaged-*.json"))
+    assert [p.read_bytes() for p in aside] == [damaged]
+    assert not snapshot.exists()
+    assert (tmp_path / REJECTED_FILE).read_text().count("\n") == 1
+
+    add(state, "new")
+    journal.compact(state)
+    journal.close()
+    assert aside[0].read_bytes() == damaged
+
+    _j, state = restored(tmp_path)
+    assert [m["label"] for m in state.measurements.to_list()] == ["new"]
+
+
+def test_discard(tmp_path):
+    journal = SessionJournal(tmp_path)
+    state = new_state(journal)
+    add(state, "a")
+    journal.compact(state)
+    add(state, "b")
+    journal.discard()
+
+    journal, state = restored(tmp_path)
+    assert len(state.measurements) == 0
+    assert journal.seq == 0
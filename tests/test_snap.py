@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+if not hasattr(cv2, "freetype"):
+    pytest.skip("OpenCV without FreeType", allow_module_level=True)
+
+from microscopi.snap import snap_point
+
+
+def quadrant(ex, ey, blur=1.0, size=200):
+    """Cuadrante claro desde (ex, ey) con cobertura de píxel exacta."""
+    xs = np.arange(size)
+    cx = np.clip(xs - ex + 0.5, 0, 1)
+    cy = np.clip(xs - ey + 0.5, 0, 1)
+    img = 40 + 160 * np.outer(cy, cx)
+    if blur:
+        img = cv2.GaussianBlur(img, (0, 0), blur)
+    return np.dstack([img] * 3).clip(0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("ex", [95.0, 100.3, 104.7])
+@pytest.mark.parametrize("blur", [0, 1.0, 2.0])
+def test_step_edge(ex, blur):
+    # Borde vertical: solo importa x
+    img = quadrant(ex, -10, blur)
+    x, y, kind = snap_point(img, ex + 3, 100, 10)
+    assert kind == "edge"
+    assert x == pytest.approx(ex, abs=0.15)
+    assert y == pytest.approx(100, abs=1.0)
+
+
+@pytest.mark.parametrize("ex, ey", [(100.0, 100.0), (97.4, 102.6)])
+@pytest.mark.parametrize("blur", [0, 1.0])
+def test_corner(ex, ey, blur):
+    img = quadrant(ex, ey, blur)
+    x, y, kind = snap_point(img, ex + 3, ey + 2, 10)
+    assert kind == "corner"
+    assert (x, y) == (pytest.approx(ex, abs=0.5), pytest.approx(ey, abs=0.5))
+
+
+def test_grayscale_input():
+    img = quadrant(100.0, -10)[:, :, 0]
+    x, _y, kind = snap_point(img, 103, 100, 10)
+    assert kind == "edge" and x == pytest.approx(100.0, abs=0.15)
+
+
+def test_flat_roi():
+    rng = np.random.default_rng(0)
+    img = (120 + rng.normal(0, 2, (200, 200, 3))).astype(np.uint8)
+    assert snap_point(img, 100, 100, 10) is None
+
+
+def test_edge_out_of_reach():
+    img = quadrant(100.0, -10)
+    assert snap_point(img, 130, 100, 10) is None
+
+
+def test_near_border():
+    # El ROI se recorta al borde de la imagen
+    img = quadrant(4.0, -10)
+    x, _y, kind = snap_point(img, 1, 100, 10)
+    assert kind == "edge" and x == pytest.approx(4.0, abs=0.15)
+    assert snap_point(img, 199, 199, 10) is None
@@ -0,0 +1,88 @@
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+if not hasattr(cv2, "freetype"):
+    pytest.skip("OpenCV without FreeType", allow_module_level=True)
+
+from microscopi.measurements import MeasurementStore
+from microscopi.spatial import SpatialIndex
+
+
+def test_index_insert_query_remove():
+    index = SpatialIndex(cell=10)
+    index.insert("a", (0, 0, 5, 5))
+    index.insert("b", (20, 20, 45, 25))
+    index.insert("c", (-30, -30, -25, -25))
+    assert len(index) == 3 and "b" in index
+
+    assert index.query(4, 4, 6, 6) == {"a"}
+    assert index.query(40, 22, 41, 23) == {"b"}
+    assert index.query(-26, -26, -26, -26) == {"c"}
+    assert index.query(10, 10, 15, 15) == set()
+    # Rectángulo mayor que todas las celdas
+    assert index.query(-1000, -1000, 1000, 1000) == {"a", "b", "c"}
+
+    index.remove("b")
+    index.remove("missing")
+    assert index.query(40, 22, 41, 23) == set()
+    assert len(index) == 2
+    # No quedan celdas vacías
+    assert all(index._cells.values())
+
+
+def test_index_update_moves_key():
+    index = SpatialIndex(cell=10)
+    index.insert("a", (0, 0, 5, 5))
+    index.update("a", (100, 100, 105, 105))
+    assert index.query(0, 0, 5, 5) == set()
+    assert index.query(101, 101, 102, 102) == {"a"}
+
+    index.insert("a", (0, 0, 1, 1))      # Reinsertar sustituye
+    assert len(index) == 1
+    assert index.query(101, 101, 102, 102) == set()
+
+    index.clear()
+    assert len(index) == 0 and index.query(0, 0, 1, 1) == set()
+
+
+def store_of(*rows):
+    store = MeasurementStore()
+    for mtype, points in rows:
+        store.append(mtype, "", "", (0, 255, 0), "GRN", points)
+    return store
+
+
+def test_hit_handles_and_strokes():
+    store = store_of(("DIS", [(0, 0), (100, 0)]),
+                     ("RAD", [(200, 200), (230, 200)]),
+                     ("SQR", [(300, 300), (340, 320)]))
+
+    assert store.hit(99, 2, 5) == (0, 1)         # Extremo
+    assert store.hit(50, 3, 5) == (0, None)      # Trazo
+    assert store.hit(50, 10, 5) is None
+
+    # Círculo: el borde sí, el centro no es un asa
+    assert store.hit(200, 229, 3) == (1, None)
+    assert store.hit(231, 200, 3) == (1, 1)
+    assert store.hit(201, 201, 3) is None
+
+    # Caja: lado más cercano desde dentro o desde fuera
+    assert store.hit(320, 301, 3) == (2, None)
+    assert store.hit(343, 310, 5) == (2, None)
+    assert store.hit(320, 310, 3) is None
+
+
+def test_hit_follows_edits():
+    store = store_of(("DIS", [(0, 0), (100, 0)]),
+                     ("DIS", [(0, 50), (100, 50)]))
+
+    store.toggle(0)
+    assert store.hit(50, 0, 3) is None           # Oculta
+
+    store.move_point(1, 1, (100, 300))
+    assert store.hit(100, 50, 3) is None
+    assert store.hit(100, 300, 3) == (1, 1)
+
+    store.delete(0)
+    assert store.hit(100, 300, 3) == (0, 1)
+    assert len(store.index) == 1